@@ -1,30 +1,138 @@
 import os
+import re
+import sys
 import json
+import time
+import atexit
+import fcntl
+import sqlite3
+import hashlib
+import threading
 import importlib.util
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, send_from_directory, send_file, flash, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import ContentRange
+from werkzeug.routing import BuildError
 from flask_migrate import Migrate
-from flask_socketio import SocketIO
+from flask_socketio import Namespace, join_room
+from ignore_rules import IgnoreRules, DEFAULT_IGNORE_PATTERNS
+from workspace_index import WorkspaceIndex, start_watcher
+from file_versions import VersionStore, SharedVersionStore, VersionConflict, apply_text_edits
+from write_queue import WriteBehindQueue
+from file_reader import sniff_binary, describe as describe_file, detect_eol, read_byte_range, read_line_range, ContentCache
+from archive_import import ImportProgress, ImportRejected, import_stream
+from archive_export import ExportPlan
+from search_index import TrigramIndex
+from symbol_index import SymbolIndex
+from extension_registry import ExtensionRegistry
+from assets import send_static_file, AssetManifest, BROTLI, IMAGE_VARIANTS, ImageError, save_image_variants, list_image_variants
+from ttl_cache import TTLCache
+from metrics import Metrics, MetricsSocketIO
+from message_bus import socketio_options
+from tasks import TaskManager
 
 # ==========================================
 # 1. INITIAL SETUP
 # ==========================================
-app = Flask(__name__)
+# NEXUSS_INSTANCE_PATH relocates the instance folder (database, indexes, caches), e.g. for benchmarks.
+app = Flask(__name__, instance_path=os.environ.get('NEXUSS_INSTANCE_PATH'))
 app.config['SECRET_KEY'] = 'ethco-secure-key-998877'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ethco.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Applied to every SQLite connection: WAL lets readers run alongside a writer,
+# and busy_timeout (ms) makes a second writer wait instead of failing at once.
+app.config['SQLITE_PRAGMAS'] = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000,
+                                'cache_size': -16000, 'temp_store': 'MEMORY'}
+# File tree: gitignore-style patterns hidden from the explorer (a `.nexussignore`
+# file in the workspace root is merged on top), maximum expansion depth per
+# request, and how many listed subtrees to keep cached.
+app.config['WORKSPACE_IGNORE'] = list(DEFAULT_IGNORE_PATTERNS)
+app.config['TREE_MAX_DEPTH'] = 8
+app.config['TREE_CACHE_SIZE'] = 256
+# Live tree updates: 'auto' (inotify, falling back to polling), 'inotify',
+# 'poll' or 'off', and the rescan interval in seconds for polling mode.
+app.config['WORKSPACE_WATCHER'] = 'auto'
+app.config['WORKSPACE_POLL_INTERVAL'] = 2.0
+# File reads: files above READ_FULL_LIMIT bytes are served in pages of
+# READ_PAGE_BYTES; line-range reads return at most READ_MAX_LINES lines.
+app.config['READ_FULL_LIMIT'] = 2 * 1024 * 1024
+app.config['READ_PAGE_BYTES'] = 512 * 1024
+app.config['READ_MAX_LINES'] = 20000
+# Memory (bytes) for recently read file contents, reused while the file is unchanged.
+app.config['READ_CACHE_BYTES'] = 64 * 1024 * 1024
+# Saves are queued and written behind the response: repeated saves of a file
+# within SAVE_WRITE_DELAY seconds become one write, and SAVE_FSYNC syncs each
+# batch to disk (temp file + rename either way, so a crash never truncates).
+app.config['SAVE_WRITE_DELAY'] = 0.25
+app.config['SAVE_FSYNC'] = True
+# Bulk import limits (uncompressed bytes / number of files per request)
+app.config['IMPORT_MAX_BYTES'] = 2 * 1024 * 1024 * 1024
+app.config['IMPORT_MAX_FILES'] = 100000
+# Deflate level (0-9) for zip exports; tar exports are uncompressed so they can be resumed.
+app.config['EXPORT_ZIP_LEVEL'] = 6
+# Full-text search: files larger than this are not indexed; cap on results per query.
+app.config['SEARCH_MAX_FILE_BYTES'] = 2 * 1024 * 1024
+app.config['SEARCH_MAX_RESULTS'] = 2000
+# Symbol index (outline / go-to-symbol): larger source files are skipped; cap on results per query.
+app.config['SYMBOL_MAX_FILE_BYTES'] = 1024 * 1024
+app.config['SYMBOL_MAX_RESULTS'] = 500
+# Cache lifetime (seconds) for files served from extension folders
+app.config['EXTENSION_ASSET_MAX_AGE'] = 7 * 24 * 3600
+# NexussTerminal backend: 'remote' (external websocket service) or 'local'
+# (a shell on a PTY in the workspace). None defers to the extension's manifest.
+app.config['TERMINAL_BACKEND'] = None
+# NexussTerminal sessions: warm sessions kept ready (from the first connect on),
+# failed warm sessions retried in a row before the pool pauses, seconds a
+# disconnected session waits for its user to come back, and characters of
+# scrollback replayed.
+app.config['TERMINAL_POOL_SIZE'] = 1
+app.config['TERMINAL_POOL_RETRIES'] = 5
+app.config['TERMINAL_REATTACH_GRACE'] = 60
+app.config['TERMINAL_SCROLLBACK'] = 256 * 1024
+
+# Wallpaper uploads are stored as downscaled JPEG/WebP variants of these widths
+# (when Pillow is installed) so small screens never download the full image.
+app.config['WALLPAPER_WIDTHS'] = [640, 1280, 1920]
+app.config['WALLPAPER_QUALITY'] = 82
+# Logged-in user records kept in memory (entries, seconds) so authenticated
+# requests do not query the database just to identify the user.
+app.config['USER_CACHE_SIZE'] = 1024
+app.config['USER_CACHE_TTL'] = 300
+
+# Background tasks for extensions: thread pool size, process pool size (None =
+# one per core, started on first use) and how many tasks one extension may run
+# at once (a manifest can set its own "max_concurrent_tasks").
+app.config['TASK_THREADS'] = 8
+app.config['TASK_PROCESSES'] = None
+app.config['TASKS_PER_EXTENSION'] = 2
+
+# Message queue shared by Socket.IO workers (see serve.py): a redis:// or amqp://
+# URL, or nexuss://host:port for the bundled broker. None = single process.
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('NEXUSS_MESSAGE_QUEUE')
+# Processes serving this workspace (set by serve.py). With more than one, file
+# versions are kept in file mtimes, saves land on disk before the reply, and
+# user cache invalidations reach every process through a stamp file.
+app.config['WORKERS'] = int(os.environ.get('NEXUSS_WORKERS', 1))
+
+# Bearer token required by /metrics; None leaves it open (scrape it from a private network).
+app.config['METRICS_TOKEN'] = None
 
 # Configuration for Folders
 BASE_DIR = os.getcwd()
 WORKSPACE_DIR = os.path.join(BASE_DIR, 'workspace')
 EXTENSIONS_DIR = os.path.join(BASE_DIR, 'extensions')
 STATIC_IMAGES_DIR = os.path.join(BASE_DIR, 'static', 'images')
+app.config['WORKSPACE_DIR'] = WORKSPACE_DIR
+# Precompressed (gzip/brotli) copies of served assets
+ASSET_CACHE_DIR = os.path.join(app.instance_path, 'asset-cache')
 
 # Create directories
-for d in [WORKSPACE_DIR, EXTENSIONS_DIR, STATIC_IMAGES_DIR]:
+for d in [WORKSPACE_DIR, EXTENSIONS_DIR, STATIC_IMAGES_DIR, app.instance_path]:
     os.makedirs(d, exist_ok=True)
 
 # Initialize Database, Login Manager, and SocketIO
@@ -33,7 +141,75 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 migrate = Migrate(app, db)
-socketio = SocketIO(app)
+# Request/event metrics for /metrics; extensions find it in app.extensions['metrics']
+metrics = Metrics()
+metrics.install(app)
+socketio = MetricsSocketIO(app, metrics=metrics, **socketio_options(app.config['SOCKETIO_MESSAGE_QUEUE']))
+# Shared pools and event loop for extension background work: app.extensions['tasks']
+task_manager = TaskManager(socketio, app.config['TASK_THREADS'], app.config['TASK_PROCESSES'], app.config['TASKS_PER_EXTENSION'])
+app.extensions['tasks'] = task_manager
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection): return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+# Workspace ignore rules and the subtree listing cache used by the tree API
+ignore_rules = IgnoreRules(WORKSPACE_DIR, app.config['WORKSPACE_IGNORE'])
+_tree_cache = {}
+_tree_cache_lock = threading.Lock()
+
+# Per-file version numbers backing conflict detection in the save API
+SHARED_WORKSPACE = app.config['WORKERS'] > 1
+file_versions = SharedVersionStore(os.path.join(app.instance_path, 'file-versions.lock')) if SHARED_WORKSPACE else VersionStore()
+
+def on_save_written(file_path, version, error):
+    if error is not None:
+        file_versions.drop(file_path, version)
+        return
+    file_versions.settle(file_path, version)
+    notify_workspace_write(os.path.relpath(file_path, WORKSPACE_DIR))
+
+# Saves land on disk from here; queued content is flushed at exit
+write_queue = WriteBehindQueue(app.config['SAVE_WRITE_DELAY'], app.config['SAVE_FSYNC'], on_save_written,
+                               stamp_mtime=SHARED_WORKSPACE)
+atexit.register(write_queue.flush)
+
+# Decoded results of /api/files/read, validated against (mtime, size) on every hit
+read_cache = ContentCache(app.config['READ_CACHE_BYTES'])
+
+# Persistent trigram index behind /api/search, stored next to the database
+search_index = TrigramIndex(os.path.join(app.instance_path, 'search_index.sqlite3'), WORKSPACE_DIR,
+                            ignore_rules, app.config['SEARCH_MAX_FILE_BYTES'])
+
+# Persistent symbol index behind the outline and go-to-symbol APIs
+symbol_index = SymbolIndex(os.path.join(app.instance_path, 'symbol_index.sqlite3'), WORKSPACE_DIR,
+                           ignore_rules, app.config['SYMBOL_MAX_FILE_BYTES'])
+
+# Content-hashed names for files under static/, served with immutable caching
+asset_manifest = AssetManifest(app.static_folder, os.path.join(ASSET_CACHE_DIR, 'static'))
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file under its content-hashed name (plain /static URL if it is missing)."""
+    hashed = asset_manifest.hashed_name(filename)
+    return url_for('fingerprinted_asset', filename=hashed) if hashed else url_for('static', filename=filename)
+
+# Detached User rows by id, in front of the Flask-Login user loader
+user_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'],
+                      os.path.join(app.instance_path, 'user-cache.stamp') if SHARED_WORKSPACE else None)
+
+# Parsed manifests of every extension, refreshed by mtime
+extension_registry = ExtensionRegistry(EXTENSIONS_DIR)
+
+def notify_workspace_write(*rel_paths):
+    """Called after the API writes files so derived indexes and caches pick up the change."""
+    read_cache.invalidate(*(os.path.join(WORKSPACE_DIR, p) for p in rel_paths))
+    search_index.schedule(*rel_paths)
+    symbol_index.schedule(*rel_paths)
 
 # ==========================================
 # 2. DATABASE MODELS & AUTH
@@ -47,8 +223,27 @@ class User(UserMixin, db.Model):
 def load_user(user_id):
     """
     **CODE QUALITY FIX**: Replaced legacy `User.query.get()` with `db.session.get()`.
+    Rows are cached detached; merge(load=False) attaches a copy to this
+    request's session without a query, so relationships still lazy-load.
     """
-    return db.session.get(User, int(user_id))
+    user_id = int(user_id)
+    cached = user_cache.get(user_id)
+    if cached is None:
+        cached = db.session.get(User, user_id)
+        if cached is None: return None
+        db.session.expunge(cached)
+        user_cache.set(user_id, cached)
+    return db.session.merge(cached, load=False)
+
+def invalidate_user(user_id):
+    """Drops a user from the loader cache; call after changing or deleting the row outside the ORM."""
+    user_cache.invalidate(int(user_id))
+
+# ORM writes to a user (password change, rename, delete) evict it automatically.
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _evict_cached_user(mapper, connection, target):
+    invalidate_user(target.id)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -69,6 +264,8 @@ def register():
             new_user = User(username=request.form.get('username'), password=generate_password_hash(request.form.get('password')))
             db.session.add(new_user)
             db.session.commit()
+            # SQLite can reuse the id of a deleted user; never serve its cached row.
+            invalidate_user(new_user.id)
             flash('Account created! Please login.', 'success')
             return redirect(url_for('login'))
     return render_template('login.html', page='register')
@@ -76,70 +273,340 @@ def register():
 @app.route('/logout')
 @login_required
 def logout():
+    invalidate_user(current_user.id)
     logout_user()
     return redirect(url_for('login'))
 
+@app.route('/api/auth/user-cache', methods=['GET'])
+@login_required
+def user_cache_stats():
+    """Hit/miss counters of the user loader cache."""
+    return jsonify(user_cache.stats())
+
 # ==========================================
 # 3. CORE IDE & SETTINGS ROUTES
 # ==========================================
 @app.route('/')
 @login_required
 def ide():
-    return render_template('ide.html', user=current_user)
+    return render_template('ide.html', user=current_user, wallpapers=wallpaper_variants())
 
 @app.route('/settings')
 @login_required
 def settings():
     return render_template('settings.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of request, Socket.IO and cache metrics."""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+metrics.callback_counter('nexuss_user_cache_lookups_total', 'User loader cache lookups by result.',
+                         lambda: {'hit': user_cache.hits, 'miss': user_cache.misses}, ('result',))
+metrics.gauge('nexuss_save_queue_pending', 'Saves queued or being written.',
+              lambda: {state: write_queue.stats()[state] for state in ('queued', 'in_flight')}, ('state',))
+metrics.callback_counter('nexuss_save_writes_total', 'Queued saves by outcome.',
+                         lambda: {k: write_queue.stats()[k] for k in ('writes', 'coalesced', 'errors')}, ('outcome',))
+metrics.callback_counter('nexuss_read_cache_lookups_total', 'File read cache lookups by result.',
+                         lambda: {'hit': read_cache.hits, 'miss': read_cache.misses}, ('result',))
+metrics.gauge('nexuss_read_cache_bytes', 'Memory held by cached file contents.', lambda: read_cache.bytes)
+metrics.gauge('nexuss_tasks', 'Extension background tasks by state (recent history included).',
+              task_manager.counts, ('state',))
+metrics.gauge('nexuss_symbols', 'Symbols held by the outline / go-to-symbol index.', lambda: symbol_index.symbol_count)
+metrics.gauge('nexuss_tree_cache_entries', 'Cached subtree listings.', lambda: len(_tree_cache))
+metrics.gauge('nexuss_extensions', 'Extensions by load status.',
+              lambda: {status: sum(1 for r in extension_report if r['status'] == status)
+                       for status in {r['status'] for r in extension_report}}, ('status',))
+
 @app.route('/settings/upload-wallpaper', methods=['POST'])
 @login_required
 def upload_wallpaper():
     file = request.files.get('wallpaper')
     if file and file.filename:
-        file.save(os.path.join(STATIC_IMAGES_DIR, 'app_wallpaper.jpg'))
+        if IMAGE_VARIANTS:
+            try: save_image_variants(file.stream, STATIC_IMAGES_DIR, 'app_wallpaper', app.config['WALLPAPER_WIDTHS'], app.config['WALLPAPER_QUALITY'])
+            except ImageError:
+                flash('That file is not an image we can read.', 'error')
+                return redirect(url_for('settings'))
+        else:
+            file.save(os.path.join(STATIC_IMAGES_DIR, 'app_wallpaper.jpg'))
         flash('Wallpaper updated!', 'success')
     else:
         flash('No file selected', 'error')
     return redirect(url_for('settings'))
 
+def wallpaper_variants():
+    """[{width, url, webp}] of the app drawer wallpaper, smallest first; the page picks one for its screen."""
+    variants = [{'width': v['width'], 'url': asset_url('images/' + v['jpg']),
+                 'webp': asset_url('images/' + v['webp']) if v['webp'] else None}
+                for v in list_image_variants(STATIC_IMAGES_DIR, 'app_wallpaper')]
+    if not variants and os.path.isfile(os.path.join(STATIC_IMAGES_DIR, 'app_wallpaper.jpg')):
+        variants = [{'width': 0, 'url': asset_url('images/app_wallpaper.jpg'), 'webp': None}]
+    return variants
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Static files by content-hashed name: precompressed, cached for a year as immutable."""
+    return asset_manifest.send(filename)
+
+def build_static_assets():
+    """Hashes and precompresses static/, and derives wallpaper variants for a wallpaper that has none."""
+    started = time.perf_counter()
+    wallpaper = os.path.join(STATIC_IMAGES_DIR, 'app_wallpaper.jpg')
+    if IMAGE_VARIANTS and os.path.isfile(wallpaper) and not list_image_variants(STATIC_IMAGES_DIR, 'app_wallpaper'):
+        try:
+            with open(wallpaper, 'rb') as f:
+                save_image_variants(f, STATIC_IMAGES_DIR, 'app_wallpaper', app.config['WALLPAPER_WIDTHS'], app.config['WALLPAPER_QUALITY'])
+        except (ImageError, OSError) as e:
+            print(f"[!] Could not create wallpaper variants: {e}")
+    count = asset_manifest.build()
+    return count, (time.perf_counter() - started) * 1000
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static assets ahead of time."""
+    count, elapsed = build_static_assets()
+    print(f"Built {count} static assets in {elapsed:.1f} ms")
+
 # ==========================================
 # 4. FILE SYSTEM API
 # ==========================================
-def scan_directory(path):
+def scan_directory(path, depth=None, dirs_seen=None):
+    """
+    Lists `path` as a tree. `depth` limits how many folder levels are expanded
+    (None = unlimited); folders at the limit are returned without a `children`
+    key so the client can fetch them lazily. Ignored paths are skipped entirely.
+    Every folder that was actually listed is appended to `dirs_seen` as
+    (path, mtime_ns), stat'ed before it is read, so a change made while the
+    scan runs never ends up in the signature without being in the tree.
+    """
     tree = []
+    if dirs_seen is not None: dirs_seen.extend(_dir_signature([path]))
     try:
         with os.scandir(path) as it:
             entries = sorted(list(it), key=lambda e: (not e.is_dir(), e.name.lower()))
             for entry in entries:
-                node = {'name': entry.name, 'path': os.path.relpath(entry.path, WORKSPACE_DIR), 'type': 'folder' if entry.is_dir() else 'file'}
-                if entry.is_dir(): node['children'] = scan_directory(entry.path)
+                is_dir = entry.is_dir()
+                rel_path = os.path.relpath(entry.path, WORKSPACE_DIR)
+                if ignore_rules.is_ignored(rel_path, is_dir): continue
+                node = {'name': entry.name, 'path': rel_path, 'type': 'folder' if is_dir else 'file'}
+                if is_dir and (depth is None or depth > 1):
+                    node['children'] = scan_directory(entry.path, None if depth is None else depth - 1, dirs_seen)
                 tree.append(node)
     except Exception as e: print(f"Scan Error: {e}")
     return tree
 
+def _dir_signature(dirs):
+    """(path, mtime_ns) for each folder; a folder's mtime changes whenever an entry is added, removed or renamed."""
+    sig = []
+    for d in dirs:
+        try: sig.append((d, os.stat(d).st_mtime_ns))
+        except OSError: sig.append((d, None))
+    return sig
+
+def get_cached_tree(root, depth):
+    """
+    Returns (etag, tree) for a subtree, re-using the previous listing when none
+    of the folders it covers has changed. Validating a cache hit costs one
+    stat() per listed folder instead of a full scandir walk.
+    """
+    rules_version = ignore_rules.refresh()
+    key = (root, depth)
+    with _tree_cache_lock:
+        cached = _tree_cache.get(key)
+    if cached and cached['rules_version'] == rules_version and _dir_signature(cached['dirs']) == cached['signature']:
+        return cached['etag'], cached['tree']
+
+    signature = []
+    tree = scan_directory(root, depth, signature)
+    dirs = [d for d, _ in signature]
+    digest = hashlib.sha1(repr((rules_version, depth, signature)).encode('utf-8')).hexdigest()
+    # A folder changed while it was being scanned: serve this listing but do not cache it.
+    if _dir_signature(dirs) != signature: return digest, tree
+    entry = {'rules_version': rules_version, 'dirs': dirs, 'signature': signature, 'etag': digest, 'tree': tree}
+    with _tree_cache_lock:
+        _tree_cache.pop(key, None)
+        _tree_cache[key] = entry
+        while len(_tree_cache) > app.config['TREE_CACHE_SIZE']:
+            _tree_cache.pop(next(iter(_tree_cache)))
+    return digest, tree
+
 @app.route('/api/files/tree', methods=['GET'])
 @login_required
-def get_file_tree(): return jsonify(scan_directory(WORKSPACE_DIR))
+def get_file_tree():
+    """
+    Query params:
+      path  - folder to list, relative to the workspace (default: workspace root)
+      depth - number of folder levels to expand (default 1, capped by TREE_MAX_DEPTH)
+    Replies with an ETag; a matching If-None-Match gets an empty 304.
+    """
+    rel_path = request.args.get('path', '').strip('/')
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    root = os.path.join(WORKSPACE_DIR, rel_path) if rel_path else WORKSPACE_DIR
+    if not os.path.isdir(root): return jsonify({'error': 'Folder not found'}), 404
+    depth = max(1, min(request.args.get('depth', 1, type=int), app.config['TREE_MAX_DEPTH']))
+
+    etag, tree = get_cached_tree(root, depth)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(tree)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _int_field(data, name, default, minimum):
+    """An integer field of a JSON body; ValueError (answered with 400) if it is not a number >= minimum."""
+    value = data.get(name)
+    if value is None: return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)): raise ValueError(f'{name} must be an integer')
+    try: value = int(value)
+    except ValueError: raise ValueError(f'{name} must be an integer') from None
+    if value < minimum: raise ValueError(f'{name} must be at least {minimum}')
+    return value
+
+def read_variant(data, size):
+    """Which slice of the file a read request asks for; part of the cache key and the ETag."""
+    if data.get('start_line') is not None:
+        return ('lines', _int_field(data, 'start_line', 0, 0),
+                min(_int_field(data, 'line_count', 1000, 1), app.config['READ_MAX_LINES']))
+    if data.get('offset') is not None or size > app.config['READ_FULL_LIMIT']:
+        return ('bytes', _int_field(data, 'offset', 0, 0),
+                min(_int_field(data, 'length', app.config['READ_PAGE_BYTES'], 1), app.config['READ_PAGE_BYTES']))
+    return ('full',)
+
+def read_payload(file_path, size, variant):
+    """
+    Text is read the way save_file reads the base it applies edits to: strict
+    UTF-8, line endings kept. `eol` tells the editor which endings it got.
+    """
+    if sniff_binary(file_path): return describe_file(file_path)
+    if variant[0] in ('lines', 'bytes'):
+        # A page past the sniffed start may not be UTF-8: it is shown, flagged `lossy`, and the
+        # editor keeps the file read-only (a save would write the replacement characters back).
+        try: payload = read_page(file_path, size, variant, 'strict')
+        except UnicodeDecodeError: payload = dict(read_page(file_path, size, variant, 'replace'), lossy=True)
+        return dict(payload, eol=detect_eol(payload['content']))
+    # The sniff only checks the start: invalid UTF-8 further in is treated as binary too.
+    try:
+        with open(file_path, 'r', encoding='utf-8', newline='') as f: content = f.read()
+    except UnicodeDecodeError: return describe_file(file_path)
+    return {'content': content, 'size': size, 'eol': detect_eol(content)}
+
+def read_page(file_path, size, variant, errors):
+    if variant[0] == 'lines':
+        content, offset, next_line, total_lines = read_line_range(file_path, variant[1], variant[2], errors)
+        return {'content': content, 'size': size, 'offset': offset, 'next_line': next_line,
+                'total_lines': total_lines, 'partial': True}
+    offset = variant[1]
+    content, next_offset = read_byte_range(file_path, offset, variant[2], errors=errors)
+    return {'content': content, 'size': size, 'offset': offset, 'next_offset': next_offset,
+            'partial': offset > 0 or next_offset is not None}
 
 @app.route('/api/files/read', methods=['POST'])
 @login_required
 def read_file():
-    rel_path = request.json.get('path')
+    """
+    Body: {path} plus optional paging fields:
+      offset/length        - a byte range (aligned to line and character boundaries)
+      start_line/line_count - a range of whole lines (0-based)
+    Files above READ_FULL_LIMIT are paged automatically from offset 0, and
+    binary files return metadata instead of content. Replies carry an ETag;
+    a matching If-None-Match gets an empty 304.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('path'), str): return jsonify({'error': 'Missing path'}), 400
+    rel_path = data['path']
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    file_path = os.path.join(WORKSPACE_DIR, rel_path)
+    if write_queue.pending(file_path) is not None: write_queue.flush(file_path)
+    if not os.path.isfile(file_path): return jsonify({'error': 'File not found'}), 404
+
+    # Version first: if the file changes mid-read, the next save conflicts instead of clobbering.
+    version = file_versions.current(file_path)
+    st = os.stat(file_path)
+    try: variant = read_variant(data, st.st_size)
+    except ValueError as e: return jsonify({'error': str(e)}), 400
+    etag = hashlib.sha1(repr((rel_path, version, st.st_mtime_ns, st.st_size, variant)).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        payload = read_cache.get(file_path, st, variant)
+        if payload is None:
+            payload = read_payload(file_path, st.st_size, variant)
+            read_cache.put(file_path, st, variant, payload)
+        response = jsonify(payload if payload.get('binary') else dict(payload, version=version))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/files/raw', methods=['GET'])
+@login_required
+def stream_file():
+    """Streams a file as-is (any type) with HTTP Range support, for downloads and binary previews."""
+    rel_path = request.args.get('path', '')
     if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
     file_path = os.path.join(WORKSPACE_DIR, rel_path)
-    if os.path.isfile(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f: return jsonify({'content': f.read()})
-    return jsonify({'error': 'File not found'}), 404
+    if write_queue.pending(file_path) is not None: write_queue.flush(file_path)
+    if not os.path.isfile(file_path): return jsonify({'error': 'File not found'}), 404
+    return send_file(file_path, conditional=True, as_attachment=request.args.get('download') == '1')
 
 @app.route('/api/files/save', methods=['POST'])
 @login_required
 def save_file():
-    rel_path, content = request.json.get('path'), request.json.get('content')
+    """
+    Body: {path, content} for a full write, or {path, base_version, edits} to
+    apply Monaco content changes ({offset, length, text}) on the server.
+    A `base_version` that is no longer current is rejected with 409 so two
+    tabs cannot silently overwrite each other. Replies with the new version
+    as soon as the write is queued; it reaches the disk shortly after (see
+    SAVE_WRITE_DELAY), and reads of the file wait for it. With several
+    workers (WORKERS) the write lands before the reply.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('path'), str): return jsonify({'error': 'Missing path'}), 400
+    rel_path, content, edits, base_version = data['path'], data.get('content'), data.get('edits'), data.get('base_version')
     if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    if content is None and edits is None: return jsonify({'error': 'Nothing to save'}), 400
+    if content is not None and not isinstance(content, str): return jsonify({'error': 'content must be a string'}), 400
+    if edits is not None and not isinstance(edits, list): return jsonify({'error': 'edits must be a list'}), 400
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return jsonify({'error': 'base_version must be an integer'}), 400
+    if edits is not None and base_version is None: return jsonify({'error': 'base_version is required with edits'}), 400
     file_path = os.path.join(WORKSPACE_DIR, rel_path)
-    with open(file_path, 'w', encoding='utf-8') as f: f.write(content)
-    return jsonify({'success': True})
+    if not os.path.isdir(os.path.dirname(file_path)): return jsonify({'error': 'Folder not found'}), 404
+    with file_versions.lock(file_path):
+        try: current = file_versions.check(file_path, base_version) if base_version is not None else None
+        except VersionConflict as e: return jsonify({'error': 'Version conflict', 'version': e.current}), 409
+        if edits is not None:
+            if current is None: return jsonify({'error': 'File not found'}), 404
+            text = write_queue.pending(file_path)
+            if text is None:
+                # Same decoding as read_payload, so Monaco's offsets match (CRLF stays two characters).
+                try:
+                    with open(file_path, 'r', encoding='utf-8', newline='') as f: text = f.read()
+                except UnicodeDecodeError:
+                    # Rewritten as non-UTF-8 behind our back: a conflict, so the client asks to reopen it.
+                    return jsonify({'error': 'File is not valid UTF-8', 'version': current}), 409
+            try: content = apply_text_edits(text, edits)
+            except ValueError as e: return jsonify({'error': f'Invalid edits: {e}'}), 400
+        version = file_versions.reserve(file_path, current)
+        write_queue.put(file_path, content, version)
+        if SHARED_WORKSPACE:
+            # Other workers cannot see this process's queue: land the save before replying.
+            write_queue.flush(file_path)
+            if file_versions.current(file_path) != version: return jsonify({'error': 'Save failed'}), 500
+    return jsonify({'success': True, 'version': version})
+
+@app.route('/api/files/flush', methods=['POST'])
+@login_required
+def flush_files():
+    """Writes every queued save to disk now (e.g. before a shutdown or a backup)."""
+    write_queue.flush()
+    return jsonify({'success': True, **write_queue.stats()})
 
 @app.route('/api/files/upload', methods=['POST'])
 @login_required
@@ -150,68 +617,440 @@ def upload_file_api():
     if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
     full_path = os.path.join(WORKSPACE_DIR, rel_path)
     os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    write_queue.flush(full_path)  # a save still queued for this path must not land on top of the upload
     file.save(full_path)
+    notify_workspace_write(rel_path)
     return jsonify({'success': True})
 
+@app.route('/api/files/import', methods=['POST'])
+@login_required
+def import_files():
+    """
+    Imports a whole folder in one request. The body is a tar (optionally
+    compressed), a zip, or a multipart form whose file parts carry their
+    relative path as the filename. Query params: `path` (target folder,
+    default workspace root) and `import_id`, which tags the `import_progress`
+    events sent on the '/workspace' namespace, to the importing user only,
+    while the import runs.
+    """
+    rel_path = request.args.get('path', '').strip('/')
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    root = os.path.join(WORKSPACE_DIR, rel_path) if rel_path else WORKSPACE_DIR
+    os.makedirs(root, exist_ok=True)
+    write_queue.flush()  # imported files win over saves still queued for the same paths
+    import_id = request.args.get('import_id')
+    user_room = f'user_{current_user.id}'
+
+    def report(payload):
+        if import_id: socketio.emit('import_progress', dict(payload, import_id=import_id), namespace='/workspace', to=user_room)
+
+    progress = ImportProgress(report, max_files=app.config['IMPORT_MAX_FILES'], max_bytes=app.config['IMPORT_MAX_BYTES'])
+    try:
+        summary = import_stream(request.stream, request.content_type, root, progress)
+    except ImportRejected as e:
+        progress.report(done=True, error=str(e))
+        return jsonify({'error': str(e), **progress.summary()}), 400
+    finally:
+        notify_workspace_write(*(os.path.relpath(p, WORKSPACE_DIR) for p in progress.written))
+    progress.report(done=True)
+    return jsonify({'success': True, **summary})
+
+@app.route('/api/files/export', methods=['GET'])
+@login_required
+def export_files():
+    """
+    Downloads a folder as an archive, built while it is sent. Query params:
+    `path` (folder, default workspace root) and `format`: 'zip' (default) or
+    'tar'. Ignored paths are left out. Tar downloads carry an ETag and honour
+    Range/If-Range, so an interrupted download can be resumed.
+    """
+    rel_path = request.args.get('path', '').strip('/')
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    fmt = request.args.get('format', 'zip')
+    if fmt not in ('zip', 'tar'): return jsonify({'error': 'format must be zip or tar'}), 400
+    root = os.path.join(WORKSPACE_DIR, rel_path) if rel_path else WORKSPACE_DIR
+    if not os.path.isdir(root): return jsonify({'error': 'Folder not found'}), 404
+    write_queue.flush()  # export what the editor has saved, not what is still queued
+    ignore_rules.refresh()
+    plan = ExportPlan(root, ignore_rules, WORKSPACE_DIR)
+    filename = f"{secure_filename(os.path.basename(root)) or 'workspace'}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-cache'}
+
+    if fmt == 'zip':
+        headers['Accept-Ranges'] = 'none'
+        return Response(plan.iter_zip(app.config['EXPORT_ZIP_LEVEL']), mimetype='application/zip', headers=headers)
+
+    start, stop, status = 0, plan.tar_size, 200
+    # If-Range: only resume when the archive is byte-for-byte the one the client started on.
+    if request.range and len(request.range.ranges) == 1 and (not request.if_range.etag or request.if_range.etag == plan.etag) and not request.if_range.date:
+        byte_range = request.range.range_for_length(plan.tar_size)
+        if byte_range is None:
+            return Response(status=416, headers={'Content-Range': f'bytes */{plan.tar_size}'})
+        (start, stop), status = byte_range, 206
+    response = Response(plan.iter_tar(start, stop), status=status, mimetype='application/x-tar', headers=headers)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.content_length = stop - start
+    if status == 206: response.content_range = ContentRange('bytes', start, stop, plan.tar_size)
+    response.set_etag(plan.etag)
+    return response
+
+# ------------------------------------------
+# Live workspace updates (SocketIO '/workspace')
+# ------------------------------------------
+def on_workspace_changes(events):
+    """
+    Pushes structural changes to every open explorer (content-only 'modify'
+    events stay server-side) and feeds all of them to the search index, so
+    edits made from the terminal or by extensions are searchable too (the
+    symbol index follows the same events).
+    """
+    changes = [e for e in events if e['op'] != 'modify']
+    if changes: socketio.emit('tree_changes', changes, namespace='/workspace')
+    touched = [e['path'] for e in events] + [e['old_path'] for e in events if e['op'] == 'rename']
+    read_cache.invalidate(*(os.path.join(WORKSPACE_DIR, p) for p in touched))
+    search_index.schedule(*touched)
+    symbol_index.schedule(*touched)
+
+workspace_index = WorkspaceIndex(WORKSPACE_DIR, ignore_rules, on_change=on_workspace_changes)
+_workspace_watcher = None
+_workspace_watcher_lock = threading.Lock()
+_watcher_leader_file = None
+
+def claim_watcher_leadership():
+    """
+    With several workers only one watches the workspace; its `tree_changes`
+    reach every explorer through the message queue. The leader holds an
+    exclusive lock on a file in the instance folder, released when it exits.
+    """
+    global _watcher_leader_file
+    if _watcher_leader_file is not None: return True
+    lock_file = open(os.path.join(app.instance_path, 'workspace-watcher.lock'), 'a')
+    try: fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _watcher_leader_file = lock_file
+    return True
+
+def start_workspace_watcher():
+    """Builds the index and starts the watcher once, on the first explorer connection (leader only)."""
+    global _workspace_watcher
+    if app.config['WORKSPACE_WATCHER'] == 'off': return
+    with _workspace_watcher_lock:
+        if _workspace_watcher is None and claim_watcher_leadership():
+            try:
+                _workspace_watcher = start_watcher(workspace_index, app.config['WORKSPACE_WATCHER'], app.config['WORKSPACE_POLL_INTERVAL'])
+                print(f"[+] Workspace watcher started ({_workspace_watcher.name}), {len(workspace_index.entries)} paths indexed.")
+            except Exception as e: print(f"[!] Workspace watcher failed to start: {e}")
+
+class WorkspaceNamespace(Namespace):
+    """
+    Delivers `tree_changes` events (lists of add/remove/rename) to every file
+    explorer, and `import_progress` to the user running the import (each
+    connection joins its user's room).
+    """
+
+    def on_connect(self):
+        if not current_user.is_authenticated: return False
+        join_room(f'user_{current_user.id}')
+        if _workspace_watcher is None: socketio.start_background_task(start_workspace_watcher)
+
+socketio.on_namespace(WorkspaceNamespace('/workspace'))
+
+# ------------------------------------------
+# Full-text search
+# ------------------------------------------
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_workspace():
+    """
+    Query params: q, regex=1, case=1, limit, path (folder to search in).
+    Streams newline-delimited JSON: one {path, line, column, text} object per
+    match, then a final {done, count, indexing} summary line.
+    """
+    query = request.args.get('q', '')
+    if not query: return jsonify({'error': 'Empty query'}), 400
+    is_regex, case_sensitive = request.args.get('regex') == '1', request.args.get('case') == '1'
+    if is_regex:
+        try: re.compile(query)
+        except re.error as e: return jsonify({'error': f'Invalid regex: {e}'}), 400
+    rel_path = request.args.get('path', '').strip('/')
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    limit = max(1, min(request.args.get('limit', 200, type=int), app.config['SEARCH_MAX_RESULTS']))
+
+    search_index.ensure_reconciled()
+    matches = search_index.search(query, regex=is_regex, case_sensitive=case_sensitive, limit=limit, path_prefix=rel_path)
+
+    def generate():
+        count = 0
+        for match in matches:
+            count += 1
+            yield json.dumps(match) + '\n'
+        yield json.dumps({'done': True, 'count': count, 'indexing': search_index.reconciling}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+# ------------------------------------------
+# Symbols (outline, go-to-symbol, go-to-definition)
+# ------------------------------------------
+@app.route('/api/symbols', methods=['GET'])
+@login_required
+def find_symbols():
+    """
+    Query params: q (name, prefix or fuzzy characters in order), kind
+    (comma-separated), path (folder to search in), limit. Results are ranked
+    exact, prefix, substring, fuzzy.
+    """
+    query = request.args.get('q', '').strip()
+    if not query: return jsonify({'error': 'Empty query'}), 400
+    rel_path = request.args.get('path', '').strip('/')
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    kinds = set(filter(None, request.args.get('kind', '').split(','))) or None
+    limit = max(1, min(request.args.get('limit', 50, type=int), app.config['SYMBOL_MAX_RESULTS']))
+    symbol_index.ensure_reconciled()
+    return jsonify({'symbols': symbol_index.lookup(query, limit, kinds, rel_path), 'indexing': symbol_index.reconciling})
+
+@app.route('/api/symbols/definition', methods=['GET'])
+@login_required
+def find_definition():
+    """Query params: name, path (the file being edited, preferred on ties), limit."""
+    name = request.args.get('name', '').strip()
+    if not name: return jsonify({'error': 'Empty name'}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), app.config['SYMBOL_MAX_RESULTS']))
+    symbol_index.ensure_reconciled()
+    return jsonify({'symbols': symbol_index.definitions(name, request.args.get('path'), limit), 'indexing': symbol_index.reconciling})
+
+@app.route('/api/symbols/outline', methods=['GET'])
+@login_required
+def file_outline():
+    """Symbols of one file in source order, for the editor's outline."""
+    rel_path = request.args.get('path', '')
+    if '..' in rel_path or rel_path.startswith('/'): return jsonify({'error': 'Invalid path'}), 400
+    file_path = os.path.join(WORKSPACE_DIR, rel_path)
+    if write_queue.pending(file_path) is not None: write_queue.flush(file_path)
+    if not os.path.isfile(file_path): return jsonify({'error': 'File not found'}), 404
+    return jsonify({'path': rel_path, 'symbols': symbol_index.outline(rel_path)})
+
 # ==========================================
 # 5. EXTENSION SYSTEM (PLUGIN LOADER & API)
 # ==========================================
+# Startup timing of every Python extension, plus lazy loads as they happen
+extension_report = []
+# base_route -> LazyExtension for extensions deferred with "lazy": true
+_lazy_extensions = {}
+
+@app.route('/api/tasks', methods=['GET'])
+@login_required
+def list_tasks():
+    """Background tasks started on behalf of the current user (most recent last)."""
+    return jsonify([t.to_dict() for t in task_manager.tasks(user_id=current_user.id)])
+
+@app.route('/api/tasks/<task_id>', methods=['GET'])
+@login_required
+def get_task(task_id):
+    task = task_manager.get(task_id)
+    if task is None or task.user_id != current_user.id: return jsonify({'error': 'Task not found'}), 404
+    return jsonify(task.to_dict())
+
+@app.route('/api/tasks/<task_id>/cancel', methods=['POST'])
+@login_required
+def cancel_task(task_id):
+    task = task_manager.get(task_id)
+    if task is None or task.user_id != current_user.id: return jsonify({'error': 'Task not found'}), 404
+    return jsonify({'success': task_manager.cancel(task_id), **task.to_dict()})
+
+class TasksNamespace(Namespace):
+    """Delivers `task_update` events for the connected user's background tasks."""
+
+    def on_connect(self):
+        if not current_user.is_authenticated: return False
+        join_room(f'user_{current_user.id}')
+
+socketio.on_namespace(TasksNamespace('/tasks'))
+
+def load_extension(flask_app, database, ext):
+    """Imports one extension and registers its blueprint. Returns its timing record."""
+    manifest, item_name = ext.manifest, ext.folder_name
+    record = {'name': manifest.get('name', item_name), 'folder_name': item_name, 'lazy': bool(manifest.get('lazy')),
+              'import_ms': None, 'init_ms': None, 'status': 'skipped'}
+    try:
+        entry_point = manifest.get('entry_point')
+        if not entry_point: return record
+        
+        started = time.perf_counter()
+        module_name = f"extensions.{item_name}.{entry_point.replace('.py', '')}"
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(ext.path, entry_point))
+        ext_module = importlib.util.module_from_spec(spec)
+        # Registered so its functions can be pickled by reference (process-pool tasks).
+        sys.modules[module_name] = ext_module
+        try: spec.loader.exec_module(ext_module)
+        except BaseException:
+            sys.modules.pop(module_name, None)
+            raise
+        record['import_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        
+        task_manager.set_limit(item_name, manifest.get('max_concurrent_tasks', app.config['TASKS_PER_EXTENSION']))
+        init_function_name = manifest.get('init_function', 'create_blueprint')
+        init_function = getattr(ext_module, init_function_name, None)
+        if not init_function: return record
+        
+        started = time.perf_counter()
+        blueprint = init_function(flask_app, database, socketio)
+        if blueprint:
+            flask_app.register_blueprint(blueprint)
+        record['init_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        record['status'] = 'loaded'
+        print(f"[+] Successfully loaded Python extension: '{record['name']}'")
+    except Exception as e:
+        record.update({'status': 'failed', 'error': str(e)})
+        print(f"[!] FAILED to load Python extension '{item_name}': {e}")
+    return record
+
+def print_extension_report():
+    print("--- Extension Startup Report ---")
+    total = 0.0
+    for r in extension_report:
+        if r['status'] == 'deferred':
+            print(f"  {r['name']:<28} deferred until first request to {r['base_route']}")
+            continue
+        cost = (r['import_ms'] or 0) + (r['init_ms'] or 0)
+        total += cost
+        print(f"  {r['name']:<28} import {r['import_ms'] or 0:>8.1f} ms   init {r['init_ms'] or 0:>8.1f} ms   {r['status']}")
+    print(f"  {'total':<28} {total:>15.1f} ms")
+
 def load_extensions(flask_app, database):
     print("--- Starting Extension Discovery ---")
-    for item_name in os.listdir(EXTENSIONS_DIR):
-        ext_path = os.path.join(EXTENSIONS_DIR, item_name)
-        manifest_path = os.path.join(ext_path, 'manifest.json')
-        if os.path.isdir(ext_path) and os.path.exists(manifest_path):
-            try:
-                with open(manifest_path, 'r') as f: manifest = json.load(f)
-                entry_point = manifest.get('entry_point')
-                if not entry_point: continue
-                
-                module_name = f"extensions.{item_name}.{entry_point.replace('.py', '')}"
-                spec = importlib.util.spec_from_file_location(module_name, os.path.join(ext_path, entry_point))
-                ext_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(ext_module)
-                
-                init_function_name = manifest.get('init_function', 'create_blueprint')
-                init_function = getattr(ext_module, init_function_name, None)
-                if not init_function: continue
-                
-                blueprint = init_function(flask_app, database, socketio)
-                if blueprint:
-                    flask_app.register_blueprint(blueprint)
-                    print(f"[+] Successfully loaded Python extension: '{manifest.get('name', item_name)}'")
-            except Exception as e:
-                print(f"[!] FAILED to load Python extension '{item_name}': {e}")
+    extension_registry.refresh()
+    for ext in extension_registry.entries():
+        if not ext.manifest: continue
+        if ext.manifest.get('lazy') and ext.manifest.get('base_route'):
+            lazy = LazyExtension(ext)
+            _lazy_extensions[ext.manifest['base_route']] = lazy
+            for namespace in ext.manifest.get('namespaces', []):
+                socketio.on_namespace(LazyNamespace(namespace, lazy))
+            extension_report.append(lazy.record)
+            continue
+        extension_report.append(load_extension(flask_app, database, ext))
+    print_extension_report()
+
+def _main_app_url(error, endpoint, values):
+    """url_for() in a lazy extension's app: endpoints it does not have are built from the main app's routes."""
+    if not has_request_context(): return None
+    try: return app.url_map.bind_to_environ(request.environ).build(endpoint, values)
+    except BuildError: return None
+
+def create_extension_app():
+    """
+    The Flask app a lazy extension is registered on. It shares the main app's
+    config, session cookie, login, database, templates and app.extensions, so
+    blueprints behave as they would on the main app, but registering them
+    never touches the main app's URL map while it serves requests. The main
+    app's own before_request hooks do not run for these routes.
+    """
+    ext_app = Flask(__name__, root_path=app.root_path, instance_path=app.instance_path, static_folder=None)
+    ext_app.config.update(app.config)
+    ext_app.extensions.update((name, value) for name, value in app.extensions.items() if name != 'sqlalchemy')
+    db.init_app(ext_app)
+    login_manager.init_app(ext_app)
+    metrics.install(ext_app)
+    ext_app.jinja_env.globals['asset_url'] = asset_url
+    ext_app.url_build_error_handlers.append(_main_app_url)
+    return ext_app
+
+class LazyExtension:
+    """
+    An extension deferred with "lazy": true. It is imported, on an app of its
+    own (create_extension_app), by the first request under its base_route or
+    the first connection to one of the Socket.IO namespaces its manifest lists.
+    """
+
+    def __init__(self, ext):
+        self.ext = ext
+        self.prefix = ext.manifest['base_route'].rstrip('/')
+        self.record = {'name': ext.display_name, 'folder_name': ext.folder_name, 'lazy': True, 'base_route': ext.manifest['base_route'],
+                       'import_ms': None, 'init_ms': None, 'status': 'deferred'}
+        self.app = None
+        self._lock = threading.Lock()
+
+    def matches(self, path):
+        return path == self.prefix or path.startswith(self.prefix + '/')
+
+    def load(self):
+        with self._lock:
+            if self.app is None:
+                ext_app = create_extension_app()
+                with ext_app.app_context(): self.record.update(load_extension(ext_app, db, self.ext))
+                self.app = ext_app
+        return self.app
+
+class LazyExtensionDispatcher:
+    """WSGI middleware: requests under a lazy extension's base_route go to that extension's app."""
+
+    def __init__(self, wsgi_app, extensions):
+        self.wsgi_app, self.extensions = wsgi_app, extensions
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        lazy = next((e for e in self.extensions.values() if e.matches(path)), None)
+        if lazy is None: return self.wsgi_app(environ, start_response)
+        return lazy.load()(environ, start_response)
+
+app.wsgi_app = LazyExtensionDispatcher(app.wsgi_app, _lazy_extensions)
+
+class LazyNamespace(Namespace):
+    """Stands in for a lazy extension's Socket.IO namespace until a client first connects to it."""
+
+    def __init__(self, namespace, lazy):
+        super().__init__(namespace)
+        self.lazy = lazy
+
+    def trigger_event(self, event, *args):
+        with app.app_context(): self.lazy.load()
+        server = self.socketio.server
+        handler = server.namespace_handlers.get(self.namespace)
+        if handler is not None and handler is not self: return handler.trigger_event(event, *args)
+        function = server.handlers.get(self.namespace, {}).get(event)
+        if function is not None: return function(*args)
+        if event == 'connect': return False  # the extension did not register this namespace after all
+
+@app.route('/api/extensions/report', methods=['GET'])
+@login_required
+def extension_startup_report():
+    """Per-extension import/init times; lazy extensions show 'deferred' until first used."""
+    return jsonify(extension_report)
 
 @app.route('/api/extensions', methods=['GET'])
 @login_required
 def list_extensions():
-    apps = []
-    for folder_name in os.listdir(EXTENSIONS_DIR):
-        app_path = os.path.join(EXTENSIONS_DIR, folder_name)
-        manifest_path = os.path.join(app_path, 'manifest.json')
-        if os.path.isdir(app_path):
-            app_info = {'folder_name': folder_name, 'display_name': folder_name, 'icon_filename': 'default', 'type': 'static', 'launch_url': url_for('serve_extension_index', app_name=folder_name)}
-            if os.path.exists(manifest_path):
-                with open(manifest_path, 'r') as f: manifest = json.load(f)
-                app_info.update({'display_name': manifest.get('name', folder_name), 'icon_filename': manifest.get('icon', 'default'), 'type': 'python', 'launch_url': manifest.get('base_route', f'/{folder_name}/')})
-            else:
-                for file in os.listdir(app_path):
-                    if file.lower() in ['icon.png', 'icon.jpg', 'icon.jpeg']:
-                        app_info['icon_filename'] = file
-                        break
+    """Served from the in-memory registry; the ETag changes when any manifest, icon or folder does."""
+    etag = extension_registry.refresh()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        apps = []
+        for ext in extension_registry.entries():
+            app_info = {'folder_name': ext.folder_name, 'display_name': ext.display_name, 'icon_filename': ext.icon_filename, 'type': 'static', 'launch_url': url_for('serve_extension_index', app_name=ext.folder_name)}
+            if ext.is_python:
+                app_info.update({'type': 'python', 'launch_url': ext.manifest.get('base_route', f'/{ext.folder_name}/')})
+            # Icons are cached long-term, so their URL carries a version that changes with the file.
+            if ext.icon_mtime is not None: app_info['icon_version'] = ext.icon_mtime // 1000000
             apps.append(app_info)
-    return jsonify(apps)
+        response = jsonify(apps)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/extension/<app_name>/')
 @login_required
 def serve_extension_index(app_name):
-    return send_from_directory(os.path.join(EXTENSIONS_DIR, app_name), 'index.html')
+    return send_static_file(os.path.join(EXTENSIONS_DIR, app_name), 'index.html', os.path.join(ASSET_CACHE_DIR, 'extensions', app_name))
 
 @app.route('/extension/<app_name>/<path:filename>')
 @login_required
 def serve_extension_asset(app_name, filename):
-    return send_from_directory(os.path.join(EXTENSIONS_DIR, app_name), filename)
+    """Extension files with long-lived (private) caching and gzip/brotli variants."""
+    return send_static_file(os.path.join(EXTENSIONS_DIR, app_name), filename, os.path.join(ASSET_CACHE_DIR, 'extensions', app_name),
+                            max_age=app.config['EXTENSION_ASSET_MAX_AGE'], private=True)
 
 # ==========================================
 # 6. APP INITIALIZATION
@@ -221,6 +1060,13 @@ def serve_extension_asset(app_name, filename):
 with app.app_context():
     load_extensions(app, db)
 
+# Both are in requirements.txt; without them the features below turn off
+if not BROTLI: print("[!] brotli is not installed: static assets are served gzip-compressed only")
+if not IMAGE_VARIANTS: print("[!] Pillow is not installed: wallpaper uploads are stored as-is, without resized variants")
+
+# Warm the static asset manifest and compressed copies without delaying startup
+threading.Thread(target=build_static_assets, name='asset-build', daemon=True).start()
+
 if __name__ == '__main__':
     print("--- Starting Nexuss-IDE Server with SocketIO ---")
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
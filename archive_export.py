@@ -0,0 +1,206 @@
+"""
+Streaming export of a workspace folder as a zip or tar download.
+
+`ExportPlan` walks the folder once (stat only, honouring the ignore rules)
+and records a small manifest entry per file; the archive itself is produced
+chunk by chunk while the response is sent, so memory use is bounded by the
+copy buffer and the manifest, never by file contents.
+
+- tar (uncompressed, PAX headers): every header is a pure function of the
+  manifest, so the archive size and every byte offset are known before a
+  single file is read. That makes the download resumable: `iter_tar(start,
+  stop)` produces any byte range, reading only the files it overlaps. The
+  manifest digest doubles as the ETag, so a resumed request whose files
+  changed in the meantime gets the whole new archive instead of a mix.
+- zip (deflated): written through zipfile onto a non-seekable sink (sizes
+  and CRCs go into data descriptors). Compressed sizes are only known
+  after the fact, so zip downloads are streamed but cannot be resumed.
+
+Symlinks and special files are skipped, like on import. A file that changes
+size while it is being exported is cut or zero-padded to the size in the
+manifest so the archive stays well-formed.
+"""
+import hashlib
+import os
+import stat
+import tarfile
+import time
+import zipfile
+
+COPY_CHUNK = 64 * 1024
+TAR_BLOCK = tarfile.BLOCKSIZE
+TAR_RECORD = tarfile.RECORDSIZE
+
+
+class ExportEntry:
+    __slots__ = ('name', 'path', 'is_dir', 'size', 'mtime', 'mode', 'header_size')
+
+    def __init__(self, name, path, st):
+        self.name = name
+        self.path = path
+        self.is_dir = stat.S_ISDIR(st.st_mode)
+        self.size = 0 if self.is_dir else st.st_size
+        self.mtime = int(st.st_mtime)
+        self.mode = stat.S_IMODE(st.st_mode)
+        self.header_size = len(self.tar_header())
+
+    def tar_header(self):
+        info = tarfile.TarInfo(self.name + '/' if self.is_dir else self.name)
+        info.type = tarfile.DIRTYPE if self.is_dir else tarfile.REGTYPE
+        info.size, info.mtime, info.mode = self.size, self.mtime, self.mode
+        return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+
+    @property
+    def tar_size(self):
+        """Header, data and the padding that rounds the data up to a whole block."""
+        return self.header_size + self.size + (-self.size % TAR_BLOCK)
+
+
+class ExportPlan:
+    def __init__(self, root, ignore_rules=None, workspace_root=None):
+        """
+        `root` is the folder to export; ignore rules are matched against paths
+        relative to `workspace_root` (default: `root`). Archive member names
+        are relative to `root`.
+        """
+        self.root = root
+        self.entries = []
+        self.files = 0
+        self.bytes = 0
+        digest = hashlib.sha1()
+        for entry in self._walk(root, '', ignore_rules, workspace_root or root):
+            self.entries.append(entry)
+            if not entry.is_dir:
+                self.files += 1
+                self.bytes += entry.size
+            digest.update(repr((entry.name, entry.is_dir, entry.size, entry.mtime, entry.mode)).encode('utf-8', 'surrogateescape'))
+        self.etag = digest.hexdigest()
+        body = sum(entry.tar_size for entry in self.entries) + 2 * TAR_BLOCK
+        self.tar_size = body + (-body % TAR_RECORD)
+
+    def _walk(self, folder, prefix, ignore_rules, workspace_root):
+        try:
+            with os.scandir(folder) as it:
+                items = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Export Error: {e}")
+            return
+        for item in items:
+            if item.is_symlink():
+                continue
+            try:
+                st = item.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if not is_dir and not stat.S_ISREG(st.st_mode):
+                continue
+            if ignore_rules is not None and ignore_rules.is_ignored(os.path.relpath(item.path, workspace_root), is_dir):
+                continue
+            name = prefix + item.name
+            yield ExportEntry(name, item.path, st)
+            if is_dir:
+                yield from self._walk(item.path, name + '/', ignore_rules, workspace_root)
+
+    # ------------------------------------------------------------------
+    # tar
+    # ------------------------------------------------------------------
+    def iter_tar(self, start=0, stop=None):
+        """Yields bytes [start, stop) of the tar archive."""
+        stop = self.tar_size if stop is None else min(stop, self.tar_size)
+        pos = 0
+        for entry in self.entries:
+            end = pos + entry.tar_size
+            if end > start and pos < stop:
+                yield from _slice(entry.tar_header(), pos, start, stop)
+                data_pos = pos + entry.header_size
+                if entry.size and data_pos + entry.size > start and data_pos < stop:
+                    yield from _file_range(entry.path, entry.size, max(start - data_pos, 0),
+                                           min(stop - data_pos, entry.size))
+                padding = entry.tar_size - entry.header_size - entry.size
+                if padding:
+                    yield from _slice(bytes(padding), data_pos + entry.size, start, stop)
+            pos = end
+            if pos >= stop:
+                return
+        trailer = self.tar_size - pos
+        yield from _slice(bytes(trailer), pos, start, stop)
+
+    # ------------------------------------------------------------------
+    # zip
+    # ------------------------------------------------------------------
+    def iter_zip(self, compresslevel=6):
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as archive:
+            for entry in self.entries:
+                # zipfile only encodes valid UTF-8 names; undecodable bytes become U+FFFD.
+                name = entry.name.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+                info = zipfile.ZipInfo(name + '/' if entry.is_dir else name, _zip_time(entry.mtime))
+                if entry.is_dir:
+                    info.external_attr = ((stat.S_IFDIR | entry.mode) << 16) | 0x10
+                    info.CRC = info.compress_size = info.file_size = 0
+                    archive.mkdir(info)
+                    continue
+                info.external_attr = (stat.S_IFREG | entry.mode) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.file_size = entry.size  # lets zipfile decide on zip64 up front
+                with archive.open(info, 'w') as out:
+                    for chunk in _file_range(entry.path, entry.size, 0, entry.size, pad=False):
+                        out.write(chunk)
+                        if sink.pending:
+                            yield sink.drain()
+                if sink.pending:
+                    yield sink.drain()
+        yield sink.drain()
+
+
+class _Sink:
+    """A write-only, non-seekable file for zipfile; the generator drains what it wrote."""
+
+    def __init__(self):
+        self._chunks = []
+        self.pending = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks, self.pending = [], 0
+        return data
+
+
+def _slice(data, pos, start, stop):
+    """The part of `data` (located at `pos` in the archive) that falls inside [start, stop)."""
+    lo, hi = max(start - pos, 0), min(stop - pos, len(data))
+    if lo < hi:
+        yield data[lo:hi]
+
+
+def _file_range(path, size, lo, hi, pad=True):
+    """Bytes [lo, hi) of a file expected to be `size` bytes long, zero-padded if it shrank."""
+    remaining = hi - lo
+    try:
+        with open(path, 'rb') as f:
+            f.seek(lo)
+            while remaining > 0:
+                chunk = f.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    except OSError as e:
+        print(f"Export Error ({path}): {e}")
+    while pad and remaining > 0:
+        chunk = bytes(min(COPY_CHUNK, remaining))
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _zip_time(mtime):
+    return time.localtime(max(mtime, 315619200))[:6]  # zip dates start in 1980 (local time)
@@ -0,0 +1,230 @@
+"""
+Bulk import of a folder into the workspace from a single request body.
+
+Three body formats are accepted, all processed as a stream so memory use is
+bounded by the copy buffer rather than by the size of the upload:
+
+- tar (optionally gzip/bz2/xz compressed): read with tarfile's stream mode.
+- zip: the central directory lives at the end, so the body is spooled to a
+  temporary file (in memory up to ZIP_SPOOL_MEMORY) before extraction.
+- multipart/form-data: every file part is written straight to its destination
+  while it is being received. The part's filename carries the relative path
+  (the browser sends it when FormData.append is given a third argument).
+
+Every destination is checked against the import root; absolute names, '..'
+components, links and device entries are refused or skipped, and files are
+opened without following a symlink already sitting at the destination. A file
+cut short by an error or a limit is removed.
+"""
+import errno
+import os
+import stat
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from werkzeug.sansio.multipart import MultipartDecoder, Data, Field, File, Epilogue, NeedData
+
+COPY_CHUNK = 64 * 1024
+ZIP_SPOOL_MEMORY = 8 * 1024 * 1024
+
+
+class ImportRejected(Exception):
+    """The archive is malformed, unsafe or over the configured limits."""
+
+
+class ImportProgress:
+    """Counts files/bytes and reports them through `callback`, at most every `interval` seconds."""
+
+    def __init__(self, callback=None, interval=0.25, max_files=None, max_bytes=None):
+        self.callback = callback
+        self.interval = interval
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.bytes = 0
+        self.skipped = []
+        self.written = []
+        self._last_report = 0.0
+
+    def add_bytes(self, n):
+        self.bytes += n
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            raise ImportRejected(f'import exceeds the {self.max_bytes} byte limit')
+
+    def file_done(self, dest=None):
+        self.files += 1
+        if dest is not None:
+            self.written.append(dest)
+        if self.max_files is not None and self.files > self.max_files:
+            raise ImportRejected(f'import exceeds the {self.max_files} file limit')
+        self.report()
+
+    def skip(self, name, reason):
+        self.skipped.append({'path': name, 'reason': reason})
+
+    def report(self, done=False, error=None):
+        now = time.monotonic()
+        if self.callback is None or (not done and now - self._last_report < self.interval):
+            return
+        self._last_report = now
+        payload = {'files': self.files, 'bytes': self.bytes, 'done': done}
+        if error:
+            payload['error'] = error
+        self.callback(payload)
+
+    def summary(self):
+        return {'files': self.files, 'bytes': self.bytes, 'skipped': self.skipped}
+
+
+def safe_destination(root, name):
+    """
+    Maps an archive member name to an absolute path inside `root`, or raises
+    ImportRejected. Resolves symlinks of existing parents so a link inside the
+    workspace cannot be used to write outside it.
+    """
+    name = name.replace('\\', '/')
+    parts = [p for p in name.split('/') if p not in ('', '.')]
+    if not parts or name.startswith('/') or (len(parts[0]) == 2 and parts[0][1] == ':'):
+        raise ImportRejected(f'unsafe path: {name!r}')
+    if any(p == '..' for p in parts):
+        raise ImportRejected(f'unsafe path: {name!r}')
+    dest = os.path.join(root, *parts)
+    real_root = os.path.realpath(root)
+    real_parent = os.path.realpath(os.path.dirname(dest))
+    if real_parent != real_root and not real_parent.startswith(real_root + os.sep):
+        raise ImportRejected(f'unsafe path: {name!r}')
+    return dest
+
+
+def _open_destination(dest):
+    """Opens `dest` for writing; a symlink at that name is refused rather than followed."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o666)
+    except OSError as e:
+        if e.errno == errno.ELOOP:
+            raise ImportRejected(f'unsafe path: {os.path.basename(dest)!r} is a link')
+        raise
+    return os.fdopen(fd, 'wb')
+
+
+def _copy_to(dest, chunks, progress):
+    try:
+        with _open_destination(dest) as out:
+            for chunk in chunks:
+                progress.add_bytes(len(chunk))
+                out.write(chunk)
+    except BaseException:
+        _remove_partial(dest)
+        raise
+    progress.file_done(dest)
+
+
+def _remove_partial(dest):
+    if os.path.isfile(dest) and not os.path.islink(dest):
+        os.remove(dest)
+
+
+def _read_chunks(fileobj):
+    while True:
+        chunk = fileobj.read(COPY_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_tar(stream, root, progress):
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isdir():
+                    os.makedirs(safe_destination(root, member.name), exist_ok=True)
+                elif member.isfile():
+                    dest = safe_destination(root, member.name)
+                    _copy_to(dest, _read_chunks(archive.extractfile(member)), progress)
+                else:
+                    progress.skip(member.name, 'links and special files are not imported')
+    except tarfile.TarError as e:
+        raise ImportRejected(f'invalid tar archive: {e}')
+
+
+def import_zip(stream, root, progress):
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MEMORY) as spool:
+        for chunk in _read_chunks(stream):
+            # Guard the spool too, so an oversized upload is refused before extraction.
+            if progress.max_bytes is not None and spool.tell() + len(chunk) > progress.max_bytes:
+                raise ImportRejected(f'import exceeds the {progress.max_bytes} byte limit')
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            with zipfile.ZipFile(spool) as archive:
+                for info in archive.infolist():
+                    if stat.S_ISLNK(info.external_attr >> 16):
+                        progress.skip(info.filename, 'links and special files are not imported')
+                    elif info.is_dir():
+                        os.makedirs(safe_destination(root, info.filename), exist_ok=True)
+                    else:
+                        dest = safe_destination(root, info.filename)
+                        with archive.open(info) as member:
+                            # Sizes are counted as decompressed, which also stops zip bombs.
+                            _copy_to(dest, _read_chunks(member), progress)
+        except zipfile.BadZipFile as e:
+            raise ImportRejected(f'invalid zip archive: {e}')
+
+
+def import_multipart(stream, boundary, root, progress):
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    out = dest = None
+    try:
+        while True:
+            chunk = stream.read(COPY_CHUNK)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    dest = safe_destination(root, event.filename)
+                    out = _open_destination(dest)
+                elif isinstance(event, Field):
+                    dest = None
+                elif isinstance(event, Data) and out is not None:
+                    progress.add_bytes(len(event.data))
+                    out.write(event.data)
+                    if not event.more_data:
+                        out.close()
+                        out = None
+                        progress.file_done(dest)
+                event = decoder.next_event()
+            if isinstance(event, Epilogue) or not chunk:
+                break
+    except ValueError as e:
+        raise ImportRejected(f'invalid multipart body: {e}')
+    finally:
+        if out is not None:
+            # Do not leave a half-written file behind.
+            out.close()
+            _remove_partial(dest)
+
+
+def import_stream(stream, content_type, root, progress):
+    """Dispatches on the request's Content-Type. Returns the progress summary."""
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype == 'multipart/form-data':
+        boundary = None
+        for param in (content_type or '').split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'boundary':
+                boundary = value.strip('"')
+        if not boundary:
+            raise ImportRejected('multipart body without a boundary')
+        import_multipart(stream, boundary, root, progress)
+    elif mimetype in ('application/zip', 'application/x-zip-compressed'):
+        import_zip(stream, root, progress)
+    elif mimetype in ('application/x-tar', 'application/gzip', 'application/x-gzip',
+                      'application/x-gtar', 'application/x-bzip2', 'application/x-xz',
+                      'application/octet-stream'):
+        import_tar(stream, root, progress)
+    else:
+        raise ImportRejected(f'unsupported content type: {mimetype or "none"}')
+    return progress.summary()
@@ -0,0 +1,264 @@
+"""
+Serving static files with cache headers and precompressed variants.
+
+Compressible files (JS, CSS, HTML, SVG, JSON...) are compressed once into a
+cache directory that mirrors the source tree, and rebuilt only when the
+source is newer. Requests that accept gzip (or brotli, when the optional
+`brotli` package is installed) get the compressed variant with the matching
+Content-Encoding; everything else falls back to the plain file.
+
+`AssetManifest` gives files content-hashed names (style.3f2a9c1b7d4e.css) so
+they can be cached forever, and `save_image_variants` writes downscaled,
+recompressed copies of an uploaded image (needs the optional Pillow package).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import threading
+
+from flask import request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+BROTLI = brotli is not None
+
+try:
+    from PIL import Image, ImageOps, features as image_features
+except ImportError:  # optional dependency
+    Image = None
+IMAGE_VARIANTS = Image is not None
+
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.htm', '.svg', '.json', '.map', '.txt', '.xml', '.wasm'}
+MIN_COMPRESS_SIZE = 1024
+_ENCODING_SUFFIX = {'br': '.br', 'gzip': '.gz'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+_HASHED_NAME = re.compile(r'^(.*)\.([0-9a-f]{12})(\.[^./]+)$')
+_build_lock = threading.Lock()
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _compress(src, dest, encoding):
+    tmp = f'{dest}.tmp{threading.get_ident()}'
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(src, 'rb') as f_in:
+        if encoding == 'br':
+            with open(tmp, 'wb') as f_out: f_out.write(brotli.compress(f_in.read(), quality=11))
+        else:
+            with open(tmp, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9, mtime=0) as f_out:
+                shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp, dest)
+
+
+def precompressed_variant(src, cache_path, encoding):
+    """
+    Path of the `encoding` variant of `src` stored at `cache_path` + suffix,
+    (re)building it if missing or older than the source. Returns None when a
+    variant is not worth serving (small file, or it did not get smaller).
+    """
+    if encoding == 'br' and brotli is None:
+        return None
+    dest = cache_path + _ENCODING_SUFFIX[encoding]
+    src_st = os.stat(src)
+    if src_st.st_size < MIN_COMPRESS_SIZE:
+        return None
+    try:
+        fresh = os.stat(dest).st_mtime_ns >= src_st.st_mtime_ns
+    except OSError:
+        fresh = False
+    if not fresh:
+        with _build_lock:
+            _compress(src, dest, encoding)
+    return dest if os.path.getsize(dest) < src_st.st_size else None
+
+
+def preferred_encodings():
+    """Encodings the current request accepts, best first."""
+    accepted = request.accept_encodings
+    encodings = []
+    if brotli is not None and accepted['br']:
+        encodings.append('br')
+    if accepted['gzip']:
+        encodings.append('gzip')
+    return encodings
+
+
+def send_static_file(directory, filename, cache_dir, max_age=None, private=False):
+    """
+    send_from_directory with precompressed variants. `cache_dir` holds the
+    compressed copies (mirroring `filename` under it); `max_age` sets
+    Cache-Control, `private` keeps shared caches from storing the reply.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    served, encoding = path, None
+    if is_compressible(path):
+        cache_path = safe_join(cache_dir, filename)
+        for candidate in preferred_encodings():
+            variant = precompressed_variant(path, cache_path, candidate)
+            if variant:
+                served, encoding = variant, candidate
+                break
+
+    response = send_file(served, mimetype=mimetype, conditional=True, max_age=max_age)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if is_compressible(path):
+        response.vary.add('Accept-Encoding')
+    if private and max_age:
+        response.cache_control.public = False
+        response.cache_control.private = True
+    return response
+
+
+class AssetManifest:
+    """
+    Content-hashed names for the files under `static_dir`. Hashes are kept per
+    (mtime, size), so an edited file gets a new name on the next lookup
+    without a restart.
+    """
+
+    def __init__(self, static_dir, cache_dir):
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        self._by_name = {}
+        self._by_hash = {}
+        self._lock = threading.Lock()
+
+    def hashed_name(self, filename):
+        """'css/style.css' -> 'css/style.<hash>.css', or None if the file does not exist."""
+        path = safe_join(self.static_dir, filename)
+        try:
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        if st is None or not os.path.isfile(path):
+            return None
+        entry = self._by_name.get(filename)
+        if entry and entry[:2] == (st.st_mtime_ns, st.st_size):
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        base, ext = os.path.splitext(filename)
+        hashed = f'{base}.{digest.hexdigest()[:12]}{ext}'
+        with self._lock:
+            if entry:
+                self._by_hash.pop(entry[2], None)
+            self._by_name[filename] = (st.st_mtime_ns, st.st_size, hashed)
+            self._by_hash[hashed] = filename
+        return hashed
+
+    def resolve(self, hashed):
+        """
+        (filename, exact) for a hashed name. A hash we no longer know (a page
+        rendered before the file changed) maps to the current file with
+        exact=False, so it can be served without the immutable headers.
+        """
+        filename = self._by_hash.get(hashed)
+        if filename is not None:
+            return filename, True
+        match = _HASHED_NAME.match(hashed)
+        if match and self.hashed_name(match.group(1) + match.group(3)):
+            return match.group(1) + match.group(3), False
+        return None, False
+
+    def build(self):
+        """Hashes every file and precompresses the compressible ones. Returns the number of files."""
+        count = 0
+        for dirpath, _, filenames in os.walk(self.static_dir):
+            for name in filenames:
+                filename = os.path.relpath(os.path.join(dirpath, name), self.static_dir).replace(os.sep, '/')
+                if not self.hashed_name(filename):
+                    continue
+                count += 1
+                if is_compressible(filename):
+                    for encoding in _ENCODING_SUFFIX:
+                        precompressed_variant(os.path.join(self.static_dir, filename),
+                                              safe_join(self.cache_dir, filename), encoding)
+        return count
+
+    def send(self, hashed):
+        filename, exact = self.resolve(hashed)
+        if filename is None:
+            raise NotFound()
+        if not exact:
+            return send_static_file(self.static_dir, filename, self.cache_dir, max_age=0)
+        response = send_static_file(self.static_dir, filename, self.cache_dir, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
+
+
+class ImageError(Exception):
+    """The uploaded file could not be decoded as an image."""
+
+
+def save_image_variants(stream, directory, stem, widths, quality=82):
+    """
+    Decodes an image once and writes `{stem}-{width}.jpg` (plus .webp when
+    Pillow supports it) for every width below the original, and for the
+    original width capped at the largest requested one. `{stem}.jpg` is the
+    largest variant. Older variants of `stem` are removed. Returns
+    [{'width', 'jpg', 'webp'}] smallest first, with file names.
+    """
+    try:
+        image = Image.open(stream)
+        image.load()
+    except Exception as e:
+        raise ImageError(str(e))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    top = min(image.width, max(widths))
+    targets = sorted({w for w in widths if w < top} | {top})
+    webp = image_features.check('webp')
+    variants = []
+    for width in targets:
+        scaled = image if width == image.width else image.resize(
+            (width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        jpg = f'{stem}-{width}.jpg'
+        _save_atomic(scaled, os.path.join(directory, jpg), 'JPEG', quality=quality, optimize=True, progressive=True)
+        variant = {'width': width, 'jpg': jpg, 'webp': None}
+        if webp:
+            variant['webp'] = f'{stem}-{width}.webp'
+            _save_atomic(scaled, os.path.join(directory, variant['webp']), 'WEBP', quality=quality, method=4)
+        variants.append(variant)
+    shutil.copyfile(os.path.join(directory, variants[-1]['jpg']), os.path.join(directory, f'{stem}.jpg'))
+    keep = {v['jpg'] for v in variants} | {v['webp'] for v in variants}
+    for variant in list_image_variants(directory, stem):
+        for name in (variant['jpg'], variant['webp']):
+            if name and name not in keep:
+                os.remove(os.path.join(directory, name))
+    return variants
+
+
+def _save_atomic(image, path, fmt, **options):
+    tmp = f'{path}.tmp{threading.get_ident()}'
+    image.save(tmp, fmt, **options)
+    os.replace(tmp, path)
+
+
+def list_image_variants(directory, stem):
+    """Variants written by save_image_variants, smallest first."""
+    pattern = re.compile(re.escape(stem) + r'-(\d+)\.(jpg|webp)$')
+    found = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            found.setdefault(int(match.group(1)), {'width': int(match.group(1)), 'jpg': None, 'webp': None})[match.group(2)] = name
+    return [found[w] for w in sorted(found) if found[w]['jpg']]
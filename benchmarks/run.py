@@ -0,0 +1,366 @@
+"""
+Offline load and latency benchmarks for Nexuss-IDE.
+
+    python benchmarks/run.py [--quick] [--out results.json] [--compare old.json]
+
+Builds a synthetic workspace in a temporary folder, imports the app against
+it (its own instance folder, database and a local echo websocket standing in
+for the external terminal service), then drives the HTTP API through Flask's
+test client and the /terminal_ws namespace through Flask-SocketIO's test
+client. Everything runs in-process, so the numbers measure the server code
+paths rather than the network.
+
+Each scenario reports p50/p90/p99/mean latency, throughput and the peak RSS
+of the process so far. Results are written as JSON; pass an earlier file to
+--compare to print the change per scenario.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import websockets
+
+import workspace
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERMINAL_NS = '/terminal_ws'
+FLOOD_LINE = 64  # characters per line the echo backend sends for 'flood:N'
+
+
+# ==========================================
+# MEASUREMENT HELPERS
+# ==========================================
+
+def percentile(samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(q / 100 * len(samples)) - 1)]
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KB elsewhere
+
+
+class Suite:
+    def __init__(self):
+        self.results = []
+
+    def record(self, name, samples, elapsed, unit='req', volume=None, **extra):
+        """Stores one scenario. `samples` are seconds per operation; `volume` overrides the throughput count."""
+        samples = sorted(samples)
+        ms = lambda v: None if v is None else round(v * 1000, 3)
+        count = len(samples) if volume is None else volume
+        result = {
+            'name': name,
+            'iterations': len(samples),
+            'p50_ms': ms(percentile(samples, 50)),
+            'p90_ms': ms(percentile(samples, 90)),
+            'p99_ms': ms(percentile(samples, 99)),
+            'mean_ms': ms(sum(samples) / len(samples)) if samples else None,
+            'min_ms': ms(samples[0]) if samples else None,
+            'max_ms': ms(samples[-1]) if samples else None,
+            'throughput_per_s': round(count / elapsed, 2) if elapsed > 0 else None,
+            'throughput_unit': unit,
+            'peak_rss_kb': peak_rss_kb(),
+        }
+        result.update(extra)
+        self.results.append(result)
+        print(f"  {name:<28} p50 {result['p50_ms']:>9} ms   p99 {result['p99_ms']:>9} ms   "
+              f"{result['throughput_per_s']:>12} {unit}/s   rss {result['peak_rss_kb'] // 1024} MB")
+        return result
+
+    def measure(self, name, operation, iterations, warmup=3, setup=None, **extra):
+        """Times `operation()` `iterations` times; `setup()` runs untimed before each call."""
+        for _ in range(warmup):
+            if setup: setup()
+            operation()
+        samples, elapsed = [], 0.0
+        for _ in range(iterations):
+            if setup: setup()
+            start = time.perf_counter()
+            operation()
+            took = time.perf_counter() - start
+            samples.append(took)
+            elapsed += took
+        return self.record(name, samples, elapsed, **extra)
+
+
+def check(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request.path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+# ==========================================
+# ENVIRONMENT
+# ==========================================
+
+def start_echo_backend():
+    """A websocket echo server on a free local port. 'flood:N' replies with N lines instead."""
+    ready, bound = threading.Event(), {}
+
+    async def handler(websocket):
+        async for message in websocket:
+            if isinstance(message, str) and message.startswith('flood:'):
+                for i in range(int(message[6:])):
+                    await websocket.send(f'{i:08d} ' + 'x' * (FLOOD_LINE - 10) + '\n')
+            else:
+                await websocket.send(message)
+
+    async def main():
+        async with websockets.serve(handler, '127.0.0.1', 0) as server:
+            bound['port'] = server.sockets[0].getsockname()[1]
+            ready.set()
+            await asyncio.Future()
+
+    threading.Thread(target=lambda: asyncio.run(main()), name='bench-echo', daemon=True).start()
+    if not ready.wait(10):
+        raise RuntimeError('echo backend did not start')
+    return f"ws://127.0.0.1:{bound['port']}"
+
+
+def load_app(base_dir, terminal_url):
+    """Imports app.py with `base_dir` as its working directory and instance folder."""
+    os.environ['NEXUSS_INSTANCE_PATH'] = os.path.join(base_dir, 'instance')
+    os.environ['NEXUSS_TERMINAL_URL'] = terminal_url
+    os.symlink(os.path.join(REPO_DIR, 'extensions'), os.path.join(base_dir, 'extensions'))
+    os.chdir(base_dir)
+    sys.path.insert(0, REPO_DIR)
+    import app as nexuss
+    with nexuss.app.app_context():
+        nexuss.db.create_all()
+    return nexuss
+
+
+def logged_in_client(nexuss, username='bench'):
+    client = nexuss.app.test_client()
+    client.post('/register', data={'username': username, 'password': username})
+    check(client.post('/login', data={'username': username, 'password': username}), 302)
+    return client
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# ==========================================
+# SCENARIOS
+# ==========================================
+
+def bench_http(suite, nexuss, client, layout, iterations, concurrency):
+    print('HTTP')
+    clear_tree_cache = nexuss._tree_cache.clear
+    suite.measure('tree_root', lambda: check(client.get('/api/files/tree?depth=1')), iterations, setup=clear_tree_cache)
+    suite.measure('tree_small_depth2', lambda: check(client.get('/api/files/tree?path=small&depth=2')),
+                  max(1, iterations // 10), setup=clear_tree_cache)
+    suite.measure('tree_small_depth2_cached', lambda: check(client.get('/api/files/tree?path=small&depth=2')), iterations)
+    suite.measure('tree_deep', lambda: check(client.get('/api/files/tree?path=deep&depth=8')), iterations, setup=clear_tree_cache)
+
+    small = 'small/pkg0000/mod00000.py'
+    huge = layout['huge_files'][0]
+    suite.measure('read_small', lambda: check(client.post('/api/files/read', json={'path': small})), iterations)
+    suite.measure('read_huge_first_page', lambda: check(client.post('/api/files/read', json={'path': huge})), iterations)
+    suite.measure('read_huge_line_range', lambda: check(client.post('/api/files/read', json={
+        'path': huge, 'start_line': layout['huge_size'] // 2 // 62, 'line_count': 200})), iterations)
+    suite.measure('raw_range_64k', lambda: check(client.get(f'/api/files/raw?path={huge}', headers={
+        'Range': f"bytes={layout['huge_size'] // 2}-{layout['huge_size'] // 2 + 65535}"}), 206), iterations)
+
+    content = check(client.post('/api/files/read', json={'path': small})).json['content']
+    suite.measure('save_full', lambda: check(client.post('/api/files/save', json={'path': small, 'content': content})), iterations)
+    state = {'version': check(client.post('/api/files/read', json={'path': small})).json['version']}
+
+    def save_delta():
+        reply = check(client.post('/api/files/save', json={
+            'path': small, 'base_version': state['version'], 'edits': [{'offset': 0, 'length': 1, 'text': content[0]}]}))
+        state['version'] = reply.json['version']
+    suite.measure('save_delta', save_delta, iterations)
+    nexuss.write_queue.flush()  # saves are written behind the response; land them before searching
+
+    start = time.perf_counter()
+    nexuss.search_index.reconcile()
+    took = time.perf_counter() - start
+    suite.record('search_index_build', [took], took, unit='file', volume=layout['small_files'] + layout['depth'])
+    suite.measure('search_literal', lambda: check(client.get('/api/search?q=yield+lambda&limit=50')), iterations)
+    suite.measure('search_regex', lambda: check(client.get('/api/search?q=await%5Cs%2Bindex&regex=1&limit=50')), iterations)
+
+    start = time.perf_counter()
+    nexuss.symbol_index.reconcile()
+    took = time.perf_counter() - start
+    suite.record('symbol_index_build', [took], took, unit='file', volume=layout['small_files'] + layout['depth'])
+    suite.measure('symbol_definition', lambda: check(client.get(f'/api/symbols/definition?name=index&path={small}')), iterations)
+    suite.measure('symbol_fuzzy', lambda: check(client.get('/api/symbols?q=idx&limit=50')), iterations)
+    suite.measure('symbol_outline', lambda: check(client.get(f'/api/symbols/outline?path={small}')), iterations)
+
+    # Throughput with several clients at once (separate test clients share the app, not the session).
+    clients = [logged_in_client(nexuss) for _ in range(concurrency)]
+    per_client = max(1, iterations // concurrency) * 4
+    samples, lock = [], threading.Lock()
+
+    def worker(c):
+        local = []
+        for _ in range(per_client):
+            start = time.perf_counter()
+            check(c.post('/api/files/read', json={'path': small}))
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local)
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    suite.record(f'read_small_x{concurrency}', samples, time.perf_counter() - start, concurrency=concurrency)
+
+
+def wait_for(socket_client, predicate, timeout=30):
+    """Polls the test client until a received packet satisfies `predicate`; returns that packet."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        for packet in socket_client.get_received(TERMINAL_NS):
+            if predicate(packet):
+                return packet
+        if time.perf_counter() > deadline:
+            raise TimeoutError('no matching terminal event')
+        time.sleep(0.0002)
+
+
+def is_ready(packet):
+    return packet['name'] == 'status_update' and 'successful' in packet['args'][0]
+
+
+def bench_terminal(suite, nexuss, client, iterations, flood_lines):
+    print('Terminal (/terminal_ws)')
+    # The warm pool is filled on the first connect: open one terminal and let
+    # the pool finish its handshake, as it would have on a running server.
+    first = nexuss.socketio.test_client(nexuss.app, namespace=TERMINAL_NS, flask_test_client=client)
+    wait_for(first, is_ready)
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    sc = nexuss.socketio.test_client(nexuss.app, namespace=TERMINAL_NS, flask_test_client=client)
+    wait_for(sc, is_ready)
+    took = time.perf_counter() - start
+    suite.record('terminal_attach_warm', [took], took, unit='attach')
+
+    def round_trip():
+        token = f'ping-{time.perf_counter_ns()}'
+        sc.emit('terminal_input', token, namespace=TERMINAL_NS)
+        wait_for(sc, lambda p: p['name'] == 'terminal_output' and token in p['args'][0])
+    suite.measure('terminal_round_trip', round_trip, iterations)
+
+    # Stays below the unacked-output limit: the test client cannot ack.
+    expected, received, batches = flood_lines * FLOOD_LINE, 0, 0
+    start = time.perf_counter()
+    sc.emit('terminal_input', f'flood:{flood_lines}', namespace=TERMINAL_NS)
+    deadline = start + 60
+    while received < expected and time.perf_counter() < deadline:
+        for packet in sc.get_received(TERMINAL_NS):
+            if packet['name'] == 'terminal_output':
+                received += len(packet['args'][0])
+                batches += 1
+        time.sleep(0.0002)
+    took = time.perf_counter() - start
+    suite.record('terminal_flood', [took], took, unit='char', volume=received,
+                 chars=received, batches=batches, upstream_frames=flood_lines)
+
+    sc.disconnect(namespace=TERMINAL_NS)
+    start = time.perf_counter()
+    sc = nexuss.socketio.test_client(nexuss.app, namespace=TERMINAL_NS, flask_test_client=client)
+    wait_for(sc, lambda p: p['name'] == 'terminal_output')
+    took = time.perf_counter() - start
+    suite.record('terminal_reattach_replay', [took], took, unit='attach')
+    sc.disconnect(namespace=TERMINAL_NS)
+    first.disconnect(namespace=TERMINAL_NS)
+
+
+# ==========================================
+# REPORTING
+# ==========================================
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = {r['name']: r for r in json.load(f)['results']}
+    print(f'\nChange vs {previous_path} (negative is faster):')
+    for result in current:
+        old = previous.get(result['name'])
+        if not old:
+            continue
+        deltas = []
+        for key in ('p50_ms', 'p99_ms'):
+            if old.get(key) and result.get(key) is not None:
+                deltas.append(f"{key[:3]} {100 * (result[key] - old[key]) / old[key]:+7.1f}%")
+        print(f"  {result['name']:<28} " + '   '.join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--quick', action='store_true', help='small workspace and few iterations (smoke run)')
+    parser.add_argument('--iterations', type=int, help='samples per latency scenario')
+    parser.add_argument('--files', type=int, help='number of small files in the synthetic workspace')
+    parser.add_argument('--huge-mb', type=int, help='size of each huge file in MB')
+    parser.add_argument('--concurrency', type=int, default=4, help='clients in the concurrent read scenario')
+    parser.add_argument('--skip-terminal', action='store_true', help='only run the HTTP scenarios')
+    parser.add_argument('--out', default='benchmark-results.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary workspace')
+    args = parser.parse_args()
+
+    iterations = args.iterations or (20 if args.quick else 200)
+    files = args.files or (500 if args.quick else 5000)
+    huge_mb = args.huge_mb or (8 if args.quick else 64)
+    out_path = os.path.abspath(args.out)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    base_dir = tempfile.mkdtemp(prefix='nexuss-bench-')
+    try:
+        print(f'Building synthetic workspace in {base_dir} ...')
+        layout = workspace.build(os.path.join(base_dir, 'workspace'), small_files=files, huge_size=huge_mb * 1024 * 1024)
+        nexuss = load_app(base_dir, start_echo_backend())
+        client = logged_in_client(nexuss)
+
+        suite = Suite()
+        bench_http(suite, nexuss, client, layout, iterations, args.concurrency)
+        if not args.skip_terminal:
+            bench_terminal(suite, nexuss, client, iterations, flood_lines=2000)
+
+        report = {
+            'suite': 'nexuss-ide',
+            'format': 1,
+            'started': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {'iterations': iterations, 'concurrency': args.concurrency, **layout},
+            'results': suite.results,
+        }
+        with open(out_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {out_path}')
+        if compare_path:
+            compare(suite.results, compare_path)
+    finally:
+        if args.keep:
+            print(f'Workspace kept at {base_dir}')
+        else:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Synthetic workspaces for the benchmark suite.
+
+Every layout is generated from a seeded RNG, so two runs with the same
+parameters produce byte-identical trees and their numbers can be compared.
+"""
+import os
+import random
+
+WORDS = ('def class return import self value index print range None True False '
+         'async await yield lambda for while if else elif try except with as').split()
+
+
+def _text(rng, lines, width=60):
+    out = []
+    for _ in range(lines):
+        line, n = [], 0
+        while n < width:
+            word = rng.choice(WORDS)
+            line.append(word)
+            n += len(word) + 1
+        out.append(' '.join(line))
+    return '\n'.join(out) + '\n'
+
+
+def make_small_files(root, files, per_dir=50, seed=1):
+    """`files` small source files spread over folders of `per_dir` files each."""
+    rng = random.Random(seed)
+    for i in range(files):
+        folder = os.path.join(root, 'small', f'pkg{i // per_dir:04d}')
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f'mod{i:05d}.py'), 'w') as f:
+            f.write(_text(rng, rng.randint(5, 60)))
+
+
+def make_deep_tree(root, depth, seed=2):
+    """A single chain of `depth` nested folders with a file at every level."""
+    rng = random.Random(seed)
+    folder = os.path.join(root, 'deep')
+    for level in range(depth):
+        folder = os.path.join(folder, f'level{level:03d}')
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, 'node.txt'), 'w') as f:
+            f.write(_text(rng, 3))
+
+
+def make_huge_file(root, name, size, seed=3):
+    """A text file of roughly `size` bytes, written in 1 MB blocks."""
+    rng = random.Random(seed)
+    block = _text(rng, 18000)[:1024 * 1024]
+    path = os.path.join(root, 'huge', name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+    return path
+
+
+def build(root, small_files=5000, depth=40, huge_files=2, huge_size=64 * 1024 * 1024):
+    """Creates the full benchmark workspace under `root` and returns a summary."""
+    make_small_files(root, small_files)
+    make_deep_tree(root, depth)
+    huge = [os.path.relpath(make_huge_file(root, f'big{i}.log', huge_size, seed=3 + i), root)
+            for i in range(huge_files)]
+    return {'small_files': small_files, 'depth': depth, 'huge_files': huge, 'huge_size': huge_size}
@@ -0,0 +1,117 @@
+"""
+In-memory registry of everything under the extensions folder.
+
+Manifests are parsed once and re-parsed only when their mtime changes; the
+folder list is re-read only when the extensions directory's own mtime
+changes. `refresh()` therefore costs a handful of stat() calls, and returns
+an ETag that changes whenever anything visible in the app drawer changes.
+"""
+import hashlib
+import json
+import os
+import threading
+
+ICON_CANDIDATES = ('icon.png', 'icon.jpg', 'icon.jpeg')
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ExtensionInfo:
+    """One folder under extensions/. `manifest` is None for static (HTML/JS) extensions."""
+
+    def __init__(self, folder_name, path):
+        self.folder_name = folder_name
+        self.path = path
+        self.manifest = None
+        self.manifest_mtime = None
+        self.folder_mtime = None
+        self.icon_filename = 'default'
+        self.icon_mtime = None
+        self.error = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def refresh(self):
+        manifest_mtime = _mtime(self.manifest_path)
+        if manifest_mtime != self.manifest_mtime:
+            self.manifest_mtime = manifest_mtime
+            self.manifest, self.error = None, None
+            if manifest_mtime is not None:
+                try:
+                    with open(self.manifest_path, 'r') as f: self.manifest = json.load(f)
+                except (OSError, ValueError) as e:
+                    # Still a Python extension, just a broken one: it is listed but never loaded.
+                    self.manifest, self.error = {}, str(e)
+                    print(f"[!] Invalid manifest for extension '{self.folder_name}': {e}")
+
+        if self.manifest is not None:
+            self.icon_filename = self.manifest.get('icon', 'default')
+        else:
+            folder_mtime = _mtime(self.path)
+            if folder_mtime != self.folder_mtime:
+                self.folder_mtime = folder_mtime
+                self.icon_filename = 'default'
+                try:
+                    for file in os.listdir(self.path):
+                        if file.lower() in ICON_CANDIDATES:
+                            self.icon_filename = file
+                            break
+                except OSError:
+                    pass
+        self.icon_mtime = None if self.icon_filename == 'default' else _mtime(os.path.join(self.path, self.icon_filename))
+
+    @property
+    def is_python(self):
+        return self.manifest is not None
+
+    @property
+    def display_name(self):
+        return self.manifest.get('name', self.folder_name) if self.manifest else self.folder_name
+
+    def signature(self):
+        return (self.folder_name, self.manifest_mtime, self.folder_mtime, self.icon_filename, self.icon_mtime)
+
+
+class ExtensionRegistry:
+    def __init__(self, extensions_dir):
+        self.extensions_dir = extensions_dir
+        self.etag = None
+        self._entries = {}
+        self._dir_mtime = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Brings the registry up to date and returns its current ETag."""
+        with self._lock:
+            dir_mtime = _mtime(self.extensions_dir)
+            if dir_mtime != self._dir_mtime:
+                self._dir_mtime = dir_mtime
+                try: names = sorted(os.listdir(self.extensions_dir))
+                except OSError: names = []
+                entries = {}
+                for name in names:
+                    path = os.path.join(self.extensions_dir, name)
+                    if os.path.isdir(path):
+                        entries[name] = self._entries.get(name) or ExtensionInfo(name, path)
+                self._entries = entries
+            for entry in self._entries.values():
+                entry.refresh()
+            signature = tuple(e.signature() for e in self._entries.values())
+            if signature != self._signature:
+                self._signature = signature
+                self.etag = hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()
+            return self.etag
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def get(self, folder_name):
+        return self._entries.get(folder_name)
@@ -1,22 +1,205 @@
 import asyncio
+import codecs
+import collections
+import json
+import os
+import signal
+import threading
+import time
 import websockets
-from flask import Blueprint, render_template, request
-from flask_login import login_required
+from flask import Blueprint, jsonify, render_template, request
+from flask_login import current_user, login_required
 from flask_socketio import Namespace, emit
 
 # ='=========================================
 # 1. CONFIGURATION & STATE
 # ==========================================
 
-EXTERNAL_TERMINAL_URL = "wss://bash-terminalbackend.onrender.com"
+EXTERNAL_TERMINAL_URL = os.environ.get("NEXUSS_TERMINAL_URL", "wss://bash-terminalbackend.onrender.com")
 CONNECTION_TIMEOUT = 180  # 3 minutes in seconds
 
-# In-memory dictionary to map a user's session ID (sid) to their external terminal connection.
+# Terminal backend: 'remote' proxies to EXTERNAL_TERMINAL_URL, 'local' spawns a
+# shell on a PTY inside the workspace. Set by create_blueprint() from
+# app.config['TERMINAL_BACKEND'], falling back to "backend" in manifest.json.
+BACKEND = 'remote'
+WORKSPACE_DIR = os.path.join(os.getcwd(), 'workspace')
+LOCAL_SHELL = os.environ.get('SHELL') or '/bin/bash'
+PTY_READ_SIZE = 64 * 1024
+
+# Output relay: upstream frames are coalesced and sent to the browser at most
+# every FLUSH_INTERVAL seconds, or as soon as FLUSH_SIZE characters are queued.
+# The browser acks every batch; once MAX_UNACKED characters are in flight we
+# stop reading from upstream until it catches up.
+FLUSH_INTERVAL = 0.008
+FLUSH_SIZE = 32 * 1024
+MAX_UNACKED = 256 * 1024
+
+# Session lifetime: POOL_SIZE sessions are kept open ahead of time, from the
+# first browser connect on, and handed out on connect. A warm session that
+# fails is retried after POOL_RETRY_DELAY seconds, doubling each time, at most
+# POOL_MAX_RETRIES times in a row; a session whose browser disconnects stays alive for
+# REATTACH_GRACE seconds so the same user can pick it up again, replaying up to
+# SCROLLBACK_SIZE characters of recent output. Overridable from app.config.
+POOL_SIZE = 1
+POOL_RETRY_DELAY = 30
+POOL_MAX_RETRIES = 5
+REATTACH_GRACE = 60
+SCROLLBACK_SIZE = 256 * 1024
+
+# Session state below is only mutated from the terminal loop thread.
+# Attached browsers: Socket.IO session ID (sid) -> TerminalSession.
 connections = {}
+# Every live session, attached or not (read by the stats route).
+sessions = set()
+# Detached sessions waiting to be picked up again: user id -> [TerminalSession].
+detached = {}
+# Warm sessions not yet handed out to anyone.
+pool = []
+# Warm sessions that failed in a row, and the pending refill after the last one.
+pool_failures = 0
+pool_retry = None
 
 # Global reference to the main SocketIO instance
 socketio = None
 
+# One asyncio loop, running forever in its own thread, owns every external
+# websocket. Socket.IO handlers only hand work over to it (thread-safe). It is
+# the app's shared task loop (app.extensions['tasks']) when there is one.
+_loop = None
+_loop_lock = threading.Lock()
+tasks = None
+
+def get_loop():
+    """Returns the shared terminal event loop, starting its thread on first use."""
+    global _loop
+    if tasks is not None:
+        return tasks.loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='terminal-loop', daemon=True).start()
+            _loop = loop
+    return _loop
+
+class TerminalSession:
+    """
+    One terminal backend and its output. A session outlives the browser
+    connection it serves: `sid` is None while it sits in the pool or waits to
+    be reattached, and output keeps landing in the scrollback ring buffer.
+    Only touched from the loop thread.
+    """
+
+    def __init__(self, user_id=None):
+        self.sid = None
+        self.user_id = user_id
+        self.backend = None
+        self.status = None
+        self.inbox = asyncio.Queue()
+        self.task = None
+        self.expiry = None
+        self.pending = []
+        self.pending_size = 0
+        self.flush_handle = None
+        self.unacked = 0
+        self.generation = 0
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.scrollback = collections.deque()
+        self.scrollback_size = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.started = time.time()
+        self.stats = {'frames_in': 0, 'chars_in': 0, 'batches_out': 0, 'chars_out': 0, 'chars_acked': 0, 'stalls': 0}
+
+    def emit(self, event, data):
+        if self.sid is not None:
+            # The browser is always connected to this worker (see serve.py), so
+            # terminal traffic skips the message queue when one is configured.
+            socketio.emit(event, data, to=self.sid, namespace='/terminal_ws', ignore_queue=True)
+
+    def set_status(self, message):
+        self.status = message
+        self.emit('status_update', message)
+
+    def attach(self, sid):
+        """Hands the session to a browser: status first, then the scrollback."""
+        self.sid = sid
+        self.generation += 1
+        self.unacked = 0
+        self.drained.set()
+        self.pending, self.pending_size = [], 0
+        if self.status:
+            self.emit('status_update', self.status)
+        self.emit('terminal_clear', None)
+        for chunk in self.scrollback:
+            self._queue(chunk)
+        self.flush()
+
+    def detach(self):
+        self.sid = None
+        self.generation += 1
+        self.pending, self.pending_size = [], 0
+        # Acks for batches sent to the old browser will never come.
+        self.unacked = 0
+        self.drained.set()
+
+    def buffer_output(self, message):
+        """Records an upstream frame and queues it, flushing now if the batch is full or soon otherwise."""
+        if isinstance(message, bytes):
+            message = self.decoder.decode(message)
+        self.stats['frames_in'] += 1
+        if not message:
+            return
+        self.stats['chars_in'] += len(message)
+        self.scrollback.append(message)
+        self.scrollback_size += len(message)
+        while self.scrollback_size > SCROLLBACK_SIZE:
+            oldest = self.scrollback.popleft()
+            self.scrollback_size -= len(oldest)
+            if self.scrollback_size < SCROLLBACK_SIZE:
+                # Keep the tail of the chunk that crossed the limit.
+                oldest = oldest[-(SCROLLBACK_SIZE - self.scrollback_size):]
+                self.scrollback.appendleft(oldest)
+                self.scrollback_size += len(oldest)
+        if self.sid is not None:
+            self._queue(message)
+
+    def _queue(self, message):
+        self.pending.append(message)
+        self.pending_size += len(message)
+        if self.pending_size >= FLUSH_SIZE:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = get_loop().call_later(FLUSH_INTERVAL, self.flush)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending or self.sid is None:
+            return
+        data, size = ''.join(self.pending), self.pending_size
+        self.pending, self.pending_size = [], 0
+        self.unacked += size
+        if self.unacked >= MAX_UNACKED:
+            self.drained.clear()
+        self.stats['batches_out'] += 1
+        self.stats['chars_out'] += size
+        loop, generation = get_loop(), self.generation
+        socketio.emit('terminal_output', data, to=self.sid, namespace='/terminal_ws', ignore_queue=True,
+                      callback=lambda *args: loop.call_soon_threadsafe(self.acked, size, generation))
+
+    def acked(self, size, generation):
+        self.stats['chars_acked'] += size
+        if generation != self.generation:
+            return
+        self.unacked -= size
+        if self.unacked < MAX_UNACKED:
+            self.drained.set()
+
+    def describe(self):
+        return dict(self.stats, sid=self.sid, attached=self.sid is not None, connected=self.backend is not None,
+                    unacked=self.unacked, scrollback=self.scrollback_size, uptime=round(time.time() - self.started, 3))
+
 # ==========================================
 # 2. FLASK BLUEPRINT FOR THE UI
 # ==========================================
@@ -31,54 +214,312 @@ terminal_app_blueprint = Blueprint(
 @login_required
 def index():
     """Serves the main terminal.html user interface."""
-    return render_template('terminal.html', socketio_namespace='/terminal_ws')
+    return render_template('terminal.html', socketio_namespace='/terminal_ws', backend=BACKEND)
+
+@terminal_app_blueprint.route('/stats')
+@login_required
+def stats():
+    """Throughput counters of the current user's terminal sessions."""
+    return jsonify([s.describe() for s in list(sessions) if s.user_id == current_user.id])
 
 # ==========================================
-# 3. BACKGROUND PROXY TASK (WITH TIMEOUT & FEEDBACK)
+# 3. TERMINAL BACKENDS
 # ==========================================
 
-async def proxy_to_terminal_async(sid):
+class RemoteBackend:
+    """The external ttyd-style service, reached over a websocket."""
+    connecting_message = 'Connecting to external terminal... This may take up to 3 minutes for the service to wake up.'
+
+    def __init__(self):
+        self.websocket = None
+
+    async def open(self):
+        # **BUG FIX**: Apply the generous connection timeout.
+        self.websocket = await websockets.connect(EXTERNAL_TERMINAL_URL, open_timeout=CONNECTION_TIMEOUT)
+
+    async def send(self, data):
+        await self.websocket.send(data)
+
+    def __aiter__(self):
+        return self.websocket.__aiter__()
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+class LocalPtyBackend:
     """
-    This is the core async task that connects to the external terminal and
-    continuously relays messages back and forth.
+    A shell on a pseudo-terminal, started in the workspace. Output is read
+    without blocking from the loop: one chunk at a time, re-arming the reader
+    only once that chunk has been consumed, so a slow browser leaves data in
+    the kernel's PTY buffer (which in turn blocks the writing program).
     """
+    connecting_message = 'Starting local shell...'
+
+    def __init__(self, cwd, shell):
+        self.cwd = cwd
+        self.shell = shell
+        self.pid = None
+        self.fd = None
+        self.chunks = asyncio.Queue()
+
+    async def open(self):
+        env = dict(os.environ, TERM='xterm-256color', PWD=self.cwd)
+        pid, fd = os.forkpty()
+        if pid == 0:
+            # Child: only exec-safe calls between fork and exec.
+            try:
+                os.chdir(self.cwd)
+                os.execvpe(self.shell, [self.shell], env)
+            finally:
+                os._exit(127)
+        self.pid, self.fd = pid, fd
+        os.set_blocking(fd, False)
+        asyncio.get_running_loop().add_reader(fd, self._on_readable)
+
+    def _on_readable(self):
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self.fd)
+        try:
+            data = os.read(self.fd, PTY_READ_SIZE)
+        except BlockingIOError:
+            loop.add_reader(self.fd, self._on_readable)
+            return
+        except OSError:
+            data = b''  # EIO: the shell exited and the PTY is gone
+        self.chunks.put_nowait(data)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        data = await self.chunks.get()
+        if not data:
+            raise StopAsyncIteration
+        asyncio.get_running_loop().add_reader(self.fd, self._on_readable)
+        return data
+
+    async def send(self, data):
+        data = translate_input(data).encode('utf-8')
+        while data:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+
+    async def close(self):
+        if self.fd is not None:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+        if self.pid is None:
+            return
+        try:
+            os.kill(self.pid, signal.SIGHUP)
+            for _ in range(20):
+                if os.waitpid(self.pid, os.WNOHANG)[0]:
+                    return
+                await asyncio.sleep(0.05)
+            os.kill(self.pid, signal.SIGKILL)
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+        except ProcessLookupError:
+            pass
+        finally:
+            self.pid = None
+
+def translate_input(data):
+    """
+    The page sends Enter as a literal '\\r\\n' suffix and special keys as
+    literal '\\x1b[...' strings (the remote service decodes them itself). Turn
+    just those into the bytes a PTY expects, leaving other backslashes alone.
+    """
+    if data.endswith('\\r\\n'):
+        data = data[:-4] + '\r'
+    if data.startswith('\\x1b'):
+        data = '\x1b' + data[4:]
+    return data
+
+def make_backend():
+    if BACKEND == 'local':
+        return LocalPtyBackend(WORKSPACE_DIR, LOCAL_SHELL)
+    return RemoteBackend()
+
+# ==========================================
+# 3b. BACKGROUND PROXY TASK (WITH TIMEOUT & FEEDBACK)
+# ==========================================
+
+async def pump_input(session):
+    """Forwards queued keystrokes to the terminal backend, in order."""
+    while True:
+        data = await session.inbox.get()
+        await session.backend.send(data)
+
+async def proxy_to_terminal_async(session):
+    """
+    This is the core async task that opens the terminal backend and
+    continuously relays messages back and forth, whether or not a browser is
+    currently attached to the session.
+    """
+    backend = make_backend()
+    writer = None
     try:
         # **UX FIX**: Inform the user that we are connecting and it might take time.
-        socketio.emit('status_update', 'Connecting to external terminal... This may take up to 3 minutes for the service to wake up.', to=sid, namespace='/terminal_ws')
+        session.set_status(backend.connecting_message)
         
-        # **BUG FIX**: Apply the generous connection timeout.
-        async with websockets.connect(EXTERNAL_TERMINAL_URL, open_timeout=CONNECTION_TIMEOUT) as websocket:
-            
-            # **UX FIX**: Inform the user of success.
-            socketio.emit('status_update', 'Connection successful! Terminal is ready.', to=sid, namespace='/terminal_ws')
+        await backend.open()
+        reset_pool_backoff()
             
-            print(f"Successfully connected to external terminal for SID: {sid}")
-            connections[sid] = websocket
-            
-            # This loop runs forever, listening for messages from the ttyd server.
-            async for message in websocket:
-                socketio.emit('terminal_output', message, to=sid, namespace='/terminal_ws')
+        # **UX FIX**: Inform the user of success.
+        session.set_status('Connection successful! Terminal is ready.')
+        
+        print(f"Successfully connected to {BACKEND} terminal (session {id(session):x}, SID: {session.sid})")
+        session.backend = backend
+        # Input typed while we were connecting is already waiting in the inbox.
+        writer = asyncio.ensure_future(pump_input(session))
+        
+        # This loop runs until the terminal closes, relaying its output.
+        async for message in backend:
+            session.buffer_output(message)
+            if not session.drained.is_set():
+                # Backpressure: the browser is behind, so stop pulling from upstream.
+                session.stats['stalls'] += 1
+                session.flush()
+                await session.drained.wait()
+        session.buffer_output(session.decoder.decode(b'', final=True))
+        session.flush()
                 
+    except asyncio.CancelledError:
+        # The browser went away; the backend is closed below.
+        pass
     except asyncio.TimeoutError:
-        print(f"Connection timed out for SID {sid} after {CONNECTION_TIMEOUT} seconds.")
-        socketio.emit('terminal_error', f"Connection failed: The external terminal did not respond within {CONNECTION_TIMEOUT} seconds.", to=sid, namespace='/terminal_ws')
+        if session.sid is not None:
+            print(f"Connection timed out for SID {session.sid} after {CONNECTION_TIMEOUT} seconds.")
+        session.emit('terminal_error', f"Connection failed: The external terminal did not respond within {CONNECTION_TIMEOUT} seconds.")
     except Exception as e:
-        print(f"Error in terminal proxy for SID {sid}: {e}")
-        socketio.emit('terminal_error', f"An error occurred: {e}", to=sid, namespace='/terminal_ws')
+        if session.sid is not None:
+            print(f"Error in terminal proxy for SID {session.sid}: {e}")
+        session.emit('terminal_error', f"An error occurred: {e}")
     finally:
+        if writer is not None:
+            writer.cancel()
+        if session.flush_handle is not None:
+            session.flush_handle.cancel()
+        try:
+            await backend.close()
+        except Exception as e:
+            print(f"Error closing terminal backend for SID {session.sid}: {e}")
         # Clean up if the connection is lost.
-        if sid in connections:
-            del connections[sid]
-        print(f"Proxy task ended for SID: {sid}")
+        forget_session(session)
+        if session.sid is not None:
+            print(f"Proxy task ended for SID: {session.sid}")
 
-def run_proxy_wrapper(sid):
-    """
-    Synchronous wrapper to run the async proxy task in a background thread.
-    """
-    try:
-        asyncio.run(proxy_to_terminal_async(sid))
-    except Exception as e:
-        print(f"Error starting asyncio loop for proxy wrapper: {e}")
+# ==========================================
+# 3c. SESSION POOL & REATTACH (loop thread only)
+# ==========================================
+
+def start_session(user_id=None):
+    session = TerminalSession(user_id)
+    sessions.add(session)
+    session.task = asyncio.ensure_future(proxy_to_terminal_async(session))
+    return session
+
+def forget_session(session):
+    """Drops every reference to a finished session; refills the pool if it came from there."""
+    sessions.discard(session)
+    if session.sid is not None and connections.get(session.sid) is session:
+        del connections[session.sid]
+    if session.expiry is not None:
+        session.expiry.cancel()
+    waiting = detached.get(session.user_id, [])
+    if session in waiting:
+        waiting.remove(session)
+        if not waiting:
+            del detached[session.user_id]
+    if session in pool:
+        # A warm session that died before use: the backend is probably down, so back off.
+        pool.remove(session)
+        schedule_pool_retry()
+
+def fill_pool():
+    """Tops the warm pool up, unless it is backing off after failed sessions."""
+    if pool_retry is not None or pool_failures > POOL_MAX_RETRIES:
+        return
+    while len(pool) < POOL_SIZE:
+        pool.append(start_session())
+
+def schedule_pool_retry():
+    global pool_failures, pool_retry
+    if pool_retry is not None:
+        return
+    pool_failures += 1
+    if pool_failures > POOL_MAX_RETRIES:
+        print(f"[!] NexussTerminal: warm session failed {pool_failures - 1} times in a row, "
+              "pool paused until a terminal connects successfully.")
+        return
+    delay = POOL_RETRY_DELAY * 2 ** (pool_failures - 1)
+    print(f"[!] NexussTerminal: warm session failed, retrying in {delay} s.")
+    pool_retry = get_loop().call_later(delay, retry_pool)
+
+def retry_pool():
+    global pool_retry
+    pool_retry = None
+    fill_pool()
+
+def reset_pool_backoff():
+    """A backend came up: forget past failures and refill the pool if it was paused."""
+    global pool_failures, pool_retry
+    if pool_failures:
+        pool_failures = 0
+        if pool_retry is not None:
+            pool_retry.cancel()
+            pool_retry = None
+        fill_pool()
+
+def attach_browser(sid, user_id):
+    """Gives a connecting browser its user's detached session, a warm one, or a new one."""
+    if user_id is None:
+        # Shells, pooled or detached ones included, only ever go to a logged-in user.
+        print(f"Refused terminal session for anonymous SID: {sid}")
+        return
+    waiting = detached.get(user_id)
+    if waiting:
+        session = waiting.pop()
+        if not waiting:
+            del detached[user_id]
+        session.expiry.cancel()
+        session.expiry = None
+        print(f"Reattached terminal session for SID: {sid}")
+    elif pool:
+        session = pool.pop(0)
+        session.user_id = user_id
+    else:
+        session = start_session(user_id)
+    connections[sid] = session
+    session.attach(sid)
+    # The pool is first filled here rather than at import, so processes that
+    # never serve a terminal never open one.
+    fill_pool()
+
+def detach_browser(sid):
+    """Keeps a disconnected browser's session around for REATTACH_GRACE seconds."""
+    session = connections.pop(sid, None)
+    if session is None:
+        return
+    session.detach()
+    if session.task.done():
+        return
+    if REATTACH_GRACE <= 0 or session.user_id is None:
+        session.task.cancel()
+        return
+    detached.setdefault(session.user_id, []).append(session)
+    session.expiry = get_loop().call_later(REATTACH_GRACE, session.task.cancel)
+
+def deliver_input(sid, data):
+    session = connections.get(sid)
+    if session is not None:
+        session.inbox.put_nowait(data)
 
 # ==========================================
 # 4. SOCKET.IO NAMESPACE
@@ -91,26 +532,22 @@ class TerminalNamespace(Namespace):
 
     def on_connect(self):
         """Triggered when a user's browser connects."""
+        if not current_user.is_authenticated:
+            return False
         sid = request.sid
         print(f"Browser connected to Terminal Namespace: {sid}")
-        socketio.start_background_task(run_proxy_wrapper, sid)
+        get_loop().call_soon_threadsafe(attach_browser, sid, current_user.id)
 
     def on_disconnect(self):
         """Triggered when a user's browser disconnects."""
         sid = request.sid
         print(f"Browser disconnected from Terminal Namespace: {sid}")
-        if sid in connections:
-            # **BUG FIX**: Don't use asyncio.run in a running loop.
-            # Schedule the close operation on the existing loop.
-            asyncio.create_task(connections[sid].close())
-            del connections[sid]
-            print(f"Scheduled closure of external connection for SID: {sid}")
+        get_loop().call_soon_threadsafe(detach_browser, sid)
 
     def on_terminal_input(self, data):
-        """Receives data from the user and forwards it to the external terminal."""
-        sid = request.sid
-        if sid in connections:
-            asyncio.run(connections[sid].send(data))
+        """Receives data from the user and forwards it to the terminal backend."""
+        # Same FIFO as attach/detach, so input is never routed to a stale session.
+        get_loop().call_soon_threadsafe(deliver_input, request.sid, data)
 
 # ==========================================
 # 5. INITIALIZATION FUNCTION
@@ -118,11 +555,34 @@ class TerminalNamespace(Namespace):
 
 def create_blueprint(flask_app, database, socketio_instance):
     """Called by the main app.py to initialize the extension."""
-    global socketio
+    global socketio, tasks, BACKEND, WORKSPACE_DIR, LOCAL_SHELL, POOL_SIZE, POOL_MAX_RETRIES, REATTACH_GRACE, SCROLLBACK_SIZE
     socketio = socketio_instance
+    if 'tasks' in flask_app.extensions:
+        tasks = flask_app.extensions['tasks'].for_extension('NexussTerminal')
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manifest.json')) as f:
+        manifest = json.load(f)
+    BACKEND = flask_app.config.get('TERMINAL_BACKEND') or manifest.get('backend', 'remote')
+    WORKSPACE_DIR = flask_app.config.get('WORKSPACE_DIR', WORKSPACE_DIR)
+    LOCAL_SHELL = flask_app.config.get('TERMINAL_SHELL') or LOCAL_SHELL
+    POOL_SIZE = flask_app.config.get('TERMINAL_POOL_SIZE', POOL_SIZE)
+    POOL_MAX_RETRIES = flask_app.config.get('TERMINAL_POOL_RETRIES', POOL_MAX_RETRIES)
+    REATTACH_GRACE = flask_app.config.get('TERMINAL_REATTACH_GRACE', REATTACH_GRACE)
+    SCROLLBACK_SIZE = flask_app.config.get('TERMINAL_SCROLLBACK', SCROLLBACK_SIZE)
+    if BACKEND not in ('remote', 'local'):
+        print(f"[!] NexussTerminal: unknown backend '{BACKEND}', using 'remote'.")
+        BACKEND = 'remote'
+    elif BACKEND == 'local' and not hasattr(os, 'forkpty'):
+        print("[!] NexussTerminal: local PTY backend is not available on this platform, using 'remote'.")
+        BACKEND = 'remote'
 
     socketio.on_namespace(TerminalNamespace('/terminal_ws'))
+    metrics = flask_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.gauge('nexuss_terminal_sessions', 'Terminal sessions by state.',
+                      lambda: {'attached': len(connections), 'detached': sum(len(v) for v in list(detached.values())),
+                               'pooled': len(pool)}, ('state',))
     
-    print("[+] NexussTerminal Extension: SocketIO Namespace registered.")
+    print(f"[+] NexussTerminal Extension: SocketIO Namespace registered ({BACKEND} backend).")
 
     return terminal_app_blueprint
\ No newline at end of file
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify
 from flask_login import login_required, current_user
 
 # ==========================================
@@ -9,6 +9,11 @@ from flask_login import login_required, current_user
 db = None
 Todo = None
 
+# Page sizes for the list view and the JSON API, and the most items one batch call may touch.
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH = 500
+
 # Define the blueprint object. Routes will be attached to this.
 todo_app_blueprint = Blueprint(
     'todo_app', 
@@ -24,10 +29,10 @@ todo_app_blueprint = Blueprint(
 @todo_app_blueprint.route('/')
 @login_required
 def index():
-    """Main view for the Todo app."""
+    """Main view for the Todo app, one page at a time (`?after=<last id>` for the next)."""
     if Todo: # Check if the model is initialized
-        user_todos = Todo.query.filter_by(user_id=current_user.id).all()
-        return render_template('todo.html', todos=user_todos)
+        user_todos, next_after = todo_page(current_user.id, request.args.get('after', 0, type=int), PAGE_SIZE)
+        return render_template('todo.html', todos=user_todos, next_after=next_after)
     return "Error: Todo extension not initialized correctly.", 500
 
 @todo_app_blueprint.route('/add', methods=['POST'])
@@ -53,7 +58,62 @@ def delete_todo(todo_id):
     return redirect(url_for('todo_app.index'))
 
 # ==========================================
-# 3. INITIALIZATION FUNCTION (THE FIX)
+# 3. JSON API (KEYSET PAGINATION & BATCHES)
+# ==========================================
+
+def todo_page(user_id, after, limit):
+    """
+    Todos with id > `after` in id order, plus the id to pass as `after` for the
+    next page (None on the last one). Served straight from the user_id index,
+    so deep pages cost the same as the first.
+    """
+    rows = (Todo.query.filter(Todo.user_id == user_id, Todo.id > after)
+            .order_by(Todo.id).limit(limit + 1).all())
+    return rows[:limit], (rows[limit - 1].id if len(rows) > limit else None)
+
+def todo_json(todo):
+    return {'id': todo.id, 'content': todo.content}
+
+@todo_app_blueprint.route('/api/todos', methods=['GET'])
+@login_required
+def api_list_todos():
+    """Query: after (last id seen, default 0), limit (default PAGE_SIZE)."""
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    todos, next_after = todo_page(current_user.id, request.args.get('after', 0, type=int), limit)
+    return jsonify({'todos': [todo_json(t) for t in todos], 'next_after': next_after})
+
+@todo_app_blueprint.route('/api/todos', methods=['POST'])
+@login_required
+def api_add_todos():
+    """Body: {items: [content, ...]} or {content}. Inserts everything in one transaction."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict): return jsonify({'error': 'Body must be a JSON object'}), 400
+    items = data.get('items', [data['content']] if 'content' in data else None)
+    if not isinstance(items, list) or not items: return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH: return jsonify({'error': f'At most {MAX_BATCH} items per request'}), 400
+    if not all(isinstance(c, str) and 0 < len(c.strip()) <= 200 for c in items):
+        return jsonify({'error': 'Each item must be a non-empty string of at most 200 characters'}), 400
+    new_todos = [Todo(content=c, user_id=current_user.id) for c in items]
+    db.session.add_all(new_todos)
+    db.session.commit()
+    return jsonify({'todos': [todo_json(t) for t in new_todos]}), 201
+
+@todo_app_blueprint.route('/api/todos/delete', methods=['POST'])
+@login_required
+def api_delete_todos():
+    """Body: {ids: [...]}. Ids that are not the user's are ignored; replies with the count removed."""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    if len(ids) > MAX_BATCH: return jsonify({'error': f'At most {MAX_BATCH} ids per request'}), 400
+    deleted = (Todo.query.filter(Todo.user_id == current_user.id, Todo.id.in_(ids))
+               .delete(synchronize_session=False)) if ids else 0
+    db.session.commit()
+    return jsonify({'deleted': deleted})
+
+# ==========================================
+# 4. INITIALIZATION FUNCTION (THE FIX)
 # ==========================================
 
 def create_blueprint(flask_app, database, socketio_instance):
@@ -70,7 +130,7 @@ def create_blueprint(flask_app, database, socketio_instance):
         __tablename__ = 'todo' 
         id = db.Column(db.Integer, primary_key=True)
         content = db.Column(db.String(200), nullable=False)
-        user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
         user = db.relationship('User', backref=db.backref('extension_todos', lazy=True))
 
     # 3. Assign the fully-initialized model to the global placeholder.
@@ -0,0 +1,261 @@
+"""
+Helpers for reading large workspace files without loading them whole.
+
+- `sniff_binary` looks at the first few KB to decide whether a file is text.
+- `read_byte_range` returns a slice that never splits a UTF-8 character and,
+  optionally, ends on a line boundary so pages can be appended cleanly.
+- `read_line_range` serves whole lines using a sparse line index (one
+  checkpoint per MB), so jumping to line 2,000,000 does not rescan the file.
+- `detect_eol` says which line endings a piece of text uses.
+
+Text is decoded strictly and line endings are kept as they are, exactly as
+the save API reads the file it applies edits to; pass errors='replace' to
+show a file that is not valid UTF-8 anyway.
+
+Files at or above `MMAP_THRESHOLD` are accessed through mmap, which lets the
+OS page cache do the work instead of copying the file into Python memory.
+
+`ContentCache` keeps recently served read results (decoded text or binary
+metadata) so reopening an unchanged file costs a stat() instead of a read
+and a decode.
+"""
+import bisect
+import codecs
+import mimetypes
+import mmap
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+BINARY_SNIFF_BYTES = 8192
+MMAP_THRESHOLD = 1 << 20
+LINE_INDEX_CHUNK = 1 << 20
+LINE_INDEX_CACHE_SIZE = 16
+
+
+def sniff_binary(path):
+    """True if the file looks binary: it contains NUL bytes or is not valid UTF-8."""
+    with open(path, 'rb') as f:
+        head = f.read(BINARY_SNIFF_BYTES)
+    if b'\0' in head:
+        return True
+    try:
+        # final=False tolerates a multi-byte character cut off by the sniff window.
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def describe(path):
+    """Metadata returned instead of content for files the editor cannot show."""
+    st = os.stat(path)
+    return {
+        'binary': True,
+        'size': st.st_size,
+        'mime': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'mtime': st.st_mtime,
+    }
+
+
+class _Source:
+    """Context manager yielding a sliceable view of the file: mmap for big files, bytes otherwise."""
+
+    def __init__(self, path, size):
+        self.path, self.size = path, size
+        self._file = self._map = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'rb')
+        if self.size >= MMAP_THRESHOLD:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map
+        return self._file.read()
+
+    def __exit__(self, *exc):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def _trim_partial_char(data):
+    """Drops an incomplete UTF-8 sequence from the end of `data`."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    decoder.decode(data, final=False)
+    pending = len(decoder.getstate()[0])
+    return data[:len(data) - pending] if pending else data
+
+
+def detect_eol(text):
+    """'crlf', 'lf', 'mixed' (including lone '\\r'), or None when `text` has no line breaks."""
+    crlf = text.count('\r\n')
+    lf, cr = text.count('\n') - crlf, text.count('\r') - crlf
+    if cr or (crlf and lf):
+        return 'mixed'
+    return 'crlf' if crlf else 'lf' if lf else None
+
+
+def read_byte_range(path, offset, length, align_lines=True, errors='strict'):
+    """
+    Returns (text, next_offset). `next_offset` is None once the end of the file
+    is reached. The slice is shortened so it never ends mid-character and, with
+    `align_lines`, ends after the last newline when there is one.
+    """
+    size = os.path.getsize(path)
+    offset = max(0, offset)
+    if offset >= size:
+        return '', None
+    end = min(size, offset + max(1, length))
+    with _Source(path, size) as src:
+        data = bytes(src[offset:end])
+    if end < size:
+        if align_lines:
+            cut = data.rfind(b'\n')
+            if cut != -1:
+                data = data[:cut + 1]
+        data = _trim_partial_char(data) or data
+    next_offset = offset + len(data)
+    return data.decode('utf-8', errors=errors), (next_offset if next_offset < size else None)
+
+
+class LineIndex:
+    """Sparse map of line number -> byte offset, one checkpoint per LINE_INDEX_CHUNK bytes."""
+
+    def __init__(self, src, size):
+        self.lines, self.offsets = [0], [0]
+        line = 0
+        for start in range(0, size, LINE_INDEX_CHUNK):
+            end = min(size, start + LINE_INDEX_CHUNK)
+            line += src[start:end].count(b'\n')
+            if end < size:
+                self.lines.append(line)
+                self.offsets.append(end)
+        self.total_lines = line + 1
+
+    def offset_of(self, src, size, line_no):
+        """Byte offset where 0-based line `line_no` starts (size if past the end)."""
+        i = bisect.bisect_right(self.lines, line_no) - 1
+        line, pos = self.lines[i], self.offsets[i]
+        # A checkpoint may sit mid-line; back up to the start of that same line.
+        if pos:
+            pos = src.rfind(b'\n', 0, pos) + 1
+        while line < line_no:
+            nl = src.find(b'\n', pos)
+            if nl == -1:
+                return size
+            pos, line = nl + 1, line + 1
+        return pos
+
+
+_line_indexes = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+
+def _get_line_index(path, st, src):
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _line_indexes_lock:
+        index = _line_indexes.get(key)
+        if index is not None:
+            _line_indexes.move_to_end(key)
+            return index
+    index = LineIndex(src, st.st_size)
+    with _line_indexes_lock:
+        _line_indexes[key] = index
+        while len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+            _line_indexes.popitem(last=False)
+    return index
+
+
+def read_line_range(path, start_line, line_count, errors='strict'):
+    """
+    Returns (text, start_offset, next_line, total_lines) for `line_count` lines
+    starting at 0-based `start_line`. `next_line` is None at the end of the file.
+    """
+    st = os.stat(path)
+    size = st.st_size
+    if size == 0:
+        return '', 0, None, 1
+    with _Source(path, size) as src:
+        index = _get_line_index(path, st, src)
+        start = index.offset_of(src, size, max(0, start_line))
+        end = index.offset_of(src, size, max(0, start_line) + max(1, line_count))
+        data = bytes(src[start:end])
+    next_line = start_line + line_count if end < size else None
+    return data.decode('utf-8', errors=errors), start, next_line, index.total_lines
+
+
+class ContentCache:
+    """
+    LRU cache of read results, bounded by the memory their text takes. Entries
+    are keyed by path and a request variant (whole file, byte page, line range)
+    and are only served while the file's (mtime_ns, size) still match, so a
+    change made behind our back is never served stale; writers also call
+    `invalidate(path)` so the memory is released straight away.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (path, variant) -> (mtime_ns, size, payload, cost)
+        self._by_path = {}             # path -> set of variants
+        self._lock = threading.Lock()
+
+    def get(self, path, st, variant):
+        key = (os.path.normpath(path), variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, path, st, variant, payload):
+        cost = sum(sys.getsizeof(v) for v in payload.values() if isinstance(v, str)) + 256
+        if cost > self.max_entry_bytes:
+            return
+        path = os.path.normpath(path)
+        key = (path, variant)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (st.st_mtime_ns, st.st_size, payload, cost)
+            self._by_path.setdefault(path, set()).add(variant)
+            self.bytes += cost
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *paths):
+        with self._lock:
+            for path in map(os.path.normpath, paths):
+                for variant in list(self._by_path.get(path, ())):
+                    self._remove((path, variant))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_path.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[3]
+        variants = self._by_path.get(key[0])
+        if variants is not None:
+            variants.discard(key[1])
+            if not variants:
+                del self._by_path[key[0]]
@@ -0,0 +1,219 @@
+"""
+Per-file version numbers and text-edit application for the save API.
+
+A file's version is derived from its mtime (in microseconds, so it stays an
+exact integer in JavaScript) and only ever moves forward. Writes made through
+the API bump it explicitly; writes made behind our back (terminal, extensions)
+are picked up because the mtime no longer matches what we recorded. Because
+the starting value comes from the file itself, versions survive a restart as
+long as the file is unchanged.
+
+Saves that go through the write-behind queue `reserve()` their version up
+front; until the write lands and is `settle()`d, that pending version is the
+current one, whatever the disk still says.
+
+`SharedVersionStore` is the variant for several processes serving one
+workspace: versions live in the files' mtimes instead of process memory.
+"""
+import fcntl
+import os
+import threading
+import time
+import zlib
+
+
+class VersionConflict(Exception):
+    """Raised when a save is based on a version that is no longer current."""
+
+    def __init__(self, current):
+        super().__init__(f'stale base version, current is {current}')
+        self.current = current
+
+
+class VersionStore:
+    def __init__(self):
+        self._versions = {}  # abs path -> (version, mtime_ns, size)
+        self._pending = {}   # abs path -> version reserved for a queued write
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def lock(self, path):
+        """A per-path lock held across read-modify-write cycles."""
+        with self._guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def current(self, path):
+        """The version of `path` (including queued writes), or None if it does not exist."""
+        with self._guard:
+            pending = self._pending.get(path)
+        if pending is not None:
+            return pending
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._guard:
+            known = self._versions.get(path)
+            if known and known[1:] == (st.st_mtime_ns, st.st_size):
+                return known[0]
+            version = st.st_mtime_ns // 1000
+            if known:
+                version = max(version, known[0] + 1)
+            self._versions[path] = (version, st.st_mtime_ns, st.st_size)
+            return version
+
+    def check(self, path, base_version):
+        """Raises VersionConflict unless `base_version` is the current version."""
+        current = self.current(path)
+        if current is not None and base_version != current:
+            raise VersionConflict(current)
+        return current
+
+    def bump(self, path, previous=None):
+        """Records a write we just made and returns the new version."""
+        st = os.stat(path)
+        with self._guard:
+            known = self._versions.get(path)
+            floor = max(previous or 0, known[0] if known else 0)
+            version = max(st.st_mtime_ns // 1000, floor + 1)
+            self._versions[path] = (version, st.st_mtime_ns, st.st_size)
+            return version
+
+    def reserve(self, path, previous=None):
+        """Picks the version of a write that is queued but not on disk yet."""
+        with self._guard:
+            known = self._versions.get(path)
+            floor = max(previous or 0, known[0] if known else 0, self._pending.get(path, 0))
+            version = max(time.time_ns() // 1000, floor + 1)
+            self._pending[path] = version
+            return version
+
+    def settle(self, path, version):
+        """Records that the write reserved as `version` reached the disk."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        with self._guard:
+            if st is not None:
+                self._versions[path] = (version, st.st_mtime_ns, st.st_size)
+            if self._pending.get(path) == version:
+                del self._pending[path]
+
+    def drop(self, path, version):
+        """Abandons a reserved version whose write failed; the disk state becomes current again."""
+        with self._guard:
+            if self._pending.get(path) == version:
+                del self._pending[path]
+
+    def forget(self, path):
+        with self._guard:
+            self._versions.pop(path, None)
+
+
+class SharedVersionStore(VersionStore):
+    """
+    Versions shared by every process serving the workspace. A file's version
+    is exactly its mtime in microseconds: writes are stamped with their
+    reserved version before they replace the file (WriteBehindQueue's
+    `stamp_mtime`), so any process reads the same version back from the disk.
+    `lock()` also takes an fcntl lock on one byte of `lock_path`, so save
+    cycles exclude other processes too. Another process cannot see this one's
+    write-behind queue: writes must land before the lock is released.
+    """
+    LOCK_SLOTS = 4096
+
+    def __init__(self, lock_path):
+        super().__init__()
+        self._lock_file = open(lock_path, 'a')
+
+    def lock(self, path):
+        # Paths share a slot when they hash alike; fcntl locks are per process, so the
+        # thread lock must be per slot too, or two threads could both hold one slot.
+        slot = zlib.crc32(os.fsencode(path)) % self.LOCK_SLOTS
+        with self._guard:
+            thread_lock = self._locks.setdefault(slot, threading.Lock())
+        return _ProcessLock(thread_lock, self._lock_file.fileno(), slot)
+
+    def current(self, path):
+        with self._guard:
+            pending = self._pending.get(path)
+        if pending is not None:
+            return pending
+        try:
+            return os.stat(path).st_mtime_ns // 1000
+        except OSError:
+            return None
+
+    def reserve(self, path, previous=None):
+        floor = max(previous or 0, self.current(path) or 0)
+        with self._guard:
+            version = max(time.time_ns() // 1000, floor + 1)
+            self._pending[path] = version
+            return version
+
+    def settle(self, path, version):
+        # The write carried its version in its mtime: nothing to record.
+        self.drop(path, version)
+
+
+class _ProcessLock:
+    """A thread lock plus an fcntl lock on one byte of a shared file."""
+
+    def __init__(self, thread_lock, fd, offset):
+        self._thread_lock, self._fd, self._offset = thread_lock, fd, offset
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, self._offset)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._offset)
+        self._thread_lock.release()
+
+
+def apply_text_edits(text, edits):
+    """
+    Applies edits in order. Each edit is {'offset': int, 'length': int, 'text': str}
+    where offset/length count UTF-16 code units, which is what Monaco reports
+    (`rangeOffset`/`rangeLength`). Raises ValueError for malformed edits.
+    """
+    edits = list(_validated(edits))
+    if text.isascii() and all(new_text.isascii() for _, _, new_text in edits):
+        # Fast path: code points and UTF-16 units are the same thing.
+        for offset, length, new_text in edits:
+            if offset + length > len(text):
+                raise ValueError('edit range is outside the document')
+            text = text[:offset] + new_text + text[offset + length:]
+        return text
+
+    buf = bytearray(text.encode('utf-16-le'))
+    for offset, length, new_text in edits:
+        start, end = offset * 2, (offset + length) * 2
+        if end > len(buf):
+            raise ValueError('edit range is outside the document')
+        buf[start:end] = new_text.encode('utf-16-le', 'surrogatepass')
+    try:
+        return buf.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('edit splits a surrogate pair')
+
+
+def _validated(edits):
+    if not isinstance(edits, list):
+        raise ValueError('edits must be a list')
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError('each edit must be an object')
+        try:
+            offset, length, new_text = int(edit['offset']), int(edit.get('length', 0)), edit.get('text', '')
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('each edit needs an integer offset')
+        if offset < 0 or length < 0 or not isinstance(new_text, str):
+            raise ValueError('invalid edit')
+        yield offset, length, new_text
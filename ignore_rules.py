@@ -0,0 +1,164 @@
+"""
+Gitignore-style ignore rules for the workspace.
+
+Rules come from two places: the ``WORKSPACE_IGNORE`` list in the Flask config
+and an optional ``.nexussignore`` file at the root of the workspace. The file
+is re-read automatically when its mtime changes.
+
+Supported syntax (a practical subset of .gitignore):
+    # comment          -> ignored line
+    node_modules       -> matches a file or folder with that name at any depth
+    build/             -> trailing slash: only matches folders
+    /dist              -> leading (or inner) slash: anchored to the workspace root
+    *.log, ?, [abc]    -> shell-style wildcards that never cross a '/'
+    **/cache, logs/**  -> '**' matches across folders
+    !keep.log          -> negation, re-includes a previously ignored path
+"""
+import os
+import re
+import threading
+
+IGNORE_FILENAME = '.nexussignore'
+
+DEFAULT_IGNORE_PATTERNS = [
+    '.git/',
+    'node_modules/',
+    '__pycache__/',
+    '.venv/',
+    'venv/',
+    '.mypy_cache/',
+    '.pytest_cache/',
+    '.DS_Store',
+    '*.nexuss-tmp',
+]
+
+
+def _translate(pattern):
+    """Converts a single glob pattern (without flags) into a regex body."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class IgnoreRule:
+    """One compiled line of an ignore file."""
+
+    __slots__ = ('pattern', 'negate', 'dir_only', 'regex')
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        body = _translate(pattern.lstrip('/'))
+        prefix = '^' if anchored else '^(?:.*/)?'
+        self.regex = re.compile(prefix + body + '$')
+
+    def matches(self, rel_path, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.match(rel_path) is not None
+
+
+class IgnoreRules:
+    """
+    The combined, ordered rule set for a workspace. Later rules win, exactly
+    like .gitignore, so a `!pattern` can re-include something a default hides.
+    """
+
+    def __init__(self, root, patterns=None):
+        self.root = root
+        self.base_patterns = list(DEFAULT_IGNORE_PATTERNS if patterns is None else patterns)
+        self._lock = threading.Lock()
+        self._file_mtime = None
+        self._rules = []
+        # Bumped whenever the effective rule set changes; callers that cache
+        # results derived from the rules (e.g. the tree cache) key on it.
+        self.version = 0
+        self._reload(self._read_file_mtime())
+
+    def _ignore_file(self):
+        return os.path.join(self.root, IGNORE_FILENAME)
+
+    def _read_file_mtime(self):
+        try:
+            return os.stat(self._ignore_file()).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self, mtime):
+        lines = list(self.base_patterns)
+        if mtime is not None:
+            try:
+                with open(self._ignore_file(), 'r', encoding='utf-8') as f:
+                    lines.extend(f.read().splitlines())
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Ignore Rules Error: {e}")
+        rules = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            rules.append(IgnoreRule(line))
+        self._rules = rules
+        self._file_mtime = mtime
+        self.version += 1
+
+    def refresh(self):
+        """Re-reads .nexussignore if it changed. Cheap: one stat() call."""
+        mtime = self._read_file_mtime()
+        if mtime != self._file_mtime:
+            with self._lock:
+                if mtime != self._file_mtime:
+                    self._reload(mtime)
+        return self.version
+
+    def is_ignored(self, rel_path, is_dir=False):
+        """
+        Checks a single workspace-relative path. Parents are NOT checked, which
+        is what a directory walk wants (it never descends into ignored folders).
+        Use `is_path_ignored` for an arbitrary path.
+        """
+        rel_path = rel_path.replace(os.sep, '/').strip('/')
+        ignored = False
+        for rule in self._rules:
+            if rule.negate == ignored and rule.matches(rel_path, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def is_path_ignored(self, rel_path, is_dir=False):
+        """Like `is_ignored`, but also returns True if any parent folder is ignored."""
+        parts = rel_path.replace(os.sep, '/').strip('/').split('/')
+        for i in range(1, len(parts)):
+            if self.is_ignored('/'.join(parts[:i]), True):
+                return True
+        return self.is_ignored('/'.join(parts), is_dir)
@@ -0,0 +1,268 @@
+"""
+A minimal pub/sub message bus for running several Socket.IO workers without
+an external broker.
+
+`BusBroker` is a TCP server that relays every frame a publisher sends to all
+connected subscribers. `BusManager` is a python-socketio client manager (the
+same role RedisManager or KombuManager play) that publishes through it, so
+an emit or broadcast made in one worker reaches clients connected to any
+worker. Frames are a 4-byte big-endian length followed by a JSON document,
+the encoding python-socketio's own zmq manager uses.
+
+URLs look like `nexuss://127.0.0.1:5555`. The broker has no authentication:
+bind it to localhost (the launcher does) or a private interface. For
+deployments that already run Redis or RabbitMQ, pass their URL instead and
+Flask-SocketIO's built-in managers are used.
+
+Run a standalone broker with `python message_bus.py 127.0.0.1:5555`.
+"""
+import collections
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from socketio import PubSubManager
+
+SCHEME = 'nexuss'
+_FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+SEND_TIMEOUT = 5.0
+SUBSCRIBER_BACKLOG = 4096  # frames a subscriber may fall behind before it is dropped
+RECONNECT_DELAY = 1.0
+
+ROLE_PUBLISHER = b'P'
+ROLE_SUBSCRIBER = b'S'
+
+
+def parse_url(url):
+    parts = urlsplit(url)
+    if parts.scheme != SCHEME or not parts.hostname or not parts.port:
+        raise ValueError(f'expected {SCHEME}://host:port, got {url!r}')
+    return parts.hostname, parts.port
+
+
+def socketio_options(url):
+    """Keyword arguments for SocketIO(...) that put it on the message queue at `url` (None: no queue)."""
+    if not url:
+        return {}
+    if url.startswith(SCHEME + '://'):
+        return {'client_manager': BusManager(url)}
+    return {'message_queue': url}
+
+
+def send_frame(sock, payload):
+    sock.sendall(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """The next frame's payload, or None once the peer has closed the connection."""
+    header = _recv_exactly(sock, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (length,) = _FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ConnectionError(f'frame of {length} bytes exceeds the limit')
+    return _recv_exactly(sock, length)
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+class _Subscriber:
+    """
+    A subscriber connection with its own send queue. The relay only appends
+    to it; a thread per subscriber writes whatever has piled up in one send,
+    so a slow subscriber delays nobody else.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+        self._frames = collections.deque()
+        self._cond = threading.Condition()
+
+    def push(self, frame):
+        """Queues a frame; False if the subscriber is gone or too far behind to keep."""
+        with self._cond:
+            if self.closed or len(self._frames) >= SUBSCRIBER_BACKLOG:
+                return False
+            self._frames.append(frame)
+            self._cond.notify()
+            return True
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)  # wakes the reader and any send in progress
+        except OSError:
+            pass
+
+    def write_forever(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._frames and not self.closed:
+                        self._cond.wait()
+                    if self.closed:
+                        return
+                    data = b''.join(self._frames)
+                    self._frames.clear()
+                self.conn.sendall(data)
+        except OSError:  # includes timeouts: a stuck subscriber is dropped, not waited on
+            self.close()
+        finally:
+            self.conn.close()
+
+
+class BusBroker:
+    """Relays frames from publishers to every subscriber. Two threads per subscriber, one per publisher."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = socket.create_server((host, port))
+        self.host, self.port = self._server.getsockname()[:2]
+        self.url = f'{SCHEME}://{self.host}:{self.port}'
+        self.frames = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='bus-broker', daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return  # closed
+            threading.Thread(target=self._serve, args=(conn,), name='bus-broker-conn', daemon=True).start()
+
+    def close(self):
+        self._server.close()
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.close()
+            self._subscribers.clear()
+
+    def _serve(self, conn):
+        try:
+            role = conn.recv(1)
+        except OSError:
+            role = None
+        if role == ROLE_SUBSCRIBER:
+            self._serve_subscriber(conn)
+            return
+        try:
+            if role == ROLE_PUBLISHER:
+                while True:
+                    payload = recv_frame(conn)
+                    if payload is None:
+                        break
+                    self._relay(payload)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _serve_subscriber(self, conn):
+        # A send timeout only: the read below must block until the subscriber leaves.
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', int(SEND_TIMEOUT), 0))
+        subscriber = _Subscriber(conn)  # its writer thread closes the socket
+        with self._lock:
+            self._subscribers.add(subscriber)
+        threading.Thread(target=subscriber.write_forever, name='bus-broker-send', daemon=True).start()
+        try:
+            conn.recv(1)  # subscribers never send; this returns when they disconnect
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+            subscriber.close()
+
+    def _relay(self, payload):
+        frame = _FRAME_HEADER.pack(len(payload)) + payload
+        # Appending never blocks, so holding the lock only keeps every subscriber's frames in one order.
+        with self._lock:
+            self.frames += 1
+            for subscriber in [s for s in self._subscribers if not s.push(frame)]:
+                self._subscribers.discard(subscriber)
+                subscriber.close()
+
+
+class BusManager(PubSubManager):
+    """Client manager that shares emits, rooms and callbacks between workers through a BusBroker."""
+    name = 'nexuss-bus'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.address = parse_url(url)
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self, role):
+        sock = socket.create_connection(self.address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(role)
+        return sock
+
+    def _publish(self, data):
+        payload = self.json.dumps({'channel': self.channel, 'data': data}).encode('utf-8')
+        with self._publish_lock:
+            for attempt in (1, 2):  # one reconnect, e.g. after the broker restarted
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(ROLE_PUBLISHER)
+                    send_frame(self._publisher, payload)
+                    return
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt == 2:
+                        raise
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect(ROLE_SUBSCRIBER)
+            except OSError as e:
+                self._get_logger().error(f'message bus unreachable ({e}), retrying')
+                time.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                while True:
+                    payload = recv_frame(sock)
+                    if payload is None:
+                        break
+                    message = json.loads(payload)
+                    if message.get('channel') == self.channel:
+                        yield message['data']
+            except (OSError, ValueError) as e:
+                self._get_logger().error(f'message bus connection lost ({e})')
+            finally:
+                sock.close()
+            time.sleep(RECONNECT_DELAY)
+
+
+if __name__ == '__main__':
+    host, _, port = (sys.argv[1] if len(sys.argv) > 1 else '127.0.0.1:5555').rpartition(':')
+    broker = BusBroker(host or '127.0.0.1', int(port))
+    print(f"--- Nexuss message bus listening on {broker.url} ---")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        broker.close()
@@ -0,0 +1,265 @@
+"""
+In-process metrics rendered in the Prometheus text format (no client library
+needed).
+
+`Metrics` holds counters, histograms and callback gauges. `install(app)` times
+every Flask endpoint (extension blueprints included) from the moment the
+request reaches the app until the server closes the response, so streamed
+bodies and file downloads count in full, and `MetricsSocketIO` is a drop-in SocketIO that counts events and payload
+bytes per namespace in both directions and times event handlers. Recording a
+sample is a couple of dict lookups under a lock, cheap enough to leave on.
+"""
+import bisect
+import json
+import threading
+import time
+
+from flask import request
+from flask_socketio import SocketIO
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, labels), value) for labels, value in sorted(items)]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        out = []
+        for labels, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                out.append((self.name + '_bucket', _labels(self.labelnames, labels, f'le="{_number(bound)}"'), cumulative))
+            out.append((self.name + '_sum', _labels(self.labelnames, labels), round(total, 6)))
+            out.append((self.name + '_count', _labels(self.labelnames, labels), cumulative))
+        return out
+
+
+class CallbackMetric:
+    """A gauge or counter read at scrape time: `callback()` returns a number or {label values: number}."""
+
+    def __init__(self, name, help, callback, labelnames=(), kind='gauge'):
+        self.name, self.help, self.callback, self.labelnames, self.kind = name, help, callback, tuple(labelnames), kind
+
+    def samples(self):
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [(self.name, '', value)]
+        return [(self.name, _labels(self.labelnames, labels if isinstance(labels, tuple) else (labels,)), v)
+                for labels, v in sorted(value.items())]
+
+
+class Metrics:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.http_duration = self.histogram('nexuss_http_request_duration_seconds',
+                                            'Time to produce and send a response, by endpoint.', ('endpoint', 'method'))
+        self.http_responses = self.counter('nexuss_http_responses_total', 'Responses by endpoint and status.',
+                                           ('endpoint', 'method', 'status'))
+        self.socketio_events = self.counter('nexuss_socketio_events_total', 'Socket.IO events by namespace and direction.',
+                                            ('namespace', 'direction'))
+        self.socketio_bytes = self.counter('nexuss_socketio_payload_bytes_total',
+                                           'Approximate Socket.IO payload bytes by namespace and direction.',
+                                           ('namespace', 'direction'))
+        self.socketio_duration = self.histogram('nexuss_socketio_handler_duration_seconds',
+                                                'Time spent in Socket.IO event handlers.', ('namespace', 'event'))
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, callback, labelnames=()):
+        """Registers a gauge computed by `callback()` on every scrape (replacing one of the same name)."""
+        with self._lock:
+            self._metrics.pop(name, None)
+        return self._add(CallbackMetric(name, help, callback, labelnames))
+
+    def callback_counter(self, name, help, callback, labelnames=()):
+        """Like gauge(), for a monotonically increasing value kept elsewhere."""
+        with self._lock:
+            self._metrics.pop(name, None)
+        return self._add(CallbackMetric(name, help, callback, labelnames, kind='counter'))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:  # a broken gauge callback must not take the endpoint down
+                print(f"Metrics Error ({metric.name}): {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+    # ------------------------------------------------------------------
+    # Flask
+    # ------------------------------------------------------------------
+    def install(self, app):
+        """Times every request, from the WSGI call until the server closes the response body."""
+        app.wsgi_app = TimedWSGI(app.wsgi_app, self)
+        app.after_request(self._end_request)
+        app.extensions['metrics'] = self
+
+    def _end_request(self, response):
+        # Unmatched URLs share one label so random paths cannot blow up the series count.
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+        request.environ[TimedWSGI.LABELS] = (endpoint, request.method)
+        self.http_responses.inc(endpoint, request.method, str(response.status_code))
+        return response
+
+    # ------------------------------------------------------------------
+    # Socket.IO
+    # ------------------------------------------------------------------
+    def count_socketio(self, namespace, direction, args):
+        self.socketio_events.inc(namespace, direction)
+        self.socketio_bytes.inc(namespace, direction, amount=sum(payload_size(a) for a in args))
+
+
+class TimedWSGI:
+    """
+    WSGI middleware observing `http_duration` once the response body has been
+    sent and closed. Labels come from the app's after_request hook; requests
+    that never reached it (an unhandled error) are not timed.
+    """
+    LABELS = 'nexuss.metrics.labels'
+
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app, self.metrics = wsgi_app, metrics
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        body = self.wsgi_app(environ, start_response)
+
+        def finished():
+            labels = environ.get(self.LABELS)
+            if labels is not None:
+                self.metrics.http_duration.observe(time.perf_counter() - started, *labels)
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Wrapping it would hide the file from the server, which sends it with sendfile().
+            close = getattr(body, 'close', None)
+
+            def closed():
+                try:
+                    if close is not None:
+                        close()
+                finally:
+                    finished()
+            body.close = closed
+            return body
+        return ClosingIterator(body, finished)
+
+
+def payload_size(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) if not value.isascii() else len(value)
+    if value is None:
+        return 0
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MetricsSocketIO(SocketIO):
+    """SocketIO that reports every emit and every handled event to a Metrics instance."""
+
+    def __init__(self, app=None, metrics=None, **kwargs):
+        self.metrics = metrics
+        super().__init__(app, **kwargs)
+
+    def emit(self, event, *args, **kwargs):
+        if self.metrics is not None:
+            self.metrics.count_socketio(kwargs.get('namespace') or '/', 'out', args)
+        return super().emit(event, *args, **kwargs)
+
+    def _handle_event(self, handler, message, namespace, sid, *args):
+        if self.metrics is None:
+            return super()._handle_event(handler, message, namespace, sid, *args)
+        started = time.perf_counter()
+        try:
+            result = super()._handle_event(handler, message, namespace, sid, *args)
+        except TypeError:
+            # Flask-SocketIO retries legacy disconnect handlers without the reason argument;
+            # let the retry be the one that is counted.
+            raise
+        except Exception:
+            self._record_event(namespace or '/', message, args, started)
+            raise
+        self._record_event(namespace or '/', message, args, started)
+        return result
+
+    def _record_event(self, namespace, event, args, started):
+        self.metrics.socketio_duration.observe(time.perf_counter() - started, namespace, event)
+        # connect/disconnect carry the WSGI environ or a reason, not client payload.
+        self.metrics.count_socketio(namespace, 'in', () if event in ('connect', 'disconnect') else args)
@@ -0,0 +1,330 @@
+"""
+Persistent trigram index for full-text search over the workspace.
+
+Every indexed file contributes the set of its (ASCII-lowercased) byte
+trigrams to a SQLite table. A query is turned into the trigrams any match
+must contain; intersecting their posting lists gives a short list of
+candidate files, which are then scanned line by line to produce exact
+results. Files without usable trigrams in the query (very short literals,
+regexes with alternation) fall back to scanning every indexed file.
+
+Updates are incremental: writers call `schedule(rel_path)` and a background
+thread re-indexes the file if its (mtime, size) changed. `reconcile()` brings
+the whole index in line with the disk, e.g. after a restart.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    tri INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (tri, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+# Intersecting more trigrams than this rarely shrinks the candidate set further.
+MAX_QUERY_TRIGRAMS = 16
+_REGEX_META = set('.^$*+?{}[]()|')
+_HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+
+
+def trigrams(data):
+    """Set of trigram ids for lowercased bytes."""
+    data = data.lower()
+    return {int.from_bytes(data[i:i + 3], 'big') for i in range(len(data) - 2)}
+
+
+def required_literals(pattern):
+    r"""
+    Literal runs that every match of `pattern` must contain. Conservative: any
+    unescaped '|' gives up, groups are skipped, and a char followed by an
+    optional quantifier is dropped. Escapes other than escaped punctuation
+    (classes, assertions, backreferences, \x.. \u.... \N{...} and octal
+    codes) end the run and are consumed whole:
+
+    >>> required_literals(r'foo\.bar')
+    ['foo.bar']
+    >>> required_literals(r'ab\dcd')
+    ['ab', 'cd']
+    >>> required_literals(r'\x41bcd')
+    ['bcd']
+    >>> required_literals(r'\u0041bcd'), required_literals(r'\U00000041bcd')
+    (['bcd'], ['bcd'])
+    >>> required_literals(r'\N{LATIN SMALL LETTER A}bcd')
+    ['bcd']
+    >>> required_literals(r'\0101bcd'), required_literals(r'\101bcd')
+    (['bcd'], ['bcd'])
+    >>> required_literals(r'(ab)\1cde')
+    ['cde']
+    """
+    runs, current, depth, i = [], [], 0, 0
+
+    def end_run():
+        if current:
+            runs.append(''.join(current))
+            current.clear()
+
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\' and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt.isalnum():
+                end_run()
+                i += _escape_length(pattern, i)
+                continue
+            if depth == 0:
+                current.append(nxt)
+            i += 2
+            continue
+        if c == '|':
+            return []
+        if c in '*?{' and current:
+            current.pop()
+        if c in '*+?{':
+            # '+' keeps its char (one or more), but the run cannot continue past it.
+            end_run()
+            if c == '{':
+                close = pattern.find('}', i)
+                i = close + 1 if close != -1 else i + 1
+                continue
+        elif c == '[':
+            end_run()
+            close = pattern.find(']', i + 2)
+            i = close + 1 if close != -1 else len(pattern)
+            continue
+        elif c == '(':
+            end_run()
+            depth += 1
+        elif c == ')':
+            depth = max(0, depth - 1)
+            end_run()
+        elif c in _REGEX_META:
+            end_run()
+        elif depth == 0:
+            current.append(c)
+        i += 1
+    end_run()
+    return runs
+
+
+def _escape_length(pattern, i):
+    """Length of the alphanumeric escape starting at pattern[i] (a backslash)."""
+    nxt = pattern[i + 1]
+    if nxt in _HEX_ESCAPES:
+        return 2 + _HEX_ESCAPES[nxt]
+    if nxt == 'N' and pattern.startswith('{', i + 2):
+        close = pattern.find('}', i + 3)
+        return close + 1 - i if close != -1 else len(pattern) - i
+    if nxt.isdigit():
+        # Octal codes and backreferences: every digit that follows may belong to the escape.
+        end = i + 1
+        while end < len(pattern) and pattern[end].isdigit():
+            end += 1
+        return end - i
+    return 2  # \d, \w, \b ... are classes or assertions, not literals
+
+
+class TrigramIndex:
+    def __init__(self, db_path, root, ignore_rules, max_file_bytes=2 * 1024 * 1024, delay=0.5):
+        self.db_path = db_path
+        self.root = root
+        self.ignore_rules = ignore_rules
+        self.max_file_bytes = max_file_bytes
+        self.delay = delay
+        self.reconciling = False
+        self._write_lock = threading.Lock()
+        self._pending = set()
+        self._pending_cond = threading.Condition()
+        self._worker = None
+        self._reconciled = False
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = self._connect()
+        self._db.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+    def _indexable(self, rel_path, st):
+        return (st.st_size <= self.max_file_bytes
+                and not self.ignore_rules.is_path_ignored(rel_path))
+
+    def update_file(self, rel_path, st=None):
+        """Re-indexes one file if it changed; removes it if it is gone or no longer indexable."""
+        abs_path = os.path.join(self.root, rel_path)
+        try:
+            st = st or os.stat(abs_path)
+        except OSError:
+            self.remove_path(rel_path)
+            return
+        if os.path.isdir(abs_path):
+            # A folder appeared (created, moved in or renamed): index what is inside.
+            self._update_many(self._walk(rel_path))
+            return
+        if not self._indexable(rel_path, st):
+            self.remove_path(rel_path)
+            return
+        with self._write_lock:
+            row = self._db.execute('SELECT id, mtime_ns, size FROM files WHERE path = ?', (rel_path,)).fetchone()
+        if row and (row[1], row[2]) == (st.st_mtime_ns, st.st_size):
+            return
+        try:
+            with open(abs_path, 'rb') as f:
+                data = f.read(self.max_file_bytes + 1)
+        except OSError:
+            return
+        if b'\0' in data[:8192]:
+            self.remove_path(rel_path)
+            return
+        tris = trigrams(data)
+        with self._write_lock, self._db:
+            # Re-read under the lock: the reconciler and the worker may race on a path.
+            row = self._db.execute('SELECT id FROM files WHERE path = ?', (rel_path,)).fetchone()
+            if row:
+                file_id = row[0]
+                self._db.execute('DELETE FROM postings WHERE file_id = ?', (file_id,))
+                self._db.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?', (st.st_mtime_ns, st.st_size, file_id))
+            else:
+                file_id = self._db.execute('INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)',
+                                           (rel_path, st.st_mtime_ns, st.st_size)).lastrowid
+            self._db.executemany('INSERT INTO postings (tri, file_id) VALUES (?, ?)', ((t, file_id) for t in tris))
+
+    def remove_path(self, rel_path):
+        """Drops a file, or every file under a folder, from the index."""
+        prefix = rel_path.rstrip('/') + '/'
+        with self._write_lock, self._db:
+            ids = [r[0] for r in self._db.execute(
+                'SELECT id FROM files WHERE path = ? OR substr(path, 1, ?) = ?', (rel_path, len(prefix), prefix))]
+            for file_id in ids:
+                self._db.execute('DELETE FROM postings WHERE file_id = ?', (file_id,))
+                self._db.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def _walk(self, rel_dir=''):
+        """Yields workspace-relative paths of non-ignored files under `rel_dir`."""
+        top = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        for dirpath, dirnames, filenames in os.walk(top):
+            rel = os.path.relpath(dirpath, self.root)
+            rel = '' if rel == '.' else rel
+            dirnames[:] = [d for d in dirnames if not self.ignore_rules.is_ignored(os.path.join(rel, d), True)]
+            for name in filenames:
+                rel_path = os.path.join(rel, name)
+                if not self.ignore_rules.is_ignored(rel_path):
+                    yield rel_path
+
+    def _update_many(self, rel_paths):
+        for rel_path in rel_paths:
+            try:
+                self.update_file(rel_path)
+            except Exception as e:
+                print(f"Search Index Error ({rel_path}): {e}")
+
+    def reconcile(self):
+        """Walks the workspace once: indexes new/changed files and drops vanished ones."""
+        self.reconciling = True
+        try:
+            self.ignore_rules.refresh()
+            seen = set()
+            for rel_path in self._walk():
+                seen.add(rel_path)
+                self._update_many([rel_path])
+            with self._write_lock:
+                stale = [p for (p,) in self._db.execute('SELECT path FROM files') if p not in seen]
+            for rel_path in stale:
+                self.remove_path(rel_path)
+            self._reconciled = True
+        finally:
+            self.reconciling = False
+
+    def ensure_reconciled(self):
+        """Starts a background reconcile the first time it is called."""
+        if self._reconciled or self.reconciling:
+            return
+        self.reconciling = True
+        threading.Thread(target=self.reconcile, name='search-reconcile', daemon=True).start()
+
+    def schedule(self, *rel_paths):
+        """Queues paths for re-indexing; the worker batches them after `delay` seconds."""
+        with self._pending_cond:
+            self._pending.update(rel_paths)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='search-indexer', daemon=True)
+                self._worker.start()
+            self._pending_cond.notify()
+
+    def _run(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending:
+                    self._pending_cond.wait()
+            time.sleep(self.delay)  # let bursts of saves coalesce
+            with self._pending_cond:
+                batch, self._pending = self._pending, set()
+            self._update_many(sorted(batch))
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+    def candidates(self, literals, path_prefix='', case_sensitive=False):
+        """Paths of indexed files that contain every trigram of every literal."""
+        if not case_sensitive:
+            # The index only folds ASCII case, so non-ASCII letters cannot be filtered on.
+            literals = [part for literal in literals for part in re.split(r'[^\x00-\x7f]+', literal)]
+        tris = set()
+        for literal in literals:
+            tris |= trigrams(literal.encode('utf-8'))
+        tris = sorted(tris)[:MAX_QUERY_TRIGRAMS]
+        conn = self._connect()
+        try:
+            if tris:
+                sql = ' INTERSECT '.join(['SELECT file_id FROM postings WHERE tri = ?'] * len(tris))
+                sql = f'SELECT path FROM files WHERE id IN ({sql})'
+                rows = conn.execute(sql, tris)
+            else:
+                rows = conn.execute('SELECT path FROM files')
+            paths = sorted(r[0] for r in rows)
+        finally:
+            conn.close()
+        if path_prefix:
+            prefix = path_prefix.rstrip('/') + '/'
+            paths = [p for p in paths if p.startswith(prefix)]
+        return paths
+
+    def search(self, query, regex=False, case_sensitive=False, limit=100, path_prefix=''):
+        """
+        Yields {'path', 'line', 'column', 'text'} for each matching line, in
+        path order, stopping after `limit` matches. Raises re.error for an
+        invalid regex before anything is yielded.
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = re.compile(query if regex else re.escape(query), flags)
+        literals = required_literals(query) if regex else [query]
+        found = 0
+        for rel_path in self.candidates(literals, path_prefix, case_sensitive):
+            try:
+                with open(os.path.join(self.root, rel_path), 'r', encoding='utf-8', errors='replace') as f:
+                    for line_no, line in enumerate(f, 1):
+                        match = pattern.search(line)
+                        if match is None:
+                            continue
+                        yield {'path': rel_path, 'line': line_no, 'column': match.start() + 1, 'text': line.rstrip('\r\n')[:500]}
+                        found += 1
+                        if found >= limit:
+                            return
+            except OSError:
+                continue
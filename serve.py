@@ -0,0 +1,199 @@
+"""
+Production launcher: runs the app under gunicorn, optionally as several
+worker processes sharing one port with every client pinned to one of them.
+
+    python serve.py --workers 4 --host 0.0.0.0 --port 5000
+
+Each worker is a gunicorn server (one gthread worker with --threads threads;
+Socket.IO keeps per-client state in memory, so a sticky target has to be a
+single process). Under gthread, Socket.IO's websocket transport is served by
+the simple-websocket package (listed in requirements.txt); without it every
+client silently falls back to long-polling. For several workers the launcher binds HOST:PORT once per
+worker with SO_REUSEPORT and attaches a classic BPF program to the group
+that picks the socket from a hash of the client's IP address. The kernel
+itself then hands all of a browser's connections (Socket.IO polling, the
+websocket upgrade, terminal reattaches) to the worker that holds its state,
+and no traffic passes through the launcher. The launcher keeps the sockets
+open, so the clients of a worker that crashed wait in its accept queue until
+it is restarted.
+
+This needs Linux (SO_ATTACH_REUSEPORT_CBPF). Elsewhere, or behind another
+load balancer where every connection arrives from the balancer's IP, run
+`--workers 1` instances on separate ports and configure sticky sessions
+there (e.g. nginx `ip_hash`).
+
+Workers share Socket.IO rooms and broadcasts through a message queue: pass
+`--message-queue redis://...` (or any URL Flask-SocketIO accepts), or leave
+it out to use the bundled broker from message_bus.py on a local port. The
+queue URL reaches the workers as NEXUSS_MESSAGE_QUEUE, and NEXUSS_WORKERS tells
+them to keep file versions and cache invalidations where every worker sees
+them (see WORKERS in app.py).
+"""
+import argparse
+import ctypes
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+from gunicorn.config import KNOWN_SETTINGS
+
+from message_bus import BusBroker
+
+RESTART_DELAY = 1.0
+THREADS = 100
+
+# Classic BPF, see linux/filter.h and linux/bpf_common.h.
+SO_ATTACH_REUSEPORT_CBPF = 51
+SKF_NET_OFF = -0x100000
+BPF_LD_B_ABS, BPF_LD_W_ABS = 0x30, 0x20
+BPF_ALU_RSH_K, BPF_ALU_MUL_K, BPF_ALU_MOD_K = 0x74, 0x24, 0x94
+BPF_JMP_JEQ_K, BPF_JMP_JA = 0x15, 0x05
+BPF_RET_A = 0x16
+
+
+def client_ip_hash_program(count):
+    """BPF returning the index of the socket for a connection: a hash of its source IP, modulo `count`."""
+    return [
+        (BPF_LD_B_ABS, 0, 0, SKF_NET_OFF),        # A = first byte of the IP header
+        (BPF_ALU_RSH_K, 0, 0, 4),                 # A = IP version
+        (BPF_JMP_JEQ_K, 0, 2, 6),
+        (BPF_LD_W_ABS, 0, 0, SKF_NET_OFF + 20),   # IPv6: A = last 32 bits of the source address
+        (BPF_JMP_JA, 0, 0, 1),
+        (BPF_LD_W_ABS, 0, 0, SKF_NET_OFF + 12),   # IPv4: A = source address
+        (BPF_ALU_MUL_K, 0, 0, 0x9E3779B1),        # Fibonacci hashing: spread neighbouring addresses
+        (BPF_ALU_RSH_K, 0, 0, 16),
+        (BPF_ALU_MOD_K, 0, 0, count),
+        (BPF_RET_A, 0, 0, 0),
+    ]
+
+
+def sticky_sockets(host, port, count):
+    """`count` listening sockets on host:port; the kernel sends each client IP to the same one."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sockets = []
+    try:
+        # The group's socket order is the order of listen(), which the BPF index refers to.
+        for _ in range(count):
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sockets.append(sock)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((host, port))
+            sock.listen(socket.SOMAXCONN)
+        program = client_ip_hash_program(count)
+        code = ctypes.create_string_buffer(b''.join(struct.pack('HBBI', op, jt, jf, k & 0xFFFFFFFF)
+                                                    for op, jt, jf, k in program))
+        sockets[0].setsockopt(socket.SOL_SOCKET, SO_ATTACH_REUSEPORT_CBPF,
+                              struct.pack('HP', len(program), ctypes.addressof(code)))
+    except (AttributeError, OSError) as e:
+        for sock in sockets:
+            sock.close()
+        raise SystemExit(f"cannot share {host}:{port} between sticky workers ({e}); "
+                         "run --workers 1 instances behind a load balancer with sticky sessions instead")
+    for sock in sockets:
+        sock.set_inheritable(True)
+    return sockets
+
+
+def gunicorn_command(bind, threads):
+    """Runs app:app under gunicorn; `bind` is host:port or fd://N."""
+    command = [sys.executable, '-m', 'gunicorn', '--bind', bind, '--workers', '1', '--worker-class', 'gthread',
+               '--threads', str(threads), '--pythonpath', os.path.dirname(os.path.abspath(__file__))]
+    if any(setting.name == 'control_socket_disable' for setting in KNOWN_SETTINGS):
+        # Otherwise every worker claims the same ~/.gunicorn control socket (gunicorn 26+).
+        command.append('--no-control-socket')
+    return command + ['app:app']
+
+
+class Worker:
+    def __init__(self, index, sock, threads, env):
+        self.index, self.sock, self.threads, self.env = index, sock, threads, env
+        self.process = None
+        self.restarts = 0
+
+    def start(self):
+        fd = self.sock.fileno()
+        self.process = subprocess.Popen(gunicorn_command(f'fd://{fd}', self.threads), env=self.env, pass_fds=(fd,))
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def terminate(self):
+        if self.alive():
+            self.process.terminate()
+
+    def wait(self, timeout=35.0):
+        """Waits for a terminated worker (gunicorn allows 30 s for requests to finish), then kills it."""
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def supervise(workers, stop):
+    """Restarts workers that exited (their terminals and queued state are gone, the rest recovers)."""
+    while not stop:
+        time.sleep(RESTART_DELAY)
+        for worker in workers:
+            if not stop and not worker.alive():
+                worker.restarts += 1
+                print(f"[!] Worker {worker.index} exited ({worker.process.returncode}), restarting")
+                worker.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Nexuss-IDE with several worker processes.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=THREADS, help='request threads per worker '
+                        '(each open Socket.IO connection holds one)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--message-queue', default=os.environ.get('NEXUSS_MESSAGE_QUEUE'),
+                        help='Socket.IO message queue URL (default: a bundled broker on localhost)')
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        # Nothing to balance: gunicorn takes over this process, no queue needed.
+        command = gunicorn_command(f'[{args.host}]:{args.port}' if ':' in args.host else f'{args.host}:{args.port}',
+                                   args.threads)
+        os.execv(command[0], command)
+
+    sockets = sticky_sockets(args.host, args.port, args.workers)
+    env = dict(os.environ)
+    broker = None
+    if not args.message_queue:
+        broker = BusBroker('127.0.0.1', 0).start()
+        args.message_queue = broker.url
+    env['NEXUSS_MESSAGE_QUEUE'] = args.message_queue
+    env['NEXUSS_WORKERS'] = str(args.workers)
+    print(f"--- Message queue: {args.message_queue} ---")
+
+    workers = [Worker(i, sock, args.threads, env) for i, sock in enumerate(sockets)]
+    stop = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.append(signum))
+    try:
+        for worker in workers:
+            worker.start()
+        print(f"--- Nexuss-IDE on {args.host}:{args.port}: {len(workers)} workers ---")
+        supervise(workers, stop)
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+        for sock in sockets:
+            sock.close()
+        if broker is not None:
+            broker.close()
+
+
+if __name__ == '__main__':
+    main()
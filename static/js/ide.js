@@ -6,8 +6,22 @@ document.addEventListener('DOMContentLoaded', function() {
     // 1. VARIABLES & REFS
     // ==========================================
     var currentFilePath = null;
+    var currentVersion = null;
+    var pendingEdits = [];
+    var saveInFlight = false;
+    var savePromise = null;
+    var saveConflict = false;
     var saveTimer = null;
     var isAutosaveAttached = false;
+    var nextPageOffset = null;
+    var isPageLoading = false;
+    var isPagingAttached = false;
+    var isSymbolsAttached = false;
+    var isAppendingPage = false;
+    // Line endings of the open file ('crlf', 'lf', 'mixed' or null) and why it may not be edited.
+    var fileEol = null;
+    var editLock = null;
+    var supportsWebp = document.createElement('canvas').toDataURL('image/webp').indexOf('data:image/webp') === 0;
 
     // UI Elements
     var sidebarLeft = document.getElementById('sidebar-left');
@@ -61,8 +75,12 @@ document.addEventListener('DOMContentLoaded', function() {
         sidebarRight.classList.add('open');
         sidebarLeft.classList.remove('open');
         
-        var timestamp = new Date().getTime();
-        var bgUrl = "/static/images/app_wallpaper.jpg?t=" + timestamp;
+        // Smallest variant that covers the screen in device pixels (URLs are content-hashed, so cached).
+        var wallpapers = JSON.parse(sidebarRight.dataset.wallpapers || '[]');
+        var needed = window.innerWidth * (window.devicePixelRatio || 1);
+        var wallpaper = wallpapers.find(w => w.width >= needed) || wallpapers[wallpapers.length - 1];
+        if (!wallpaper) { sidebarRight.style.backgroundImage = "none"; fetchApps(); return; }
+        var bgUrl = (wallpaper.webp && supportsWebp) ? wallpaper.webp : wallpaper.url;
         
         var img = new Image();
         img.onload = () => { sidebarRight.style.backgroundImage = "url('" + bgUrl + "')"; };
@@ -90,15 +108,22 @@ document.addEventListener('DOMContentLoaded', function() {
 
         showToast('<i class="fa-solid fa-spinner fa-spin"></i> Importing files...', true);
 
-        var uploadPromises = Array.from(files).map(file => {
-            var formData = new FormData();
-            formData.append('file', file);
-            formData.append('path', file.webkitRelativePath);
-            return fetch('/api/files/upload', { method: 'POST', body: formData });
-        });
+        // One streamed multipart request for the whole folder; the third
+        // argument makes the browser send the relative path as the filename.
+        var formData = new FormData();
+        Array.from(files).forEach(file => formData.append('files', file, file.webkitRelativePath));
+        var importId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+
+        function onProgress(p) {
+            if (p.import_id !== importId || p.done) return;
+            showToast(`<i class="fa-solid fa-spinner fa-spin"></i> Importing... ${p.files} / ${files.length} files`, true);
+        }
+        if (workspaceSocket) workspaceSocket.on('import_progress', onProgress);
 
-        Promise.all(uploadPromises)
-            .then(() => {
+        fetch('/api/files/import?import_id=' + importId, { method: 'POST', body: formData })
+            .then(res => res.json())
+            .then(data => {
+                if (data.error) throw new Error(data.error);
                 showToast('<i class="fa-solid fa-check"></i> Folder Imported');
                 openFolderArea.style.display = 'none';
                 fetchFileTree();
@@ -106,6 +131,10 @@ document.addEventListener('DOMContentLoaded', function() {
             .catch(err => {
                 showToast('<i class="fa-solid fa-triangle-exclamation"></i> Import Partial/Failed');
                 fetchFileTree();
+            })
+            .finally(() => {
+                if (workspaceSocket) workspaceSocket.off('import_progress', onProgress);
+                folderInput.value = '';
             });
     });
 
@@ -114,7 +143,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // ==========================================
 
     function fetchFileTree() {
-        fetch('/api/files/tree')
+        // Only the top level is listed; folders load their children on expand.
+        fetch('/api/files/tree?depth=1')
             .then(res => res.json())
             .then(data => {
                 fileTreeContainer.innerHTML = '';
@@ -126,70 +156,344 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    function fetchFolderChildren(node, li, itemDiv) {
+        li.dataset.loading = 'true';
+        fetch('/api/files/tree?depth=1&path=' + encodeURIComponent(node.path))
+            .then(res => res.json())
+            .then(children => {
+                if (children.error) {
+                    showToast('Error: ' + children.error);
+                    return;
+                }
+                node.children = children;
+                renderTree(children, li);
+                itemDiv.querySelector('i').className = 'fa-regular fa-folder-open';
+            })
+            .finally(() => { delete li.dataset.loading; });
+    }
+
+    function createTreeNode(node) {
+        var li = document.createElement('li');
+        li.dataset.path = node.path;
+        li.dataset.type = node.type;
+        li.dataset.name = node.name;
+        var itemDiv = document.createElement('div');
+        itemDiv.className = 'tree-item ' + node.type;
+        
+        var iconClass = {
+            '.html': 'fa-brands fa-html5',
+            '.js': 'fa-brands fa-js',
+            '.css': 'fa-brands fa-css3-alt',
+            '.py': 'fa-brands fa-python',
+            '.json': 'fa-solid fa-gear',
+            'folder': 'fa-folder'
+        };
+        var ext = Object.keys(iconClass).find(ext => node.name.endsWith(ext)) || 'fa-file-code';
+        var icon = node.type === 'folder' ? iconClass.folder : ext;
+        
+        itemDiv.innerHTML = `<i class="fa-regular ${icon}"></i> <span>${node.name}</span>`;
+
+        itemDiv.addEventListener('click', (e) => {
+            e.stopPropagation();
+            if (node.type === 'folder') {
+                var childrenUl = li.querySelector('.tree-level');
+                if (childrenUl) {
+                    var isHidden = childrenUl.style.display === 'none';
+                    childrenUl.style.display = isHidden ? 'block' : 'none';
+                    itemDiv.querySelector('i').className = `fa-regular ${isHidden ? 'fa-folder-open' : 'fa-folder'}`;
+                } else if (!li.dataset.loading) {
+                    // Lazy load: children are fetched the first time a folder is opened.
+                    fetchFolderChildren(node, li, itemDiv);
+                }
+            } else {
+                loadFile(node.path, node.name);
+                if (window.innerWidth < 768) sidebarLeft.classList.remove('open');
+            }
+        });
+
+        li.appendChild(itemDiv);
+        if (node.children) {
+            renderTree(node.children, li);
+        }
+        return li;
+    }
+
     function renderTree(nodes, container) {
         var ul = document.createElement('ul');
         ul.className = 'tree-level';
+        nodes.forEach(node => ul.appendChild(createTreeNode(node)));
+        container.appendChild(ul);
+    }
 
-        nodes.forEach(node => {
-            var li = document.createElement('li');
-            var itemDiv = document.createElement('div');
-            itemDiv.className = 'tree-item ' + node.type;
-            
-            var iconClass = {
-                '.html': 'fa-brands fa-html5',
-                '.js': 'fa-brands fa-js',
-                '.css': 'fa-brands fa-css3-alt',
-                '.py': 'fa-brands fa-python',
-                '.json': 'fa-solid fa-gear',
-                'folder': 'fa-folder'
-            };
-            var ext = Object.keys(iconClass).find(ext => node.name.endsWith(ext)) || 'fa-file-code';
-            var icon = node.type === 'folder' ? iconClass.folder : ext;
-            
-            itemDiv.innerHTML = `<i class="fa-regular ${icon}"></i> <span>${node.name}</span>`;
-
-            itemDiv.addEventListener('click', (e) => {
-                e.stopPropagation();
-                if (node.type === 'folder') {
-                    var childrenUl = li.querySelector('.tree-level');
-                    if (childrenUl) {
-                        var isHidden = childrenUl.style.display === 'none';
-                        childrenUl.style.display = isHidden ? 'block' : 'none';
-                        itemDiv.querySelector('i').className = `fa-regular ${isHidden ? 'fa-folder-open' : 'fa-folder'}`;
-                    }
-                } else {
-                    loadFile(node.path, node.name);
-                    if (window.innerWidth < 768) sidebarLeft.classList.remove('open');
-                }
-            });
+    // ==========================================
+    // 5b. FILE SYSTEM: LIVE TREE UPDATES
+    // ==========================================
+
+    function findTreeItem(path) {
+        return Array.from(fileTreeContainer.querySelectorAll('li[data-path]')).find(li => li.dataset.path === path);
+    }
 
-            li.appendChild(itemDiv);
-            if (node.children) {
-                renderTree(node.children, li);
+    function insertTreeNode(node) {
+        var slash = node.path.lastIndexOf('/');
+        var parentPath = slash === -1 ? '' : node.path.slice(0, slash);
+        var parentUl;
+        if (parentPath === '') {
+            parentUl = fileTreeContainer.querySelector(':scope > .tree-level');
+            if (!parentUl) {
+                fileTreeContainer.innerHTML = '';
+                renderTree([node], fileTreeContainer);
+                return;
+            }
+        } else {
+            var parentLi = findTreeItem(parentPath);
+            // Folders that were never expanded will fetch fresh children when opened.
+            parentUl = parentLi && parentLi.querySelector(':scope > .tree-level');
+            if (!parentUl) return;
+        }
+        if (findTreeItem(node.path)) return;
+
+        // Keep the server's ordering: folders first, then case-insensitive name.
+        var key = (node.type === 'folder' ? '0' : '1') + node.name.toLowerCase();
+        var before = Array.from(parentUl.children).find(li =>
+            (li.dataset.type === 'folder' ? '0' : '1') + li.dataset.name.toLowerCase() > key);
+        parentUl.insertBefore(createTreeNode(node), before || null);
+    }
+
+    function applyTreeChanges(changes) {
+        changes.forEach(change => {
+            var name = change.path.split('/').pop();
+            if (change.op === 'remove' || change.op === 'rename') {
+                var oldLi = findTreeItem(change.op === 'rename' ? change.old_path : change.path);
+                if (oldLi) oldLi.remove();
+                // The open file itself, or a folder above it, was renamed.
+                if (change.op === 'rename' && currentFilePath &&
+                        (currentFilePath === change.old_path || currentFilePath.startsWith(change.old_path + '/'))) {
+                    currentFilePath = change.path + currentFilePath.slice(change.old_path.length);
+                    labelFileName.textContent = currentFilePath.split('/').pop();
+                }
+            }
+            if (change.op === 'add' || change.op === 'rename') {
+                insertTreeNode({name: name, path: change.path, type: change.type});
             }
-            ul.appendChild(li);
         });
-        container.appendChild(ul);
     }
 
-    function loadFile(path, name) {
+    var workspaceSocket = null;
+    if (window.io) {
+        workspaceSocket = io('/workspace');
+        workspaceSocket.on('tree_changes', applyTreeChanges);
+        // Anything missed while disconnected is picked up by a fresh listing.
+        workspaceSocket.io.on('reconnect', fetchFileTree);
+    }
+
+    // Recently opened files by path ({etag, data}); the server answers 304 while they are unchanged.
+    var readCache = new Map();
+    var readCacheChars = 0;
+    var READ_CACHE_MAX_CHARS = 16 * 1024 * 1024;
+
+    function rememberRead(path, etag, data) {
+        var old = readCache.get(path);
+        if (old) readCacheChars -= (old.data.content || '').length;
+        readCache.delete(path);
+        readCache.set(path, {etag: etag, data: data});
+        readCacheChars += (data.content || '').length;
+        while (readCacheChars > READ_CACHE_MAX_CHARS && readCache.size > 1) {
+            var oldest = readCache.keys().next().value;
+            readCacheChars -= (readCache.get(oldest).data.content || '').length;
+            readCache.delete(oldest);
+        }
+    }
+
+    function loadFile(path, name, line) {
+        // Land the edits of the file being left (after any save in flight) before its state is reset.
+        settleEdits().then(saved => {
+            if (saved) openFile(path, name, line);
+            else showToast('<i class="fa-solid fa-circle-xmark"></i> Unsaved changes could not be saved, staying on this file', true);
+        });
+    }
+
+    function openFile(path, name, line) {
+        var cached = readCache.get(path);
+        var headers = {'Content-Type': 'application/json'};
+        if (cached) headers['If-None-Match'] = cached.etag;
         fetch('/api/files/read', {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
+            headers: headers,
             body: JSON.stringify({path: path})
         })
-        .then(res => res.json())
+        .then(res => {
+            if (res.status === 304 && cached) return cached.data;
+            var etag = res.headers.get('ETag');
+            return res.json().then(data => {
+                if (etag && !data.error) rememberRead(path, etag, data);
+                return data;
+            });
+        })
         .then(data => {
             if (data.error) {
                 showToast('Error: ' + data.error);
+            } else if (data.binary) {
+                showToast(`<i class="fa-solid fa-file"></i> Binary file (${formatBytes(data.size)}), not opened`);
+            } else if (pendingEdits.length) {
+                loadFile(path, name, line);  // typed into the old file while this one loaded
             } else if (window.editorInstance) {
                 window.editorInstance.setValue(data.content);
                 window.editorInstance.setScrollTop(0);
                 currentFilePath = path;
+                currentVersion = data.version;
+                pendingEdits = [];
+                saveConflict = false;
+                clearTimeout(saveTimer);
                 labelFileName.textContent = name;
+                // Large files arrive one page at a time and stay read-only until fully loaded.
+                nextPageOffset = data.partial ? data.next_offset : null;
+                fileEol = data.eol || null;
+                editLock = null;
+                if (data.partial) lockPagedFile(data);
+                window.editorInstance.updateOptions({readOnly: nextPageOffset != null || editLock != null});
+                if (editLock) {
+                    labelFileName.textContent = name + ' (read-only: ' + editLock + ')';
+                } else if (nextPageOffset != null) {
+                    labelFileName.textContent = name + ' (read-only preview)';
+                    showToast(`<i class="fa-solid fa-book-open"></i> Large file (${formatBytes(data.size)}): scroll to load more`);
+                }
                 attachAutosave();
+                attachPaging();
+                attachSymbols();
+                if (line) revealLine(line, 1);
+            }
+        });
+    }
+
+    function formatBytes(n) {
+        if (n < 1024) return n + ' B';
+        if (n < 1024 * 1024) return (n / 1024).toFixed(1) + ' KB';
+        return (n / (1024 * 1024)).toFixed(1) + ' MB';
+    }
+
+    // ==========================================
+    // 5c. LARGE FILE PAGING
+    // ==========================================
+
+    function attachPaging() {
+        if (isPagingAttached || !window.editorInstance) return;
+        window.editorInstance.onDidScrollChange((e) => {
+            if (nextPageOffset == null || isPageLoading) return;
+            var editor = window.editorInstance;
+            var remaining = e.scrollHeight - (e.scrollTop + editor.getLayoutInfo().height);
+            if (remaining < editor.getLayoutInfo().height * 2) loadNextPage();
+        });
+        isPagingAttached = true;
+    }
+
+    // Monaco normalises mixed line endings and cannot hold invalid UTF-8, so its
+    // offsets (and content) would no longer match the file: such pages stay read-only.
+    function lockPagedFile(data) {
+        if (data.lossy) editLock = 'not valid UTF-8';
+        if (data.eol && fileEol && data.eol !== fileEol) fileEol = 'mixed';
+        fileEol = fileEol || data.eol || null;
+        if (fileEol === 'mixed' && !editLock) editLock = 'mixed line endings';
+    }
+
+    function loadNextPage() {
+        var path = currentFilePath;
+        isPageLoading = true;
+        fetch('/api/files/read', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({path: path, offset: nextPageOffset})
+        })
+        .then(res => res.json())
+        .then(data => {
+            if (path !== currentFilePath) return;
+            if (data.error || data.version !== currentVersion) {
+                // The file changed underneath the preview; start over.
+                nextPageOffset = null;
+                loadFile(path, path.split('/').pop());
+                return;
+            }
+            var model = window.editorInstance.getModel();
+            var lastLine = model.getLineCount();
+            var end = new monaco.Range(lastLine, model.getLineMaxColumn(lastLine), lastLine, model.getLineMaxColumn(lastLine));
+            isAppendingPage = true;
+            model.applyEdits([{range: end, text: data.content}]);
+            isAppendingPage = false;
+            nextPageOffset = data.next_offset;
+            var wasLocked = editLock != null;
+            lockPagedFile(data);
+            if (editLock && !wasLocked) {
+                labelFileName.textContent = path.split('/').pop() + ' (read-only: ' + editLock + ')';
+            } else if (nextPageOffset == null && !editLock) {
+                window.editorInstance.updateOptions({readOnly: false});
+                labelFileName.textContent = path.split('/').pop();
+                showToast('<i class="fa-solid fa-check"></i> Entire file loaded, editing enabled');
+            }
+        })
+        .finally(() => { isPageLoading = false; });
+    }
+
+    // ==========================================
+    // 5d. OUTLINE & GO TO DEFINITION
+    // ==========================================
+
+    function symbolKind(kind) {
+        var kinds = monaco.languages.SymbolKind;
+        return {
+            'class': kinds.Class, 'function': kinds.Function, 'method': kinds.Method, 'property': kinds.Property,
+            'variable': kinds.Variable, 'interface': kinds.Interface, 'type': kinds.TypeParameter, 'enum': kinds.Enum,
+            'id': kinds.Key, 'keyframes': kinds.Event, 'block': kinds.Namespace, 'macro': kinds.Function, 'heading': kinds.String
+        }[kind] || kinds.Variable;
+    }
+
+    function revealLine(line, column) {
+        var editor = window.editorInstance;
+        editor.setPosition({lineNumber: line, column: column});
+        editor.revealLineInCenter(line);
+        editor.focus();
+    }
+
+    function attachSymbols() {
+        if (isSymbolsAttached || !window.editorInstance) return;
+
+        // Outline (Ctrl+Shift+O) of the open file, from the server-side symbol index.
+        monaco.languages.registerDocumentSymbolProvider('*', {
+            displayName: 'Workspace symbols',
+            provideDocumentSymbols: function(model) {
+                if (!currentFilePath) return [];
+                return fetch('/api/symbols/outline?path=' + encodeURIComponent(currentFilePath))
+                    .then(res => res.json())
+                    .then(data => (data.symbols || []).map(s => {
+                        var range = model.validateRange(new monaco.Range(s.line, s.column, s.line, s.column + s.name.length));
+                        return {name: s.name, detail: s.container, kind: symbolKind(s.kind), tags: [], range: range, selectionRange: range};
+                    }));
             }
         });
+
+        // F12 / context menu: jump to the definition of the word under the cursor, in any file.
+        window.editorInstance.addAction({
+            id: 'nexuss.goToDefinition',
+            label: 'Go to Definition',
+            keybindings: [monaco.KeyCode.F12],
+            contextMenuGroupId: 'navigation',
+            run: function(editor) {
+                var word = editor.getModel().getWordAtPosition(editor.getPosition());
+                if (!word) return;
+                var query = '?name=' + encodeURIComponent(word.word) + '&path=' + encodeURIComponent(currentFilePath || '');
+                fetch('/api/symbols/definition' + query)
+                    .then(res => res.json())
+                    .then(data => {
+                        var target = (data.symbols || [])[0];
+                        if (!target) {
+                            showToast(`<i class="fa-solid fa-circle-info"></i> No definition found for ${word.word}` + (data.indexing ? ' (still indexing)' : ''));
+                        } else if (target.path === currentFilePath) {
+                            revealLine(target.line, target.column);
+                        } else {
+                            loadFile(target.path, target.path.split('/').pop(), target.line);
+                        }
+                    });
+            }
+        });
+        isSymbolsAttached = true;
     }
 
     // ==========================================
@@ -199,31 +503,77 @@ document.addEventListener('DOMContentLoaded', function() {
     function attachAutosave() {
         if (isAutosaveAttached || !window.editorInstance) return;
         
-        window.editorInstance.onDidChangeModelContent(() => {
+        window.editorInstance.onDidChangeModelContent((e) => {
+            // setValue() from loadFile is a flush and appended pages are not user edits.
+            if (e.isFlush || isAppendingPage) return;
+            // Monaco orders the changes of one event from the end of the document
+            // to the start, so the server can apply the whole list in sequence.
+            e.changes.forEach(c => pendingEdits.push({offset: c.rangeOffset, length: c.rangeLength, text: c.text}));
             clearTimeout(saveTimer);
             saveTimer = setTimeout(performAutosave, 2000);
         });
         isAutosaveAttached = true;
     }
 
+    // Resolves true once the open file has no unsaved edits left (false if saving them failed).
+    function settleEdits() {
+        if (saveInFlight) return savePromise.then(settleEdits);
+        // A conflicted file cannot be saved; the user was told to reopen it.
+        if (!currentFilePath || saveConflict || pendingEdits.length === 0) return Promise.resolve(true);
+        clearTimeout(saveTimer);
+        return performAutosave().then(saved => saved && settleEdits());
+    }
+
+    // Resolves true if the save went through.
     function performAutosave() {
-        if (!currentFilePath) return;
+        if (!currentFilePath || saveConflict || pendingEdits.length === 0) return Promise.resolve(true);
+        if (saveInFlight) {
+            saveTimer = setTimeout(performAutosave, 500);
+            return savePromise;
+        }
         showToast('<i class="fa-solid fa-floppy-disk"></i> Saving...', true);
+
+        var edits = pendingEdits;
+        pendingEdits = [];
+        var body = {path: currentFilePath, base_version: currentVersion, edits: edits};
+        // Large rewrites (paste, format) are cheaper to send as the whole buffer.
+        var editChars = edits.reduce((n, e) => n + e.text.length, 0);
         var content = window.editorInstance.getValue();
+        // Monaco normalised a file with mixed line endings: only its whole buffer can be saved.
+        if (currentVersion == null || fileEol === 'mixed' || editChars > content.length / 2) {
+            body = {path: currentFilePath, base_version: currentVersion, content: content};
+        }
 
-        fetch('/api/files/save', {
+        var savingPath = currentFilePath;
+        saveInFlight = true;
+        savePromise = fetch('/api/files/save', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({path: currentFilePath, content: content})
+            body: JSON.stringify(body)
         })
-        .then(res => res.json())
-        .then(data => {
+        .then(res => res.json().then(data => ({status: res.status, data: data})))
+        .then(({status, data}) => {
+            if (savingPath !== currentFilePath) return true;  // renamed while saving
             if (data.success) {
+                currentVersion = data.version;
                 showToast('<i class="fa-solid fa-check"></i> Saved');
-            } else {
-                showToast('<i class="fa-solid fa-circle-xmark"></i> Save Failed');
+                return true;
+            } else if (status === 409) {
+                saveConflict = true;
+                showToast('<i class="fa-solid fa-triangle-exclamation"></i> File changed elsewhere. Reopen it to continue editing.', true);
+                return true;
             }
-        });
+            pendingEdits = edits.concat(pendingEdits);
+            showToast('<i class="fa-solid fa-circle-xmark"></i> Save Failed');
+            return false;
+        })
+        .catch(() => {
+            if (savingPath === currentFilePath) pendingEdits = edits.concat(pendingEdits);
+            showToast('<i class="fa-solid fa-circle-xmark"></i> Save Failed');
+            return false;
+        })
+        .finally(() => { saveInFlight = false; });
+        return savePromise;
     }
 
     // ==========================================
@@ -250,6 +600,7 @@ document.addEventListener('DOMContentLoaded', function() {
             } else {
                 // Use the asset serving route for ALL icons.
                 imgSrc = `/extension/${app.folder_name}/${app.icon_filename}`;
+                if (app.icon_version) imgSrc += `?v=${app.icon_version}`;
             }
 
             div.innerHTML = `
@@ -0,0 +1,605 @@
+"""
+Persistent symbol index behind the editor's outline and go-to-symbol.
+
+Each indexed source file is parsed into a flat list of symbols (name, kind,
+line, column, container): Python with `ast` (falling back to a line scanner
+while the file does not parse), and lightweight line/regex scanners for
+JavaScript/TypeScript, CSS and HTML templates. The scanners do not build a
+syntax tree; they find declarations the way a reader skimming the file
+would, which is all an outline needs.
+
+Symbols are stored in SQLite (so a restart does not re-parse the workspace)
+and mirrored in memory, where lookups never read symbols from the disk:
+
+- exact names (jump-to-definition) are one dict access;
+- prefixes are a bisect over the sorted lookup keys;
+- fuzzy queries (characters in order, e.g. `gcTree` -> `get_cached_tree`)
+  run one compiled regex over the newline-joined keys.
+
+Updates are incremental and work like the search index: writers call
+`schedule(rel_path)`, and a background thread re-parses the file only if its
+(mtime, size) changed. `reconcile()` brings the index in line with the disk.
+With several worker processes sharing the database, every query first checks
+`PRAGMA data_version`, which moves when another process commits, and then
+reloads just the files whose stored (mtime, size) no longer match the mirror.
+"""
+import ast
+import bisect
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Bump when a parser changes what it extracts: stored symbols are then rebuilt.
+PARSER_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    file_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    container TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_file ON symbols (file_id);
+"""
+
+MAX_NAME = 120
+# Above this many changed files, a resync reads the whole symbols table once.
+MAX_RESYNC_QUERIES = 256
+# Fuzzy matching scans at most this many keys after the prefix matches.
+MAX_FUZZY_KEYS = 5000
+# Kinds that define something, ranked above variables and ids for go-to-definition.
+DEFINITION_KINDS = ('class', 'function', 'method', 'interface', 'type', 'enum', 'macro', 'block', 'keyframes')
+
+
+def lookup_key(name):
+    """Lowercased name without CSS/HTML sigils, so `btn` finds `.btn` and `--btn-color`."""
+    return name.lstrip('.#@-$').lower()
+
+
+# ==========================================
+# PARSERS
+# ==========================================
+# Each returns a list of (name, kind, line, column, container); lines and
+# columns are 1-based, container is the dotted name of the enclosing symbol.
+
+_PY_DEF = re.compile(r'^(\s*)(?:async\s+def|def|class)\s+([A-Za-z_]\w*)')
+
+
+def parse_python(text):
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return _scan_python(text)
+    lines = text.splitlines()
+    symbols = []
+
+    def add(name, kind, node, container):
+        line = lines[node.lineno - 1] if node.lineno <= len(lines) else ''
+        column = line.find(name, node.col_offset)
+        symbols.append((name, kind, node.lineno, (column if column >= 0 else node.col_offset) + 1, container))
+
+    def visit(body, container, scope):
+        for node in body:
+            qualified = f'{container}.' if container else ''
+            if isinstance(node, ast.ClassDef):
+                add(node.name, 'class', node, container)
+                visit(node.body, qualified + node.name, 'class')
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                add(node.name, 'method' if scope == 'class' else 'function', node, container)
+                visit(node.body, qualified + node.name, 'function')
+            elif scope != 'function' and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    for name_node in (target.elts if isinstance(target, ast.Tuple) else [target]):
+                        if isinstance(name_node, ast.Name):
+                            add(name_node.id, 'property' if scope == 'class' else 'variable', name_node, container)
+            elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)) and scope != 'function':
+                # Conditional definitions (`if TYPE_CHECKING:`, try/except imports) belong to the enclosing scope.
+                for field in ('body', 'orelse', 'finalbody'):
+                    visit(getattr(node, field, []), container, scope)
+                for handler in getattr(node, 'handlers', []):
+                    visit(handler.body, container, scope)
+
+    visit(tree.body, '', 'module')
+    return symbols
+
+
+def _scan_python(text):
+    """Definitions of a file that does not parse (usually one being edited), by indentation."""
+    symbols, stack = [], []  # stack of (indent, qualified name, kind)
+    for line_no, line in enumerate(text.splitlines(), 1):
+        match = _PY_DEF.match(line)
+        if not match:
+            continue
+        indent, name = len(match.group(1).expandtabs()), match.group(2)
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        container = stack[-1][1] if stack else ''
+        if line.lstrip().startswith('class'):
+            kind = 'class'
+        else:
+            kind = 'method' if stack and stack[-1][2] == 'class' else 'function'
+        symbols.append((name, kind, line_no, match.start(2) + 1, container))
+        stack.append((indent, f'{container}.{name}' if container else name, kind))
+    return symbols
+
+
+_JS_IDENT = r'[A-Za-z_$][\w$]*'
+_JS_PATTERNS = [
+    (re.compile(rf'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+({_JS_IDENT})'), 'class'),
+    (re.compile(rf'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*({_JS_IDENT})'), 'function'),
+    (re.compile(rf'^\s*(?:export\s+)?(?:const|let|var)\s+({_JS_IDENT})\s*=\s*(?:async\s+)?'
+                rf'(?:function\b|\([^)]*\)\s*=>|{_JS_IDENT}\s*=>)'), 'function'),
+    (re.compile(rf'^\s*(?:export\s+)?interface\s+({_JS_IDENT})'), 'interface'),
+    (re.compile(rf'^\s*(?:export\s+)?type\s+({_JS_IDENT})\s*(?:<[^>]*>)?\s*='), 'type'),
+    (re.compile(rf'^\s*(?:export\s+)?(?:const\s+)?enum\s+({_JS_IDENT})'), 'enum'),
+    (re.compile(rf'^\s*({_JS_IDENT})\s*:\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>)'), 'function'),
+]
+_JS_PROTOTYPE = re.compile(rf'^\s*({_JS_IDENT})\.prototype\.({_JS_IDENT})\s*=')
+_JS_METHOD = re.compile(rf'^\s*(?:(?:static|async|get|set|public|private|protected|readonly)\s+)*\*?\s*(#?{_JS_IDENT})\s*\([^)]*\)\s*(?::[^{{]*)?\{{')
+_JS_TOP_VARIABLE = re.compile(rf'^(?:export\s+)?(?:const|let|var)\s+({_JS_IDENT})')
+_JS_STRINGS = re.compile(r"'(?:\\.|[^'\\])*'|\"(?:\\.|[^\"\\])*\"|`(?:\\.|[^`\\])*`")
+_JS_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with', 'else', 'do'}
+
+
+def parse_js(text):
+    """JavaScript/TypeScript declarations; braces (outside one-line strings) track class bodies."""
+    symbols, classes = [], []  # classes: (name, depth of the class body)
+    depth, in_comment = 0, False
+    for line_no, raw in enumerate(text.splitlines(), 1):
+        line = raw
+        if in_comment:
+            end = line.find('*/')
+            if end == -1:
+                continue
+            line, in_comment = ' ' * (end + 2) + line[end + 2:], False
+        line = re.sub(r'/\*.*?\*/', lambda m: ' ' * len(m.group()), line)
+        if '/*' in line:
+            line, in_comment = line[:line.index('/*')], True
+        code = _JS_STRINGS.sub(lambda m: ' ' * len(m.group()), line)
+        if '//' in code:
+            line = line[:code.index('//')]
+            code = code[:code.index('//')]
+        container = classes[-1][0] if classes else ''
+        found = None
+        for pattern, kind in _JS_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                found = (match, kind)
+                break
+        if found is None and classes and depth == classes[-1][1]:
+            match = _JS_METHOD.match(line)
+            if match and match.group(1) not in _JS_KEYWORDS:
+                found = (match, 'method')
+        if found is None:
+            match = _JS_PROTOTYPE.match(line)
+            if match:
+                symbols.append((match.group(2), 'method', line_no, match.start(2) + 1, match.group(1)))
+            elif depth == 0:
+                match = _JS_TOP_VARIABLE.match(line)
+                if match:
+                    found = (match, 'variable')
+        if found is not None:
+            match, kind = found
+            symbols.append((match.group(1), kind, line_no, match.start(1) + 1, container))
+        opening = depth
+        depth = max(0, depth + code.count('{') - code.count('}'))
+        if found is not None and found[1] == 'class':
+            classes.append((found[0].group(1), opening + 1))
+            if '{' not in code:
+                continue  # the body opens on a later line
+        while classes and depth < classes[-1][1]:
+            classes.pop()
+    return symbols
+
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_PRELUDE = re.compile(r'([^{};]+)\{')
+_CSS_SELECTOR_NAME = re.compile(r'([.#])(-?[_a-zA-Z][\w-]*)')
+_CSS_KEYFRAME_STEP = re.compile(r'^(?:from|to|[\d.]+%)(?:\s*,\s*(?:from|to|[\d.]+%))*$')
+_CSS_VARIABLE = re.compile(r'(?<![\w-])(--[\w-]+)\s*:')
+_CSS_STRINGS = re.compile(r"'(?:\\.|[^'\\])*'|\"(?:\\.|[^\"\\])*\"")
+
+
+def parse_css(text):
+    """Class and id selectors, @keyframes and custom properties (first definition of each)."""
+    text = _CSS_COMMENT.sub(lambda m: re.sub(r'[^\n]', ' ', m.group()), text)
+    text = _CSS_STRINGS.sub(lambda m: ' ' * len(m.group()), text)
+    line_starts = [0] + [m.end() for m in re.finditer('\n', text)]
+    symbols, seen = [], set()
+
+    def add(name, kind, offset):
+        if name in seen:
+            return
+        seen.add(name)
+        line = bisect.bisect_right(line_starts, offset)
+        symbols.append((name[:MAX_NAME], kind, line, offset - line_starts[line - 1] + 1, ''))
+
+    for match in _CSS_PRELUDE.finditer(text):
+        prelude = match.group(1)
+        start = match.start(1) + len(prelude) - len(prelude.lstrip())
+        selector = prelude.strip()
+        if selector.startswith('@'):
+            keyframes = re.match(r'@(?:-\w+-)?keyframes\s+([\w-]+)', selector)
+            if keyframes:
+                add(keyframes.group(1), 'keyframes', start + keyframes.start(1))
+            continue
+        if _CSS_KEYFRAME_STEP.match(selector):
+            continue
+        for name in _CSS_SELECTOR_NAME.finditer(selector):
+            add(name.group(), 'class' if name.group(1) == '.' else 'id', start + name.start())
+    for match in _CSS_VARIABLE.finditer(text):
+        add(match.group(1), 'variable', match.start(1))
+    symbols.sort(key=lambda s: (s[2], s[3]))
+    return symbols
+
+
+_HTML_ID = re.compile(r'<[A-Za-z][^>]*?\sid\s*=\s*["\']([^"\'{}<>]+)["\']', re.S)
+_HTML_JINJA = re.compile(r'\{%-?\s*(block|macro)\s+(\w+)')
+_HTML_HEADING = re.compile(r'<h([1-6])\b[^>]*>(.*?)</h\1\s*>', re.S | re.I)
+_HTML_EMBEDDED = re.compile(r'(<(script|style)\b[^>]*>)(.*?)</\2\s*>', re.S | re.I)
+
+
+def parse_html(text):
+    """Element ids, Jinja blocks/macros, headings, plus the symbols of inline <script>/<style>."""
+    line_starts = [0] + [m.end() for m in re.finditer('\n', text)]
+    symbols = []
+
+    def position(offset):
+        line = bisect.bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
+
+    for match in _HTML_ID.finditer(text):
+        symbols.append(('#' + match.group(1).strip(), 'id', *position(match.start(1)), ''))
+    for match in _HTML_JINJA.finditer(text):
+        symbols.append((match.group(2), match.group(1), *position(match.start(2)), ''))
+    for match in _HTML_HEADING.finditer(text):
+        title = ' '.join(re.sub(r'<[^>]+>|\{[{%#].*?[}%#]\}', ' ', match.group(2)).split())
+        if title:
+            symbols.append((title[:MAX_NAME], 'heading', *position(match.start()), f'h{match.group(1)}'))
+    for match in _HTML_EMBEDDED.finditer(text):
+        if 'src=' in match.group(1).lower() and not match.group(3).strip():
+            continue
+        parser = parse_js if match.group(2).lower() == 'script' else parse_css
+        line, column = position(match.start(3))
+        for name, kind, sym_line, sym_column, container in parser(match.group(3)):
+            symbols.append((name, kind, line + sym_line - 1, sym_column + (column - 1 if sym_line == 1 else 0), container))
+    symbols.sort(key=lambda s: (s[2], s[3]))
+    return symbols
+
+
+PARSERS = {
+    '.py': parse_python, '.pyw': parse_python,
+    '.js': parse_js, '.mjs': parse_js, '.cjs': parse_js, '.jsx': parse_js, '.ts': parse_js, '.tsx': parse_js,
+    '.css': parse_css, '.scss': parse_css, '.less': parse_css,
+    '.html': parse_html, '.htm': parse_html, '.jinja': parse_html, '.j2': parse_html,
+}
+
+
+def parser_for(rel_path):
+    return PARSERS.get(os.path.splitext(rel_path)[1].lower())
+
+
+def parse_source(rel_path, text):
+    """Symbols of one file (empty for unsupported types); a parser bug never breaks indexing."""
+    parser = parser_for(rel_path)
+    if parser is None:
+        return []
+    try:
+        return [(name[:MAX_NAME], kind, line, column, container or '') for name, kind, line, column, container in parser(text)]
+    except (RecursionError, ValueError) as e:
+        print(f"Symbol Index Error ({rel_path}): {e}")
+        return []
+
+
+def symbol_dict(rel_path, symbol):
+    name, kind, line, column, container = symbol
+    return {'name': name, 'kind': kind, 'path': rel_path, 'line': line, 'column': column, 'container': container}
+
+
+# ==========================================
+# INDEX
+# ==========================================
+
+class SymbolIndex:
+    def __init__(self, db_path, root, ignore_rules, max_file_bytes=1024 * 1024, delay=0.5):
+        self.db_path = db_path
+        self.root = root
+        self.ignore_rules = ignore_rules
+        self.max_file_bytes = max_file_bytes
+        self.delay = delay
+        self.reconciling = False
+        self._lock = threading.RLock()
+        self._data_version = None  # PRAGMA data_version the mirror was last synced at
+        self._files = {}   # rel_path -> (mtime_ns, size, [symbol, ...])
+        self._by_key = {}  # lookup_key(name) -> [(rel_path, symbol), ...]
+        self._keys = []    # sorted lookup keys, rebuilt after changes
+        self._keys_blob = ''
+        self._keys_dirty = True
+        self._pending = set()
+        self._pending_cond = threading.Condition()
+        self._worker = None
+        self._reconciled = False
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != PARSER_VERSION:
+            self._db.executescript('DROP TABLE IF EXISTS symbols; DROP TABLE IF EXISTS files;')
+            self._db.execute(f'PRAGMA user_version = {PARSER_VERSION}')
+        self._db.executescript(SCHEMA)
+
+    @property
+    def symbol_count(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._by_key.values())
+
+    def _load(self):
+        """
+        Syncs the in-memory mirror with the database: everything on first use,
+        afterwards only files another process re-indexed (our own commits do
+        not move data_version, and are mirrored as they are made).
+        """
+        with self._lock:
+            data_version = self._db.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return
+            stored = {path: (file_id, mtime_ns, size)
+                      for file_id, path, mtime_ns, size in self._db.execute('SELECT id, path, mtime_ns, size FROM files')}
+            for path in [p for p in self._files if p not in stored]:
+                self._drop_keys(path, self._files.pop(path)[2])
+            changed = {}  # file id -> path
+            for path, (file_id, mtime_ns, size) in stored.items():
+                known = self._files.get(path)
+                if known is None or (known[0], known[1]) != (mtime_ns, size):
+                    if known is not None:
+                        self._drop_keys(path, known[2])
+                    self._files[path] = (mtime_ns, size, [])
+                    changed[file_id] = path
+            query = 'SELECT file_id, name, kind, line, col, container FROM symbols'
+            if len(changed) <= MAX_RESYNC_QUERIES:
+                rows = (row for file_id in changed
+                        for row in self._db.execute(query + ' WHERE file_id = ? ORDER BY line, col', (file_id,)))
+            else:
+                rows = self._db.execute(query + ' ORDER BY file_id, line, col')
+            for file_id, name, kind, line, col, container in rows:
+                path = changed.get(file_id)
+                if path is not None:
+                    self._files[path][2].append((name, kind, line, col, container or ''))
+            for path in changed.values():
+                self._add_keys(path, self._files[path][2])
+            self._data_version = data_version
+
+    def _add_keys(self, rel_path, symbols):
+        for symbol in symbols:
+            self._by_key.setdefault(lookup_key(symbol[0]), []).append((rel_path, symbol))
+        self._keys_dirty = True
+
+    def _drop_keys(self, rel_path, symbols):
+        for key in {lookup_key(symbol[0]) for symbol in symbols}:
+            entries = [entry for entry in self._by_key.get(key, ()) if entry[0] != rel_path]
+            if entries:
+                self._by_key[key] = entries
+            else:
+                self._by_key.pop(key, None)
+        self._keys_dirty = True
+
+    def _sorted_keys(self):
+        with self._lock:
+            if self._keys_dirty:
+                self._keys = sorted(self._by_key)
+                self._keys_blob = '\n'.join(self._keys)
+                self._keys_dirty = False
+            return self._keys, self._keys_blob
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+    def _indexable(self, rel_path, st):
+        return (parser_for(rel_path) is not None and st.st_size <= self.max_file_bytes
+                and not self.ignore_rules.is_path_ignored(rel_path))
+
+    def update_file(self, rel_path, st=None):
+        """Re-parses one file if its (mtime, size) changed; removes it if it is gone or not indexable."""
+        self._load()
+        abs_path = os.path.join(self.root, rel_path)
+        try:
+            st = st or os.stat(abs_path)
+        except OSError:
+            self.remove_path(rel_path)
+            return
+        if os.path.isdir(abs_path):
+            self._update_many(self._walk(rel_path))
+            return
+        if not self._indexable(rel_path, st):
+            self.remove_path(rel_path)
+            return
+        known = self._files.get(rel_path)
+        if known and (known[0], known[1]) == (st.st_mtime_ns, st.st_size):
+            return
+        try:
+            with open(abs_path, 'rb') as f:
+                data = f.read(self.max_file_bytes + 1)
+        except OSError:
+            return
+        symbols = [] if b'\0' in data[:8192] else parse_source(rel_path, data.decode('utf-8', errors='replace'))
+        with self._lock, self._db:
+            # Re-read under the lock: the reconciler and the worker may race on a path.
+            row = self._db.execute('SELECT id FROM files WHERE path = ?', (rel_path,)).fetchone()
+            if row:
+                file_id = row[0]
+                self._db.execute('DELETE FROM symbols WHERE file_id = ?', (file_id,))
+                self._db.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?', (st.st_mtime_ns, st.st_size, file_id))
+            else:
+                file_id = self._db.execute('INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)',
+                                           (rel_path, st.st_mtime_ns, st.st_size)).lastrowid
+            self._db.executemany('INSERT INTO symbols (file_id, name, kind, line, col, container) VALUES (?, ?, ?, ?, ?, ?)',
+                                 ((file_id, *symbol) for symbol in symbols))
+            if rel_path in self._files:
+                self._drop_keys(rel_path, self._files[rel_path][2])
+            self._files[rel_path] = (st.st_mtime_ns, st.st_size, symbols)
+            self._add_keys(rel_path, symbols)
+
+    def remove_path(self, rel_path):
+        """Drops a file, or every file under a folder, from the index."""
+        self._load()
+        prefix = rel_path.rstrip('/') + '/'
+        with self._lock, self._db:
+            for path in [p for p in self._files if p == rel_path or p.startswith(prefix)]:
+                self._drop_keys(path, self._files.pop(path)[2])
+            ids = [r[0] for r in self._db.execute(
+                'SELECT id FROM files WHERE path = ? OR substr(path, 1, ?) = ?', (rel_path, len(prefix), prefix))]
+            for file_id in ids:
+                self._db.execute('DELETE FROM symbols WHERE file_id = ?', (file_id,))
+                self._db.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def _walk(self, rel_dir=''):
+        """Yields workspace-relative paths of non-ignored files with a parser under `rel_dir`."""
+        top = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        for dirpath, dirnames, filenames in os.walk(top):
+            rel = os.path.relpath(dirpath, self.root)
+            rel = '' if rel == '.' else rel
+            dirnames[:] = [d for d in dirnames if not self.ignore_rules.is_ignored(os.path.join(rel, d), True)]
+            for name in filenames:
+                rel_path = os.path.join(rel, name)
+                if parser_for(name) is not None and not self.ignore_rules.is_ignored(rel_path):
+                    yield rel_path
+
+    def _update_many(self, rel_paths):
+        for rel_path in rel_paths:
+            try:
+                self.update_file(rel_path)
+            except Exception as e:
+                print(f"Symbol Index Error ({rel_path}): {e}")
+
+    def reconcile(self):
+        """Walks the workspace once: parses new/changed files and drops vanished ones."""
+        self.reconciling = True
+        try:
+            self._load()
+            self.ignore_rules.refresh()
+            seen = set()
+            for rel_path in self._walk():
+                seen.add(rel_path)
+                self._update_many([rel_path])
+            for rel_path in [p for p in list(self._files) if p not in seen]:
+                self.remove_path(rel_path)
+            self._sorted_keys()
+            self._reconciled = True
+        finally:
+            self.reconciling = False
+
+    def ensure_reconciled(self):
+        """Starts a background reconcile the first time it is called."""
+        if self._reconciled or self.reconciling:
+            return
+        self.reconciling = True
+        threading.Thread(target=self.reconcile, name='symbol-reconcile', daemon=True).start()
+
+    def schedule(self, *rel_paths):
+        """Queues paths for re-parsing; the worker batches them after `delay` seconds."""
+        with self._pending_cond:
+            self._pending.update(rel_paths)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='symbol-indexer', daemon=True)
+                self._worker.start()
+            self._pending_cond.notify()
+
+    def _run(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending:
+                    self._pending_cond.wait()
+            time.sleep(self.delay)  # let bursts of saves coalesce
+            with self._pending_cond:
+                batch, self._pending = self._pending, set()
+            self._update_many(sorted(batch))
+            self._sorted_keys()  # rebuild here rather than on the next query
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+    def outline(self, rel_path):
+        """Symbols of one file in source order (parsed now if it changed since it was indexed)."""
+        self.update_file(rel_path)
+        entry = self._files.get(rel_path)
+        return [symbol_dict(rel_path, symbol) for symbol in entry[2]] if entry else []
+
+    def definitions(self, name, from_path=None, limit=50):
+        """
+        Symbols named exactly `name` (sigils and case aside), best first:
+        same spelling, defining kinds, the file being edited, then files
+        of the same type.
+        """
+        self._load()
+        entries = self._by_key.get(lookup_key(name), ())
+        from_ext = os.path.splitext(from_path)[1] if from_path else ''
+
+        def rank(entry):
+            path, symbol = entry
+            return (symbol[0] != name and symbol[0].lstrip('.#@-$') != name,
+                    symbol[1] not in DEFINITION_KINDS,
+                    path != from_path,
+                    not path.endswith(from_ext),
+                    path, symbol[2])
+        # Common names (`__init__`, `index`) have thousands of entries: select, do not sort them all.
+        return [symbol_dict(path, symbol) for path, symbol in heapq.nsmallest(limit, entries, key=rank)]
+
+    def lookup(self, query, limit=50, kinds=None, path_prefix=''):
+        """
+        Symbols whose name matches `query`: exact, then prefix, then
+        substring, then fuzzy (the query's characters in order), shorter
+        names first within each group.
+        """
+        self._load()
+        key = lookup_key(query)
+        if not key:
+            return []
+        keys, blob = self._sorted_keys()
+        matched = []
+        start = bisect.bisect_left(keys, key)
+        for candidate in keys[start:]:
+            if not candidate.startswith(key):
+                break
+            matched.append(candidate)
+        if len(matched) < MAX_FUZZY_KEYS:
+            prefixed = set(matched)
+            # Each step skips to the next occurrence of the following character: linear, no backtracking.
+            pattern = re.compile('^' + ''.join(f'[^\n{c}]*{c}' for c in map(re.escape, key)) + '[^\n]*$', re.M)
+            for match in pattern.finditer(blob):
+                if match.group() not in prefixed:
+                    matched.append(match.group())
+                    if len(matched) >= MAX_FUZZY_KEYS:
+                        break
+
+        def rank(candidate):
+            if candidate == key:
+                group = 0
+            elif candidate.startswith(key):
+                group = 1
+            elif key in candidate:
+                group = 2
+            else:
+                group = 3
+            return group, len(candidate), candidate
+        prefix = path_prefix.rstrip('/') + '/' if path_prefix else ''
+        results = []
+        for candidate in sorted(matched, key=rank):
+            for path, symbol in self._by_key.get(candidate, ()):
+                if (kinds and symbol[1] not in kinds) or (prefix and not path.startswith(prefix)):
+                    continue
+                results.append(symbol_dict(path, symbol))
+                if len(results) >= limit:
+                    return results
+        return results
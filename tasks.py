@@ -0,0 +1,374 @@
+"""
+Background work for extensions: a shared, bounded thread pool, an optional
+process pool and one asyncio event loop, behind a small task API.
+
+    tasks = flask_app.extensions['tasks'].for_extension('MyApp')
+    task = tasks.submit(build_report, project_id)        # thread pool
+    task = tasks.submit(crunch, data, process=True)      # process pool
+    task = tasks.submit_async(fetch_all, urls)           # shared event loop
+
+Every task belongs to an owner (the extension folder name). An owner runs at
+most `limit` tasks at a time; the rest wait in its own queue without taking
+a pool slot, so one slow extension cannot starve the others, and none of
+this runs on a request thread.
+
+Inside a task, `current_task()` returns the running Task: call
+`report(progress, message)` to publish progress (sent as `task_update`
+events on the '/tasks' Socket.IO namespace to the user who started it, at
+most every REPORT_INTERVAL seconds) and check `cancelled` to stop early.
+Cancelling a queued task drops it; a running coroutine is cancelled through
+asyncio; thread and process tasks can only be asked to stop (threads see
+`cancelled`, processes cannot be interrupted once started).
+
+Process tasks run in fresh interpreters started by a fork server (spawned
+where there is none), never in forks of this multi-threaded server, so they
+must be module-level functions with picklable arguments: the child imports
+the function's module by name (extensions under `extensions.<folder>.<entry>`).
+Coroutines share one loop with the rest of the server (NexussTerminal runs
+its sessions there): never block it, use `submit()` for blocking work.
+"""
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from flask import has_request_context
+from flask_login import current_user
+
+REPORT_INTERVAL = 0.25
+STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+_current_task = contextvars.ContextVar('nexuss_task', default=None)
+
+
+def current_task():
+    """The Task whose code is running, or None outside a task."""
+    return _current_task.get()
+
+
+def _request_user_id():
+    """Tasks submitted while serving a logged-in user report to that user by default."""
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+def _module_level(fn):
+    """True if `fn` can be pickled by reference, i.e. re-imported by name in another process."""
+    module = sys.modules.get(getattr(fn, '__module__', None) or '')
+    return module is not None and getattr(module, getattr(fn, '__qualname__', ''), None) is fn
+
+
+def _jsonable(value):
+    try:
+        json.dumps(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+class Task:
+    def __init__(self, manager, owner, name, kind, user_id):
+        self.id = uuid.uuid4().hex[:16]
+        self.owner, self.name, self.kind, self.user_id = owner, name, kind, user_id
+        self.state = 'queued'
+        self.progress = None
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = self.finished = None
+        self._manager = manager
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._slot = False        # holds one of its owner's concurrency slots
+        self._future = None       # process tasks
+        self._aio_task = None     # async tasks
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self):
+        """True once cancellation was requested; long-running task code should check it."""
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def report(self, progress=None, message=None):
+        """Publishes progress (a fraction 0..1 and/or a message), throttled to REPORT_INTERVAL."""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = str(message)
+        now = time.monotonic()
+        if now - self._last_report >= REPORT_INTERVAL:
+            self._last_report = now
+            self._manager._publish(self)
+
+    def wait(self, timeout=None):
+        """Blocks until the task finished; returns its result (None if it failed or was cancelled)."""
+        self._done.wait(timeout)
+        return self.result
+
+    def to_dict(self):
+        return {'id': self.id, 'owner': self.owner, 'name': self.name, 'kind': self.kind, 'state': self.state,
+                'progress': self.progress, 'message': self.message, 'error': self.error,
+                'result': self.result if _jsonable(self.result) else None,
+                'created': self.created, 'started': self.started, 'finished': self.finished}
+
+
+class _Owner:
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.queue = deque()  # (task, starter)
+
+
+class TaskManager:
+    def __init__(self, socketio=None, threads=8, processes=None, per_owner=2, namespace='/tasks', history=500):
+        self.socketio = socketio
+        self.namespace = namespace
+        self.per_owner = per_owner
+        self.history = history
+        self.max_processes = processes or os.cpu_count() or 1
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix='task')
+        self._processes = None
+        self._loop = None
+        self._tasks = OrderedDict()
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Pools
+    # ------------------------------------------------------------------
+    @property
+    def loop(self):
+        """The shared asyncio loop, running forever in its own thread (started on first use)."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='tasks-loop', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                # Forking a process with running threads can copy a lock some other thread holds.
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    # Start the server from a bare interpreter, not from a copy of the app.
+                    context.set_forkserver_preload([])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._processes = ProcessPoolExecutor(self.max_processes, mp_context=context)
+            return self._processes
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+    def set_limit(self, owner, limit):
+        """Maximum number of tasks `owner` may run at once (others wait in its queue)."""
+        with self._lock:
+            self._owners.setdefault(owner, _Owner(limit)).limit = max(1, int(limit))
+
+    def for_extension(self, owner):
+        return ExtensionTasks(self, owner)
+
+    def submit(self, owner, fn, *args, name=None, user_id=None, process=False, **kwargs):
+        """Runs `fn(*args, **kwargs)` on the thread pool (or the process pool) and returns its Task."""
+        if process and not _module_level(fn):
+            raise TypeError(f'process tasks need a module-level function, not {fn!r}')
+        task = self._create(owner, name or getattr(fn, '__name__', 'task'), 'process' if process else 'thread', user_id)
+        if process:
+            self._enqueue(task, lambda: self._start_process(task, fn, args, kwargs))
+        else:
+            self._enqueue(task, lambda: self._threads.submit(self._run_thread, task, fn, args, kwargs))
+        return task
+
+    def submit_async(self, owner, coro_fn, *args, name=None, user_id=None, **kwargs):
+        """Runs the coroutine `coro_fn(*args, **kwargs)` on the shared loop and returns its Task."""
+        task = self._create(owner, name or getattr(coro_fn, '__name__', 'task'), 'async', user_id)
+        self._enqueue(task, lambda: asyncio.run_coroutine_threadsafe(self._run_async(task, coro_fn, args, kwargs), self.loop))
+        return task
+
+    def cancel(self, task_id):
+        """Requests cancellation; returns False if the task is unknown or already finished."""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task.done:
+                return False
+            task._cancel.set()
+            queued = task.state == 'queued' and not task._slot
+            if queued:
+                owner = self._owners[task.owner]
+                owner.queue = deque(item for item in owner.queue if item[0] is not task)
+        if queued:
+            self._finish(task, 'cancelled')
+        elif task._aio_task is not None:
+            self.loop.call_soon_threadsafe(task._aio_task.cancel)
+        elif task._future is not None:
+            task._future.cancel()  # only succeeds if the process pool has not started it yet
+        return True
+
+    def get(self, task_id):
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def tasks(self, user_id=None, owner=None):
+        with self._lock:
+            return [t for t in self._tasks.values()
+                    if (user_id is None or t.user_id == user_id) and (owner is None or t.owner == owner)]
+
+    def counts(self):
+        with self._lock:
+            states = [t.state for t in self._tasks.values()]
+        return {state: states.count(state) for state in STATES}
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _create(self, owner, name, kind, user_id):
+        task = Task(self, owner, name, kind, user_id if user_id is not None else _request_user_id())
+        with self._lock:
+            self._tasks[task.id] = task
+            if len(self._tasks) > self.history:
+                for old_id in [i for i, t in self._tasks.items() if t.done][:len(self._tasks) - self.history]:
+                    del self._tasks[old_id]
+        return task
+
+    def _enqueue(self, task, starter):
+        with self._lock:
+            owner = self._owners.setdefault(task.owner, _Owner(self.per_owner))
+            if owner.running >= owner.limit:
+                owner.queue.append((task, starter))
+                starter = None
+            else:
+                owner.running += 1
+                task._slot = True
+        self._publish(task)
+        if starter is not None:
+            starter()
+
+    def _release(self, task):
+        with self._lock:
+            owner = self._owners[task.owner]
+            owner.running -= 1
+            task._slot = False
+            following = None
+            if owner.queue:
+                following = owner.queue.popleft()
+                owner.running += 1
+                following[0]._slot = True
+        if following is not None:
+            following[1]()
+
+    def _begin(self, task):
+        if task.cancelled:
+            self._finish(task, 'cancelled')
+            return False
+        task.state, task.started = 'running', time.time()
+        self._publish(task)
+        return True
+
+    def _finish(self, task, state, result=None, error=None):
+        task.state, task.result, task.error, task.finished = state, result, error, time.time()
+        if state == 'done':
+            task.progress = 1.0
+        task._done.set()
+        self._publish(task)
+        if task._slot:
+            self._release(task)
+
+    def _run_thread(self, task, fn, args, kwargs):
+        if not self._begin(task):
+            return
+        token = _current_task.set(task)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Task Error ({task.owner}/{task.name}): {e}")
+            self._finish(task, 'failed', error=str(e))
+        else:
+            self._finish(task, 'cancelled' if task.cancelled else 'done', result)
+        finally:
+            _current_task.reset(token)
+
+    def _start_process(self, task, fn, args, kwargs):
+        if not self._begin(task):
+            return
+        try:
+            task._future = self._process_pool().submit(fn, *args, **kwargs)
+        except Exception as e:
+            self._finish(task, 'failed', error=str(e))
+            return
+        task._future.add_done_callback(lambda future: self._process_done(task, future))
+
+    def _process_done(self, task, future):
+        if future.cancelled():
+            self._finish(task, 'cancelled')
+        elif future.exception() is not None:
+            print(f"Task Error ({task.owner}/{task.name}): {future.exception()}")
+            self._finish(task, 'failed', error=str(future.exception()))
+        else:
+            self._finish(task, 'done', future.result())
+
+    async def _run_async(self, task, coro_fn, args, kwargs):
+        if not self._begin(task):
+            return
+        task._aio_task = asyncio.current_task()
+        _current_task.set(task)  # local to this asyncio task's context
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._finish(task, 'cancelled')
+        except Exception as e:
+            print(f"Task Error ({task.owner}/{task.name}): {e}")
+            self._finish(task, 'failed', error=str(e))
+        else:
+            self._finish(task, 'done', result)
+
+    def _publish(self, task):
+        if self.socketio is None or task.user_id is None:
+            return
+        try:
+            self.socketio.emit('task_update', task.to_dict(), namespace=self.namespace, to=f'user_{task.user_id}')
+        except Exception as e:
+            print(f"Task Event Error: {e}")
+
+
+class ExtensionTasks:
+    """The task API bound to one extension: same methods as TaskManager, minus the owner argument."""
+
+    def __init__(self, manager, owner):
+        self.manager, self.owner = manager, owner
+
+    @property
+    def loop(self):
+        return self.manager.loop
+
+    def submit(self, fn, *args, **kwargs):
+        return self.manager.submit(self.owner, fn, *args, **kwargs)
+
+    def submit_async(self, coro_fn, *args, **kwargs):
+        return self.manager.submit_async(self.owner, coro_fn, *args, **kwargs)
+
+    def cancel(self, task_id):
+        task = self.manager.get(task_id)
+        return task is not None and task.owner == self.owner and self.manager.cancel(task_id)
+
+    def tasks(self, user_id=None):
+        return self.manager.tasks(user_id=user_id, owner=self.owner)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def nexuss(tmp_path_factory):
+    """The app module, imported from a scratch directory so its workspace/ and instance folder live there."""
+    cwd = os.getcwd()
+    server_dir = tmp_path_factory.mktemp('server')
+    os.chdir(server_dir)
+    os.environ['NEXUSS_INSTANCE_PATH'] = str(server_dir / 'instance')
+    try:
+        import app as module
+    finally:
+        os.chdir(cwd)
+        os.environ.pop('NEXUSS_INSTANCE_PATH')
+    module.app.config.update(TESTING=True, LOGIN_DISABLED=True)
+    return module
+
+
+@pytest.fixture
+def client(nexuss):
+    return nexuss.app.test_client()
+
+
+@pytest.fixture
+def workspace(nexuss, request):
+    """A fresh folder inside the workspace; tests address files as `<name>/...`."""
+    name = request.node.name.replace('[', '_').replace(']', '')
+    path = os.path.join(nexuss.WORKSPACE_DIR, name)
+    os.makedirs(path)
+    return name, path
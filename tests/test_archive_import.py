@@ -0,0 +1,126 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from archive_import import ImportProgress, ImportRejected, import_multipart, import_tar, import_zip, safe_destination
+
+
+def tar_body(members):
+    """members: (name, bytes) for files, (name, None, target) for symlinks."""
+    body = io.BytesIO()
+    with tarfile.open(fileobj=body, mode='w:gz') as archive:
+        for name, data, *target in members:
+            info = tarfile.TarInfo(name)
+            if data is None:
+                info.type, info.linkname = tarfile.SYMTYPE, target[0]
+                archive.addfile(info)
+            else:
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    body.seek(0)
+    return body
+
+
+def zip_body(members):
+    body = io.BytesIO()
+    with zipfile.ZipFile(body, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    body.seek(0)
+    return body
+
+
+def multipart_body(boundary, files):
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+             f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n' for name, data in files]
+    return io.BytesIO(b''.join(parts) + f'--{boundary}--\r\n'.encode())
+
+
+@pytest.fixture
+def root(tmp_path):
+    path = tmp_path / 'workspace'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.mark.parametrize('name', ['../x', 'a/../../x', '/etc/x', 'C:/x', '..\\x', '', './'])
+def test_unsafe_names_are_rejected(root, name):
+    with pytest.raises(ImportRejected):
+        safe_destination(root, name)
+
+
+def test_nested_names_stay_inside_the_root(root):
+    assert safe_destination(root, 'src/./pkg/mod.py') == os.path.join(root, 'src', 'pkg', 'mod.py')
+
+
+def test_tar_files_and_directories_are_written(root):
+    progress = ImportProgress()
+    import_tar(tar_body([('proj/a.txt', b'a'), ('proj/sub/b.txt', b'bb')]), root, progress)
+    with open(os.path.join(root, 'proj', 'sub', 'b.txt'), 'rb') as f:
+        assert f.read() == b'bb'
+    assert progress.summary() == {'files': 2, 'bytes': 3, 'skipped': []}
+
+
+def test_tar_links_are_skipped(root, tmp_path):
+    progress = ImportProgress()
+    import_tar(tar_body([('link', None, str(tmp_path)), ('a.txt', b'a')]), root, progress)
+    assert not os.path.lexists(os.path.join(root, 'link'))
+    assert [s['path'] for s in progress.skipped] == ['link']
+
+
+def test_tar_traversal_is_rejected(root, tmp_path):
+    with pytest.raises(ImportRejected):
+        import_tar(tar_body([('../outside.txt', b'x')]), root, ImportProgress())
+    assert not os.path.exists(tmp_path / 'outside.txt')
+
+
+def test_symlinked_parent_cannot_escape_the_root(root, tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    os.symlink(outside, os.path.join(root, 'linked'))
+    with pytest.raises(ImportRejected):
+        import_tar(tar_body([('linked/x.txt', b'x')]), root, ImportProgress())
+    assert not os.path.exists(outside / 'x.txt')
+
+
+@pytest.mark.parametrize('make_body, importer', [(tar_body, import_tar), (zip_body, import_zip)])
+def test_symlink_at_the_destination_is_not_followed(root, tmp_path, make_body, importer):
+    target = tmp_path / 'target.txt'
+    target.write_bytes(b'original')
+    os.symlink(target, os.path.join(root, 'a.txt'))
+    with pytest.raises(ImportRejected):
+        importer(make_body([('a.txt', b'overwritten')]), root, ImportProgress())
+    assert target.read_bytes() == b'original'
+
+
+def test_multipart_symlink_at_the_destination_is_not_followed(root, tmp_path):
+    target = tmp_path / 'target.txt'
+    target.write_bytes(b'original')
+    os.symlink(target, os.path.join(root, 'a.txt'))
+    with pytest.raises(ImportRejected):
+        import_multipart(multipart_body('b0undary', [('a.txt', b'overwritten')]), 'b0undary', root, ImportProgress())
+    assert target.read_bytes() == b'original'
+
+
+@pytest.mark.parametrize('make_body, importer', [(tar_body, import_tar), (zip_body, import_zip)])
+def test_size_limit_removes_the_partial_file(root, make_body, importer):
+    # Compresses well, so the zip passes the spool check and trips the limit while extracting.
+    members = [('small.txt', b'x' * 10), ('big.bin', b'x' * (300 * 1024))]
+    with pytest.raises(ImportRejected, match='byte limit'):
+        importer(make_body(members), root, ImportProgress(max_bytes=200 * 1024))
+    assert not os.path.exists(os.path.join(root, 'big.bin'))
+
+
+def test_multipart_size_limit_removes_the_partial_file(root):
+    body = multipart_body('b0undary', [('big.bin', b'x' * (300 * 1024))])
+    with pytest.raises(ImportRejected, match='byte limit'):
+        import_multipart(body, 'b0undary', root, ImportProgress(max_bytes=200 * 1024))
+    assert not os.path.exists(os.path.join(root, 'big.bin'))
+
+
+def test_file_limit(root):
+    with pytest.raises(ImportRejected, match='file limit'):
+        import_zip(zip_body([('a', b'1'), ('b', b'2'), ('c', b'3')]), root, ImportProgress(max_files=2))
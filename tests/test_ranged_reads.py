@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def blob(workspace):
+    name, folder = workspace
+    data = bytes(range(256)) * 40
+    with open(os.path.join(folder, 'blob.bin'), 'wb') as f:
+        f.write(data)
+    return f'/api/files/raw?path={name}/blob.bin', data
+
+
+def test_full_download(client, blob):
+    url, data = blob
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.data == data
+
+
+def test_byte_range(client, blob):
+    url, data = blob
+    response = client.get(url, headers={'Range': 'bytes=100-299'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-299/{len(data)}'
+    assert response.data == data[100:300]
+
+
+def test_open_ended_and_suffix_ranges(client, blob):
+    url, data = blob
+    assert client.get(url, headers={'Range': 'bytes=10000-'}).data == data[10000:]
+    response = client.get(url, headers={'Range': 'bytes=-16'})
+    assert response.status_code == 206
+    assert response.data == data[-16:]
+
+
+def test_unsatisfiable_range(client, blob):
+    url, data = blob
+    response = client.get(url, headers={'Range': f'bytes={len(data)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(data)}'
+
+
+def test_if_range_only_honours_the_current_validator(client, blob):
+    url, data = blob
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag}).status_code == 206
+    # A stale validator means the client's partial copy is outdated: send the whole file.
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == data
+
+
+def test_raw_rejects_paths_outside_the_workspace(client):
+    assert client.get('/api/files/raw?path=../app.py').status_code == 400
+    assert client.get('/api/files/raw?path=/etc/passwd').status_code == 400
+
+
+def test_paged_read_stops_on_line_boundaries(client, workspace):
+    name, folder = workspace
+    with open(os.path.join(folder, 'lines.txt'), 'w', encoding='utf-8', newline='') as f:
+        f.write(''.join(f'line {i} é\n' for i in range(100)))
+    pages, offset = [], 0
+    while offset is not None:
+        response = client.post('/api/files/read', json={'path': f'{name}/lines.txt', 'offset': offset, 'length': 100})
+        assert response.status_code == 200
+        page = response.get_json()
+        assert page['content'].endswith('\n')
+        pages.append(page['content'])
+        offset = page['next_offset']
+    assert len(pages) > 1
+    assert ''.join(pages) == ''.join(f'line {i} é\n' for i in range(100))
+
+
+def test_paged_read_of_invalid_utf8_is_flagged_lossy(client, workspace):
+    name, folder = workspace
+    with open(os.path.join(folder, 'mixed.txt'), 'wb') as f:
+        # Past the sniffed head, so the file is treated as text rather than binary.
+        f.write(b'ok\n' * 4000 + b'caf\xe9\n')
+    response = client.post('/api/files/read', json={'path': f'{name}/mixed.txt', 'offset': 0, 'length': 64 * 1024})
+    page = response.get_json()
+    assert page['lossy'] is True
+    assert page['content'].endswith('caf�\n')
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+
+def read(client, path):
+    response = client.post('/api/files/read', json={'path': path})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def save(client, **body):
+    return client.post('/api/files/save', json=body)
+
+
+def on_disk(nexuss, path):
+    nexuss.write_queue.flush()
+    with open(os.path.join(nexuss.WORKSPACE_DIR, path), 'rb') as f:
+        return f.read()
+
+
+def test_full_save_then_read(client, nexuss, workspace):
+    path = f'{workspace[0]}/a.txt'
+    response = save(client, path=path, content='hello\n')
+    assert response.status_code == 200
+    version = response.get_json()['version']
+    data = read(client, path)
+    assert data['content'] == 'hello\n'
+    assert data['version'] == version
+    assert on_disk(nexuss, path) == b'hello\n'
+
+
+def test_edits_apply_to_the_current_version(client, nexuss, workspace):
+    path = f'{workspace[0]}/a.txt'
+    version = save(client, path=path, content='hello world').get_json()['version']
+    response = save(client, path=path, base_version=version,
+                    edits=[{'offset': 6, 'length': 5, 'text': 'there'}, {'offset': 0, 'length': 0, 'text': '> '}])
+    assert response.status_code == 200
+    assert response.get_json()['version'] != version
+    assert read(client, path)['content'] == '> hello there'
+
+
+def test_stale_base_version_conflicts(client, nexuss, workspace):
+    path = f'{workspace[0]}/a.txt'
+    first = save(client, path=path, content='one').get_json()['version']
+    second = save(client, path=path, base_version=first, content='two').get_json()['version']
+    response = save(client, path=path, base_version=first, edits=[{'offset': 0, 'length': 3, 'text': 'three'}])
+    assert response.status_code == 409
+    assert response.get_json()['version'] == second
+    assert read(client, path)['content'] == 'two'
+
+
+def test_edit_offsets_count_utf16_units(client, nexuss, workspace):
+    path = f'{workspace[0]}/a.txt'
+    version = save(client, path=path, content='a\U0001F600b').get_json()['version']
+    # The emoji is two UTF-16 units, so 'b' sits at offset 3.
+    response = save(client, path=path, base_version=version, edits=[{'offset': 3, 'length': 1, 'text': 'cé'}])
+    assert response.status_code == 200
+    assert on_disk(nexuss, path) == 'a\U0001F600cé'.encode('utf-8')
+
+
+def test_edit_splitting_a_surrogate_pair_is_rejected(client, nexuss, workspace):
+    path = f'{workspace[0]}/a.txt'
+    version = save(client, path=path, content='a\U0001F600b').get_json()['version']
+    response = save(client, path=path, base_version=version, edits=[{'offset': 2, 'length': 1, 'text': ''}])
+    assert response.status_code == 400
+    assert on_disk(nexuss, path) == 'a\U0001F600b'.encode('utf-8')
+
+
+def test_edits_keep_crlf_line_endings(client, nexuss, workspace):
+    name, folder = workspace
+    with open(os.path.join(folder, 'crlf.txt'), 'wb') as f:
+        f.write(b'one\r\ntwo\r\nthree\r\n')
+    data = read(client, f'{name}/crlf.txt')
+    assert data['content'] == 'one\r\ntwo\r\nthree\r\n'
+    assert data['eol'] == 'crlf'
+    # Offsets as Monaco reports them for a CRLF model: 'two' starts at 5.
+    response = save(client, path=f'{name}/crlf.txt', base_version=data['version'],
+                    edits=[{'offset': 5, 'length': 3, 'text': 'TWO'}])
+    assert response.status_code == 200
+    assert on_disk(nexuss, f'{name}/crlf.txt') == b'one\r\nTWO\r\nthree\r\n'
+
+
+def test_edits_to_a_non_utf8_file_conflict(client, nexuss, workspace):
+    name, folder = workspace
+    with open(os.path.join(folder, 'latin1.txt'), 'wb') as f:
+        f.write(b'caf\xe9\n')
+    version = nexuss.file_versions.current(os.path.join(folder, 'latin1.txt'))
+    response = save(client, path=f'{name}/latin1.txt', base_version=version, edits=[{'offset': 0, 'length': 0, 'text': 'x'}])
+    assert response.status_code == 409
+    assert on_disk(nexuss, f'{name}/latin1.txt') == b'caf\xe9\n'
+
+
+@pytest.mark.parametrize('body', [
+    ['not', 'an', 'object'],
+    {'path': 5, 'content': 'x'},
+    {'path': 'x.txt'},
+    {'path': 'x.txt', 'content': 5},
+    {'path': 'x.txt', 'base_version': 1, 'edits': {'offset': 0}},
+    {'path': 'x.txt', 'base_version': True, 'edits': []},
+    {'path': 'x.txt', 'edits': []},
+    {'path': '../escape.txt', 'content': 'x'},
+])
+def test_malformed_bodies_are_rejected(client, body):
+    assert client.post('/api/files/save', json=body).status_code == 400
+
+
+def test_malformed_edits_are_rejected(client, nexuss, workspace):
+    path = f'{workspace[0]}/a.txt'
+    version = save(client, path=path, content='abc').get_json()['version']
+    for edits in ([{'offset': 0, 'length': 9, 'text': ''}], ['x'], [{'offset': -1, 'length': 0, 'text': ''}]):
+        assert save(client, path=path, base_version=version, edits=edits).status_code == 400
+    assert read(client, path)['content'] == 'abc'
@@ -0,0 +1,87 @@
+"""
+Small thread-safe LRU cache whose entries also expire after a fixed time.
+
+Used in front of lookups that are hit on every request (the Flask-Login user
+loader) where a bounded amount of staleness is fine and explicit
+invalidation covers the cases where it is not.
+
+When several processes keep their own copy, pass `shared_stamp`: a file whose
+mtime `invalidate()` bumps, and every process clears its entries on the next
+lookup after it sees the file change.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=300.0, shared_stamp=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared_stamp = shared_stamp
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        stamp = self._read_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                # Another process invalidated something: we cannot tell what.
+                self._stamp = stamp
+                self.invalidations += len(self._data)
+                self._data.clear()
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+            if self.shared_stamp is not None:
+                stamp = time.time_ns()
+                with open(self.shared_stamp, 'a'):
+                    os.utime(self.shared_stamp, ns=(stamp, stamp))
+                self._stamp = stamp
+
+    def _read_stamp(self):
+        if self.shared_stamp is None:
+            return None
+        try:
+            return os.stat(self.shared_stamp).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None}
@@ -0,0 +1,445 @@
+"""
+In-memory index of the workspace, kept current by a filesystem watcher.
+
+The index maps every (non-ignored) workspace-relative path to a small stat
+record. Watchers feed raw filesystem activity into it and the index turns that
+into a stream of change events:
+
+    {'op': 'add',    'path': 'src/app.py', 'type': 'file'}
+    {'op': 'remove', 'path': 'build',      'type': 'folder'}
+    {'op': 'rename', 'path': 'new.py', 'old_path': 'old.py', 'type': 'file'}
+    {'op': 'modify', 'path': 'src/app.py', 'type': 'file'}
+
+Events are batched for `batch_window` seconds and handed to `on_change` as a
+list, so a burst (e.g. `npm install`) becomes a handful of callbacks.
+
+Two watcher backends exist: `InotifyWatcher` (Linux, via ctypes, no extra
+dependency) and `PollingWatcher` (periodic rescan + diff, works everywhere).
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+
+# inotify constants (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class Entry:
+    __slots__ = ('is_dir', 'inode', 'mtime_ns', 'size')
+
+    def __init__(self, st, is_dir):
+        self.is_dir = is_dir
+        self.inode = st.st_ino
+        self.mtime_ns = st.st_mtime_ns
+        self.size = 0 if is_dir else st.st_size
+
+
+def _node_type(is_dir):
+    return 'folder' if is_dir else 'file'
+
+
+class WorkspaceIndex:
+    """
+    The shared path -> Entry map plus the event batching. Watchers call
+    `apply_*` methods; everything else only reads.
+    """
+
+    def __init__(self, root, ignore_rules, on_change=None, batch_window=0.1):
+        self.root = root
+        self.ignore_rules = ignore_rules
+        self.on_change = on_change
+        self.batch_window = batch_window
+        self.entries = {}
+        self._lock = threading.RLock()
+        self._pending = []
+        self._flush_timer = None
+
+    # ------------------------------------------------------------------
+    # Scanning
+    # ------------------------------------------------------------------
+    def rel(self, abs_path):
+        rel_path = os.path.relpath(abs_path, self.root)
+        return '' if rel_path == '.' else rel_path
+
+    def scan(self, rel_dir=''):
+        """Walks a folder (honouring ignore rules) and returns {rel_path: Entry}."""
+        found = {}
+        stack = [os.path.join(self.root, rel_dir) if rel_dir else self.root]
+        while stack:
+            path = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            rel_path = self.rel(entry.path)
+                            if self.ignore_rules.is_ignored(rel_path, is_dir):
+                                continue
+                            found[rel_path] = Entry(entry.stat(follow_symlinks=False), is_dir)
+                        except OSError:
+                            continue
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+        return found
+
+    def rebuild(self):
+        """Full rescan; diffs against the current map so clients get the delta."""
+        self.ignore_rules.refresh()
+        self.apply_snapshot(self.scan())
+
+    # ------------------------------------------------------------------
+    # Mutations (called by watchers)
+    # ------------------------------------------------------------------
+    def apply_snapshot(self, snapshot, prefix=''):
+        """
+        Replaces everything under `prefix` with `snapshot`, emitting adds,
+        removes, modifies and (inode-matched) renames for the difference.
+        """
+        with self._lock:
+            old = {p: e for p, e in self.entries.items()
+                   if not prefix or p == prefix or p.startswith(prefix + os.sep)}
+            removed = {p: e for p, e in old.items() if p not in snapshot}
+            added = {p: e for p, e in snapshot.items() if p not in old}
+            events = []
+
+            # Renames: a removed and an added path sharing an inode and type.
+            by_inode = {(e.inode, e.is_dir): p for p, e in added.items()}
+            renamed_dirs = []
+            for old_path, e in sorted(removed.items()):
+                new_path = by_inode.get((e.inode, e.is_dir))
+                if new_path is None or new_path not in added:
+                    continue
+                if any(old_path.startswith(o + os.sep) and new_path == n + old_path[len(o):]
+                       for o, n in renamed_dirs):
+                    # Child of a renamed folder: implied by the folder's event.
+                    del removed[old_path], added[new_path]
+                    continue
+                events.append({'op': 'rename', 'path': new_path, 'old_path': old_path, 'type': _node_type(e.is_dir)})
+                del removed[old_path], added[new_path]
+                if e.is_dir:
+                    renamed_dirs.append((old_path, new_path))
+
+            for p in sorted(removed):
+                # Children of a removed folder are implied by the folder's event.
+                parent = os.path.dirname(p)
+                if parent in removed:
+                    continue
+                events.append({'op': 'remove', 'path': p, 'type': _node_type(removed[p].is_dir)})
+            for p in sorted(added):
+                parent = os.path.dirname(p)
+                if parent in added:
+                    continue
+                events.append({'op': 'add', 'path': p, 'type': _node_type(added[p].is_dir)})
+            for p, e in snapshot.items():
+                before = old.get(p)
+                if before and not e.is_dir and (before.mtime_ns, before.size) != (e.mtime_ns, e.size):
+                    events.append({'op': 'modify', 'path': p, 'type': 'file'})
+
+            for p in old:
+                self.entries.pop(p, None)
+            self.entries.update(snapshot)
+            self._queue(events)
+
+    def apply_added(self, rel_path, is_dir):
+        """A path appeared. Folders are scanned so files created before the watch are not missed."""
+        abs_path = os.path.join(self.root, rel_path)
+        try:
+            st = os.stat(abs_path, follow_symlinks=False)
+        except OSError:
+            return
+        with self._lock:
+            existed = rel_path in self.entries
+            self.entries[rel_path] = Entry(st, is_dir)
+            if is_dir:
+                self.entries.update(self.scan(rel_path))
+            self._queue([{'op': 'modify' if existed else 'add', 'path': rel_path, 'type': _node_type(is_dir)}])
+
+    def apply_modified(self, rel_path):
+        with self._lock:
+            entry = self.entries.get(rel_path)
+            if entry is None:
+                self.apply_added(rel_path, False)
+                return
+            try:
+                self.entries[rel_path] = Entry(os.stat(os.path.join(self.root, rel_path), follow_symlinks=False), False)
+            except OSError:
+                return
+            self._queue([{'op': 'modify', 'path': rel_path, 'type': 'file'}])
+
+    def apply_removed(self, rel_path):
+        with self._lock:
+            entry = self.entries.pop(rel_path, None)
+            if entry is None:
+                return
+            if entry.is_dir:
+                prefix = rel_path + os.sep
+                for p in [p for p in self.entries if p.startswith(prefix)]:
+                    del self.entries[p]
+            self._queue([{'op': 'remove', 'path': rel_path, 'type': _node_type(entry.is_dir)}])
+
+    def apply_renamed(self, old_path, new_path):
+        with self._lock:
+            entry = self.entries.pop(old_path, None)
+            if entry is None:
+                self.apply_added(new_path, os.path.isdir(os.path.join(self.root, new_path)))
+                return
+            self.entries[new_path] = entry
+            if entry.is_dir:
+                prefix = old_path + os.sep
+                for p in [p for p in self.entries if p.startswith(prefix)]:
+                    self.entries[new_path + p[len(old_path):]] = self.entries.pop(p)
+            self._queue([{'op': 'rename', 'path': new_path, 'old_path': old_path, 'type': _node_type(entry.is_dir)}])
+
+    # ------------------------------------------------------------------
+    # Event batching
+    # ------------------------------------------------------------------
+    def _queue(self, events):
+        if not events or self.on_change is None:
+            return
+        self._pending.extend(events)
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.batch_window, self._flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush(self):
+        with self._lock:
+            events, self._pending, self._flush_timer = self._pending, [], None
+        if events:
+            try:
+                self.on_change(events)
+            except Exception as e:
+                print(f"Workspace Index Error: {e}")
+
+
+class PollingWatcher:
+    """Rescans the workspace every `interval` seconds and diffs it against the index."""
+
+    name = 'poll'
+
+    def __init__(self, index, interval=2.0):
+        self.index = index
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='workspace-poll', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.index.rebuild()
+            except Exception as e:
+                print(f"Workspace Poll Error: {e}")
+
+
+class InotifyWatcher:
+    """
+    Recursive watcher built on Linux inotify through ctypes. Raises OSError
+    from `__init__`/`start` when inotify is unavailable or the watch limit is
+    hit, so the caller can fall back to `PollingWatcher`.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, index):
+        self.index = index
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available on this platform')
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._wd_to_dir = {}
+        self._dir_to_wd = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _add_watch(self, rel_dir):
+        abs_dir = os.path.join(self.index.root, rel_dir) if rel_dir else self.index.root
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(abs_dir), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(err, f'inotify_add_watch failed for {abs_dir}')
+        self._wd_to_dir[wd] = rel_dir
+        self._dir_to_wd[rel_dir] = wd
+
+    def _watch_tree(self, rel_dir):
+        self._add_watch(rel_dir)
+        prefix = rel_dir + os.sep if rel_dir else ''
+        for p, e in list(self.index.entries.items()):
+            if e.is_dir and p.startswith(prefix):
+                self._add_watch(p)
+
+    def _forget_tree(self, rel_dir):
+        """Removes the watches of a folder that left the workspace (they would outlive it otherwise)."""
+        prefix = rel_dir + os.sep if rel_dir else ''
+        for d in [d for d in self._dir_to_wd if d == rel_dir or d.startswith(prefix)]:
+            wd = self._dir_to_wd.pop(d)
+            self._wd_to_dir.pop(wd, None)
+            # EINVAL: the kernel already dropped it (the folder was deleted).
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _drop_wd(self, wd):
+        """Forgets a watch the kernel removed by itself (IN_DELETE_SELF / IN_IGNORED)."""
+        rel_dir = self._wd_to_dir.pop(wd, None)
+        if rel_dir is not None and self._dir_to_wd.get(rel_dir) == wd:
+            del self._dir_to_wd[rel_dir]
+
+    def _move_tree(self, old_dir, new_dir):
+        prefix = old_dir + os.sep
+        for d in [d for d in self._dir_to_wd if d == old_dir or d.startswith(prefix)]:
+            wd = self._dir_to_wd.pop(d)
+            moved = new_dir + d[len(old_dir):]
+            self._dir_to_wd[moved] = wd
+            self._wd_to_dir[wd] = moved
+
+    def start(self):
+        try:
+            self._watch_tree('')
+        except OSError:
+            # Typically ENOSPC (fs.inotify.max_user_watches reached).
+            os.close(self._fd)
+            raise
+        self._thread = threading.Thread(target=self._run, name='workspace-inotify', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+                if not ready:
+                    continue
+                # Give closely spaced MOVED_FROM/MOVED_TO pairs a chance to land in one read.
+                time.sleep(0.01)
+                self._handle(self._read_events())
+            except Exception as e:
+                print(f"Workspace Inotify Error: {e}")
+
+    def _read_events(self):
+        events = []
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(buf[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                events.append((wd, mask, cookie, name))
+        return events
+
+    def _handle(self, events):
+        index = self.index
+        if any(mask & IN_Q_OVERFLOW for _, mask, _, _ in events):
+            # The kernel dropped events: resynchronise with a full rescan.
+            index.rebuild()
+            self._forget_tree('')
+            self._watch_tree('')
+            return
+
+        moved_from = {}
+        for wd, mask, cookie, name in events:
+            if mask & (IN_DELETE_SELF | IN_IGNORED):
+                self._drop_wd(wd)
+                continue
+            rel_dir = self._wd_to_dir.get(wd)
+            if rel_dir is None or not name:
+                continue
+            rel_path = os.path.join(rel_dir, name) if rel_dir else name
+            is_dir = bool(mask & IN_ISDIR)
+            ignored = index.ignore_rules.is_ignored(rel_path, is_dir)
+
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = rel_path
+            elif mask & IN_MOVED_TO:
+                old_path = moved_from.pop(cookie, None)
+                if ignored:
+                    if old_path is not None:
+                        self._forget_tree(old_path)
+                        index.apply_removed(old_path)
+                elif old_path is not None:
+                    if is_dir:
+                        self._move_tree(old_path, rel_path)
+                    index.apply_renamed(old_path, rel_path)
+                else:
+                    index.apply_added(rel_path, is_dir)
+                    if is_dir:
+                        self._watch_tree(rel_path)
+            elif ignored:
+                continue
+            elif mask & IN_CREATE:
+                index.apply_added(rel_path, is_dir)
+                if is_dir:
+                    self._watch_tree(rel_path)
+            elif mask & IN_DELETE:
+                if is_dir:
+                    self._forget_tree(rel_path)
+                index.apply_removed(rel_path)
+            elif mask & IN_CLOSE_WRITE:
+                index.apply_modified(rel_path)
+
+        # A MOVED_FROM without its MOVED_TO means the path left the workspace.
+        for old_path in moved_from.values():
+            self._forget_tree(old_path)
+            index.apply_removed(old_path)
+
+
+def start_watcher(index, mode='auto', poll_interval=2.0):
+    """
+    Builds the index and starts a watcher. `mode` is 'inotify', 'poll' or
+    'auto' (inotify with a polling fallback). Returns the running watcher.
+    """
+    index.ignore_rules.refresh()
+    index.entries = index.scan()
+    if mode in ('auto', 'inotify'):
+        try:
+            watcher = InotifyWatcher(index)
+            watcher.start()
+            return watcher
+        except (OSError, AttributeError) as e:
+            if mode == 'inotify':
+                raise
+            print(f"Workspace Watcher: inotify unavailable ({e}), falling back to polling.")
+    watcher = PollingWatcher(index, poll_interval)
+    watcher.start()
+    return watcher
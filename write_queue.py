@@ -0,0 +1,195 @@
+"""
+Write-behind queue for file saves.
+
+`put(path, data, version)` only records the latest content for a path; a
+background thread writes it once the path has been queued for `delay`
+seconds, so a burst of autosaves to one file turns into a single disk write
+(the deadline is set by the first queued save and is not pushed back by
+later ones, so a file that is saved continuously still lands every `delay`).
+
+Each write goes to a temp file in the target's folder which then replaces the
+target with `os.replace`, so a crash leaves either the old or the new
+content, never a truncated file. With `fsync` on, the temp files are synced
+before the rename and every affected folder is synced once per batch.
+
+With `stamp_mtime` on, each written file's mtime is set to its version (taken
+as microseconds) before it replaces the target, so the version can be read
+back from the disk (see file_versions.SharedVersionStore).
+
+Queued content only lives in memory: call `flush()` before shutting down.
+Readers that must see the latest save call `pending(path)` or `flush(path)`.
+"""
+import os
+import threading
+import time
+
+TEMP_SUFFIX = '.nexuss-tmp'
+
+
+class WriteBehindQueue:
+    def __init__(self, delay=0.25, fsync=True, on_written=None, stamp_mtime=False):
+        self.delay = delay
+        self.fsync = fsync
+        self.stamp_mtime = stamp_mtime
+        # on_written(path, version, error) runs on the writing thread after each write (error is None on success).
+        self.on_written = on_written
+        self.puts = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.batches = 0
+        self.errors = 0
+        self._queued = {}    # abs path -> [deadline, data, version]
+        self._inflight = {}  # abs path -> [deadline, data, version] while its batch is being written
+        self._cond = threading.Condition()
+        # Held for the whole of every batch, and batches are taken while holding it, so the
+        # worker and flush() can never write two versions of one path out of order.
+        self._io_lock = threading.Lock()
+        self._worker = None
+
+    def put(self, path, data, version=None):
+        """Queues `data` (str or bytes) as the next content of `path`, replacing any queued content."""
+        with self._cond:
+            self.puts += 1
+            entry = self._queued.get(path)
+            if entry is not None:
+                entry[1], entry[2] = data, version
+                self.coalesced += 1
+            else:
+                self._queued[path] = [time.monotonic() + self.delay, data, version]
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+    def pending(self, path):
+        """The content `path` will have once queued writes land, or None if nothing is pending for it."""
+        with self._cond:
+            entry = self._queued.get(path) or self._inflight.get(path)
+            return entry[1] if entry is not None else None
+
+    def flush(self, path=None):
+        """Writes queued content for `path` (or everything) now and waits for it to reach the disk."""
+        with self._io_lock:
+            self._write(self._take(lambda p, entry: path is None or p == path))
+
+    def stats(self):
+        with self._cond:
+            return {'queued': len(self._queued), 'in_flight': len(self._inflight), 'delay': self.delay,
+                    'fsync': self.fsync, 'puts': self.puts, 'coalesced': self.coalesced, 'writes': self.writes,
+                    'batches': self.batches, 'errors': self.errors}
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                wait = min(entry[0] for entry in self._queued.values()) - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+            with self._io_lock:
+                now = time.monotonic()
+                try:
+                    self._write(self._take(lambda p, entry: entry[0] <= now))
+                except Exception as e:  # never let one bad batch stop every later save
+                    print(f"Write-behind Error: {e}")
+
+    def _take(self, select):
+        with self._cond:
+            batch = {p: entry for p, entry in self._queued.items() if select(p, entry)}
+            for p, entry in batch.items():
+                del self._queued[p]
+                self._inflight[p] = entry
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self._write_batch(batch)
+        finally:
+            with self._cond:
+                for path, entry in batch.items():
+                    if self._inflight.get(path) is entry:
+                        del self._inflight[path]
+
+    def _write_batch(self, batch):
+        staged, results = [], []
+        for path, (_, data, version) in batch.items():
+            try:
+                target = os.path.realpath(path)  # replace the file a symlink points to, not the link
+                staged.append((path, version, target, self._write_temp(target, data, version)))
+            except Exception as e:  # OSError, or data that is neither str nor bytes
+                results.append((path, version, e))
+        folders = set()
+        for path, version, target, temp in staged:
+            try:
+                os.replace(temp, target)
+                folders.add(os.path.dirname(target))
+                results.append((path, version, None))
+            except OSError as e:
+                _unlink(temp)
+                results.append((path, version, e))
+        if self.fsync:
+            for folder in folders:
+                _fsync_dir(folder)
+
+        for path, version, error in results:
+            if error is not None:
+                print(f"Write-behind Error ({path}): {error}")
+            if self.on_written is not None:
+                try:
+                    self.on_written(path, version, error)
+                except Exception as e:
+                    print(f"Write-behind Callback Error ({path}): {e}")
+        with self._cond:
+            self.batches += 1
+            self.writes += sum(1 for _, _, error in results if error is None)
+            self.errors += sum(1 for _, _, error in results if error is not None)
+
+    def _write_temp(self, target, data, version):
+        folder, name = os.path.split(target)
+        temp = os.path.join(folder, f'.{name}.{os.urandom(4).hex()}{TEMP_SUFFIX}')
+        try:
+            mode = os.stat(target).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = None
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data.encode('utf-8') if isinstance(data, str) else data)
+                if mode is not None:
+                    os.fchmod(f.fileno(), mode)
+                if self.stamp_mtime and version is not None:
+                    f.flush()
+                    os.utime(f.fileno(), ns=(time.time_ns(), version * 1000))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            _unlink(temp)
+            raise
+        return temp
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _fsync_dir(folder):
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)